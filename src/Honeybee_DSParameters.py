@@ -16,6 +16,7 @@ Provided by Honeybee 0.0.51
         RhinoViewsName: List of view names that you want to be considered for annual glare analysis. Be aware that annual glare analysis with Daysim can take hours to days!
         adaptiveZone: Set the Boolean to True if the user can adapt his/her view within the space. "The concept is based on the hypothesis that if a user is free to look in different directions or place him or herself in different positions within a space, he or she is going to pick the most comfortable one." Read more here > http://daysim.ning.com/page/daysim-header-file-deyword-adaptive-zone
         dgp_imageSize: The size of the image to be used for daylight glare probability in pixels. Defult value is 250 px.
+        compressDcFiles_: Set to True to compress the daylight coefficient (.dc) files to .dcz files after the simulation. The original .dc files are deleted once they are compressed. Compressed files are much smaller and Honeybee components can still read them but Daysim can't. Read Annual Result I expands the coefficients of each space back to a .dc file when it runs Daysim for dynamic shading or lighting controls. Default is False.
 """
 
 ghenv.Component.Name = "Honeybee_DSParameters"
@@ -32,7 +33,7 @@ import Grasshopper.Kernel as gh
 
 class SetDSParameters:
     
-    def __init__(self, outputUnits, dynamicSHDGroup_1,  dynamicSHDGroup_2, RhinoViewsName, adaptiveZone, dgp_imageSize):
+    def __init__(self, outputUnits, dynamicSHDGroup_1,  dynamicSHDGroup_2, RhinoViewsName, adaptiveZone, dgp_imageSize, compressDcFiles):
         
         if len(outputUnits)!=0 and outputUnits[0]!=None: self.outputUnits = outputUnits
         else: self.outputUnits = [2]
@@ -43,6 +44,9 @@ class SetDSParameters:
         if not dgp_imageSize: dgp_imageSize = 250
         self.dgp_imageSize = dgp_imageSize
         
+        if compressDcFiles == None: compressDcFiles = False
+        self.compressDcFiles = compressDcFiles
+        
         if dynamicSHDGroup_1 == None and dynamicSHDGroup_2==None:
             
             class dynamicSHDRecipe(object):
@@ -80,7 +84,7 @@ class SetDSParameters:
 
 
 
-def main(outputUnits, dynamicSHDGroup_1,  dynamicSHDGroup_2, RhinoViewsName, adaptiveZone, dgp_imageSize):
+def main(outputUnits, dynamicSHDGroup_1,  dynamicSHDGroup_2, RhinoViewsName, adaptiveZone, dgp_imageSize, compressDcFiles):
     msg = None
     
     # make sure shading groups don't have similar names
@@ -99,14 +103,18 @@ def main(outputUnits, dynamicSHDGroup_1,  dynamicSHDGroup_2, RhinoViewsName, ada
     except:
         pass            
         
-    DSParameters = SetDSParameters(outputUnits, dynamicSHDGroup_1,  dynamicSHDGroup_2, RhinoViewsName, adaptiveZone, dgp_imageSize)
+    DSParameters = SetDSParameters(outputUnits, dynamicSHDGroup_1,  dynamicSHDGroup_2, RhinoViewsName, adaptiveZone, dgp_imageSize, compressDcFiles)
     
     return msg, DSParameters
 
 
 
 
-msg, DSParameters = main(outputUnits, dynamicSHDGroup_1,  dynamicSHDGroup_2, RhinoViewsName, adaptiveZone, dgp_imageSize)
+# compressDcFiles_ is not on the component of the files that are made with the older versions
+try: compressDcFiles = compressDcFiles_
+except NameError: compressDcFiles = False
+
+msg, DSParameters = main(outputUnits, dynamicSHDGroup_1,  dynamicSHDGroup_2, RhinoViewsName, adaptiveZone, dgp_imageSize, compressDcFiles)
 if len(RhinoViewsName)!= 0:
     
     warnMsg = "View based glare analysis hasn't been implemented yet!\nWill be implemented soon. =)"
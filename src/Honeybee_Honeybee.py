@@ -53,6 +53,17 @@ import time
 from itertools import chain
 import datetime
 import copy
+import array
+import struct
+import bisect
+import subprocess
+import threading
+import hashlib
+import json
+try: import mmap
+except ImportError: mmap = None
+try: import zlib
+except ImportError: zlib = None
 PI = math.pi
 
 rc.Runtime.HostUtils.DisplayOleAlerts(False)
@@ -2421,7 +2432,7 @@ class hb_RADParameters(object):
 
 class hb_DSParameters(object):
     
-    def __init__(self, outputUnits = [2], dynamicSHDGroup_1 = None,  dynamicSHDGroup_2 = None, RhinoViewsName = [] , adaptiveZone = False, dgp_imageSize = 250):
+    def __init__(self, outputUnits = [2], dynamicSHDGroup_1 = None,  dynamicSHDGroup_2 = None, RhinoViewsName = [] , adaptiveZone = False, dgp_imageSize = 250, compressDcFiles = False):
         
         if len(outputUnits)!=0 and outputUnits[0]!=None: self.outputUnits = outputUnits
         else: self.outputUnits = [2]
@@ -2432,6 +2443,9 @@ class hb_DSParameters(object):
         if not dgp_imageSize: dgp_imageSize = 250
         self.dgp_imageSize = dgp_imageSize
         
+        if compressDcFiles == None: compressDcFiles = False
+        self.compressDcFiles = compressDcFiles
+        
         if dynamicSHDGroup_1 == None and dynamicSHDGroup_2==None:
             
             class dynamicSHDRecipe(object):
@@ -2460,6 +2474,2105 @@ class hb_DSParameters(object):
         # print "number of ill files = " + str(self.numOfIll)
 
 
+class hb_PointIndex(object):
+    """
+    Tolerance-quantized hash grid for finding a point in a large list of points.
+    The index is built once for a list of points so each look up only compares
+    the points in the neighbouring cells instead of all the points.
+    """
+    
+    def __init__(self, points, tolerance = None):
+        if tolerance == None: tolerance = sc.doc.ModelAbsoluteTolerance
+        self.tolerance = tolerance
+        self.points = points
+        self.grid = {}
+        for ptCount, pt in enumerate(points):
+            if pt == None: continue
+            self.grid.setdefault(self.getKey(pt), []).append(ptCount)
+    
+    def getKey(self, pt):
+        return int(math.floor(pt.X / self.tolerance)), \
+               int(math.floor(pt.Y / self.tolerance)), \
+               int(math.floor(pt.Z / self.tolerance))
+    
+    def findPoint(self, pt):
+        """Return the index of the point that is closer than tolerance to pt or -1 if there is none."""
+        if pt == None: return -1
+        x, y, z = self.getKey(pt)
+        for i in (x-1, x, x+1):
+            for j in (y-1, y, y+1):
+                for k in (z-1, z, z+1):
+                    for ptCount in self.grid.get((i, j, k), []):
+                        if self.points[ptCount].DistanceTo(pt) < self.tolerance:
+                            return ptCount
+        return -1
+    
+    def findPoints(self, pts):
+        return [self.findPoint(pt) for pt in pts]
+    
+    def hasPoint(self, pt):
+        return self.findPoint(pt) != -1
+
+
+class hb_IllMatrix(object):
+    """
+    Read-only hour x point view of a Daysim .ill file that has been converted
+    to the binary cache by DSResultAux.illToBinary. Values are stored as float32
+    in hour-major order so reading an hour is one slice and reading a point is
+    one value per hour. Hour indices are 0 based (HOY - 1).
+    """
+    
+    def __init__(self, binFile, numOfHours, numOfPts, dates):
+        self.binFile = binFile
+        self.numOfHours = numOfHours
+        self.numOfPts = numOfPts
+        self.dates = dates
+        self.rowSize = 4 * numOfPts
+        
+        self.inf = open(binFile, "rb")
+        try:
+            self.data = mmap.mmap(self.inf.fileno(), 0, access = mmap.ACCESS_READ)
+        except:
+            # mmap is not available or the file is empty
+            # read the values from the file instead
+            self.data = None
+    
+    def readBytes(self, start, length):
+        if self.data != None:
+            return self.data[start:start + length]
+        self.inf.seek(start)
+        return self.inf.read(length)
+    
+    def getHour(self, hour, st = 0, end = None):
+        # st and end can be used to only read a range of the points
+        if end == None: end = self.numOfPts
+        values = array.array('f')
+        values.fromstring(self.readBytes(hour * self.rowSize + 4 * st, 4 * (end - st)))
+        return values
+    
+    def getHours(self, hours):
+        return [self.getHour(hour) for hour in hours]
+    
+    def getColumns(self, ptIndices):
+        """Return one list of annual values for each of the point indices."""
+        columns = [[] for ptIndex in ptIndices]
+        if len(ptIndices) == 0: return columns
+        # only read the part of each hour between the first and the last point
+        st, end = min(ptIndices), max(ptIndices) + 1
+        indices = [ptIndex - st for ptIndex in ptIndices]
+        for hour in range(self.numOfHours):
+            values = self.getHour(hour, st, end)
+            for column, index in zip(columns, indices):
+                column.append(values[index])
+        return columns
+    
+    def getColumn(self, ptIndex):
+        return self.getColumns([ptIndex])[0]
+    
+    def close(self):
+        if self.data != None: self.data.close()
+        self.inf.close()
+
+
+class hb_IllSpaceView(object):
+    """
+    View over the points of a single space in a list of ill matrices. The points
+    of a space can be spread between several files of a CPU-chunked study so the
+    view keeps the range of the space in each of the matrices.
+    """
+    
+    def __init__(self, illMatrices, st, end):
+        self.illMatrices = illMatrices
+        self.numOfPts = end - st
+        self.numOfHours = illMatrices[0].numOfHours
+        self.dates = illMatrices[0].dates
+        
+        # (matrix, start, end) for each part of the space
+        self.ranges = []
+        fileSt = 0
+        for illMatrix in illMatrices:
+            fileEnd = fileSt + illMatrix.numOfPts
+            if max(st, fileSt) < min(end, fileEnd):
+                self.ranges.append((illMatrix, max(st, fileSt) - fileSt, min(end, fileEnd) - fileSt))
+            fileSt = fileEnd
+    
+    def getHour(self, hour):
+        values = array.array('f')
+        for illMatrix, st, end in self.ranges:
+            values.extend(illMatrix.getHour(hour, st, end))
+        return values
+    
+    def getHours(self, hours):
+        return [self.getHour(hour) for hour in hours]
+    
+    def getColumns(self, ptIndices):
+        # group the points of each matrix so each matrix is read once for all its points
+        matrixIndices = [[] for illMatrix, st, end in self.ranges]
+        locations = []
+        for ptIndex in ptIndices:
+            for rangeCount, (illMatrix, st, end) in enumerate(self.ranges):
+                if ptIndex < end - st:
+                    locations.append((rangeCount, len(matrixIndices[rangeCount])))
+                    matrixIndices[rangeCount].append(st + ptIndex)
+                    break
+                ptIndex -= end - st
+            else:
+                raise IndexError("Point index is out of range.")
+        
+        matrixColumns = [illMatrix.getColumns(matrixIndices[rangeCount]) \
+                         for rangeCount, (illMatrix, st, end) in enumerate(self.ranges)]
+        return [matrixColumns[rangeCount][colCount] for rangeCount, colCount in locations]
+    
+    def getColumn(self, ptIndex):
+        return self.getColumns([ptIndex])[0]
+
+
+class hb_IllMatrixSet(hb_IllSpaceView):
+    """
+    All the CPU-chunked ill matrices of a study stitched together in the global
+    order of the test points. pattern is the number of points in each branch of
+    the original test points (from the .ptn file) or None if it is not available.
+    """
+    
+    def __init__(self, illMatrices, pattern = None):
+        hb_IllSpaceView.__init__(self, illMatrices, 0, sum([illMatrix.numOfPts for illMatrix in illMatrices]))
+        self.pattern = pattern
+    
+    def getSpaceViews(self, numOfPtsInEachSpace = None):
+        """Return an hb_IllSpaceView for each branch of points. Uses the pattern if the list is not provided."""
+        if numOfPtsInEachSpace == None: numOfPtsInEachSpace = self.pattern
+        views = []
+        st = 0
+        for numOfPts in numOfPtsInEachSpace:
+            views.append(hb_IllSpaceView(self.illMatrices, st, st + numOfPts))
+            st += numOfPts
+        return views
+    
+    def close(self):
+        for illMatrix in self.illMatrices: illMatrix.close()
+
+
+class hb_ResultManifest(object):
+    """
+    Keep track of the inputs of the post-processing stages of a study so a stage
+    can be skipped when its inputs haven't changed since the last run.
+    
+    Each stage records the fingerprint (size, modified time and md5 hash) of its input
+    files and a hash of its other inputs (point pattern, thresholds, etc.). The hash of
+    a file is only recalculated if the size or the modified time has changed so touching
+    a file doesn't invalidate the stage. The manifest is saved as a json file.
+    """
+    
+    def __init__(self, manifestFile):
+        self.manifestFile = manifestFile
+        self.stages = {}
+        if os.path.isfile(manifestFile):
+            try:
+                with open(manifestFile, "r") as manifestInf:
+                    self.stages = json.load(manifestInf)["stages"]
+            except:
+                # corrupted manifest. all the stages will be recalculated
+                self.stages = {}
+    
+    def getFileHash(self, filePath, blockSize = 2**20):
+        md5 = hashlib.md5()
+        with open(filePath, "rb") as inf:
+            while True:
+                block = inf.read(blockSize)
+                if not block: break
+                md5.update(block)
+        return md5.hexdigest()
+    
+    def getFileFingerprint(self, filePath, previous = None):
+        """Return size, modified time and hash of a file. The hash is reused from previous if the file hasn't changed."""
+        size = os.path.getsize(filePath)
+        mtime = "%.2f"%os.path.getmtime(filePath)
+        if previous != None and previous["size"] == size and previous["mtime"] == mtime:
+            return previous
+        return {"size": size, "mtime": mtime, "md5": self.getFileHash(filePath)}
+    
+    def getValuesHash(self, values):
+        return hashlib.md5(json.dumps(values, sort_keys = True)).hexdigest()
+    
+    def isStageValid(self, stage, files, values = None, outputs = []):
+        """
+        Check if the inputs of a stage are the same as the last time that the stage was updated.
+        files is the list of input files, values are the other inputs and should be json serializable.
+        The stage is not valid if any of the output files is missing.
+        """
+        if not self.stages.has_key(stage): return False
+        record = self.stages[stage]
+        
+        if record["values"] != self.getValuesHash(values): return False
+        if sorted(record["files"].keys()) != sorted(files): return False
+        for output in outputs:
+            if not os.path.isfile(output): return False
+        
+        for filePath in files:
+            if not os.path.isfile(filePath): return False
+            previous = record["files"][filePath]
+            fingerprint = self.getFileFingerprint(filePath, previous)
+            if fingerprint["md5"] != previous["md5"]: return False
+            # the file is touched but the content is the same
+            record["files"][filePath] = fingerprint
+        
+        return True
+    
+    def updateStage(self, stage, files, values = None, outputs = []):
+        """
+        Record the current inputs of a stage. Only the fingerprints of the files, the hash of
+        the values and the paths to the output files are kept so the manifest stays small.
+        """
+        previousFiles = {}
+        if self.stages.has_key(stage): previousFiles = self.stages[stage]["files"]
+        
+        fingerprints = {}
+        for filePath in files:
+            previous = None
+            if previousFiles.has_key(filePath): previous = previousFiles[filePath]
+            fingerprints[filePath] = self.getFileFingerprint(filePath, previous)
+        
+        self.stages[stage] = {"files": fingerprints, "values": self.getValuesHash(values), "outputs": list(outputs)}
+    
+    def getOutputs(self, stage):
+        if not self.stages.has_key(stage): return []
+        return self.stages[stage].get("outputs", [])
+    
+    def removeStage(self, stage):
+        if self.stages.has_key(stage): del self.stages[stage]
+    
+    def save(self):
+        with open(self.manifestFile, "w") as manifestOutf:
+            json.dump({"version": 1, "stages": self.stages}, manifestOutf)
+
+
+class hb_AmbientCache(object):
+    """
+    Manage Radiance ambient files (-af) for a scene so the indirect calculation is reused
+    between the runs of the same scene (e.g. repeated runs or a sweep of the direct
+    parameters). The files are named by a hash of the scene files and a hash of the
+    ambient parameters. The files of other scenes are removed as soon as the scene changes.
+    
+    Radiance can only share an ambient file between processes on systems with file locking.
+    On other systems each process gets its own ambient file which is reused in the next runs.
+    """
+    
+    # parameters that change the values in the ambient file
+    ambientParameters = ["_ab_", "_ad_", "_as_", "_ar_", "_aa_", "_lr_", "_lw_"]
+    
+    def __init__(self, cacheFolder, sceneFiles, radParameters, shareFile = None):
+        if not os.path.isdir(cacheFolder): os.makedirs(cacheFolder)
+        self.cacheFolder = cacheFolder
+        self.sceneKey = self.getSceneKey(sceneFiles)
+        self.parametersKey = self.getParametersKey(radParameters)
+        # there is no ambient calculation for -ab 0
+        self.isActive = int(radParameters["_ab_"]) > 0
+        if shareFile == None: shareFile = os.name != "nt"
+        self.shareFile = shareFile
+        self.removeOutdatedFiles()
+    
+    def getSceneKey(self, sceneFiles):
+        md5 = hashlib.md5()
+        for sceneFile in sceneFiles:
+            with open(sceneFile, "rb") as inf:
+                for block in iter(lambda: inf.read(2**20), ""):
+                    md5.update(block)
+        return md5.hexdigest()[:16]
+    
+    def getParametersKey(self, radParameters):
+        values = [str(radParameters[key]) for key in self.ambientParameters]
+        return hashlib.md5(" ".join(values)).hexdigest()[:8]
+    
+    def getAmbientFile(self, processCount = 0):
+        """Return the path to the ambient file for a process or None if there is no ambient calculation."""
+        if not self.isActive: return None
+        fileName = self.sceneKey + "_" + self.parametersKey
+        if not self.shareFile: fileName += "_" + str(processCount)
+        return os.path.join(self.cacheFolder, fileName + ".amb")
+    
+    def removeOutdatedFiles(self):
+        for fileName in os.listdir(self.cacheFolder):
+            if fileName.endswith(".amb") and not fileName.startswith(self.sceneKey + "_"):
+                try: os.remove(os.path.join(self.cacheFolder, fileName))
+                except: pass # the file is still in use
+
+
+class hb_ResultCache(object):
+    """
+    Keep the results of grid-based studies for each test point so the next run of the same
+    scene only traces the points that are not in the cache. The scene is identified by a hash
+    of the scene files (geometry, material and sky) and the other inputs (e.g. Radiance
+    parameters). A point is the line of the point in the pts file ("x y z dx dy dz") and the
+    result is the R, G, B output of rtrace. The points of a scene are saved in a text file and
+    the results are saved as float32 values in the same order. Only the last maxScenes scenes
+    are kept.
+    """
+    
+    def __init__(self, cacheFolder, sceneFiles, values = None, maxScenes = 10):
+        if not os.path.isdir(cacheFolder): os.makedirs(cacheFolder)
+        self.cacheFolder = cacheFolder
+        self.sceneKey = self.getSceneKey(sceneFiles, values)
+        self.raysFile = os.path.join(cacheFolder, self.sceneKey + ".rays")
+        self.valuesFile = os.path.join(cacheFolder, self.sceneKey + ".rgb")
+        self.results = self.load()
+        self.removeOldScenes(maxScenes)
+    
+    def getSceneKey(self, sceneFiles, values):
+        md5 = hashlib.md5(json.dumps(values, sort_keys = True))
+        for sceneFile in sceneFiles:
+            with open(sceneFile, "rb") as inf:
+                for block in iter(lambda: inf.read(2**20), ""):
+                    md5.update(block)
+        return md5.hexdigest()
+    
+    def load(self):
+        results = {}
+        if not os.path.isfile(self.raysFile) or not os.path.isfile(self.valuesFile): return results
+        
+        with open(self.raysFile, "r") as raysInf:
+            rays = raysInf.read().splitlines()
+        values = array.array("f")
+        with open(self.valuesFile, "rb") as valuesInf:
+            values.fromstring(valuesInf.read())
+        
+        if len(values) != 3 * len(rays):
+            # the last update didn't finish. start the cache of this scene from scratch
+            os.remove(self.raysFile)
+            os.remove(self.valuesFile)
+            return results
+        
+        for rayCount, ray in enumerate(rays):
+            results[ray] = values[3 * rayCount:3 * rayCount + 3]
+        
+        # mark the scene as recently used
+        os.utime(self.raysFile, None)
+        return results
+    
+    def removeOldScenes(self, maxScenes):
+        raysFiles = [os.path.join(self.cacheFolder, fileName) for fileName in os.listdir(self.cacheFolder) \
+                     if fileName.endswith(".rays")]
+        raysFiles.sort(key = os.path.getmtime, reverse = True)
+        for raysFile in raysFiles[maxScenes:]:
+            if raysFile == self.raysFile: continue
+            for cacheFile in [raysFile, raysFile[:-5] + ".rgb"]:
+                try: os.remove(cacheFile)
+                except: pass
+    
+    def getMissingIndices(self, rays):
+        """Return the indices of the rays that are not in the cache."""
+        return [rayCount for rayCount, ray in enumerate(rays) if not self.results.has_key(ray.strip())]
+    
+    def update(self, rays, rgbValues):
+        """Add the results of the rays to the cache. rgbValues is a flat list of R, G, B values for the rays."""
+        if len(rgbValues) != 3 * len(rays): return False
+        
+        newRays = []
+        newValues = array.array("f")
+        for rayCount, ray in enumerate(rays):
+            ray = ray.strip()
+            if self.results.has_key(ray): continue
+            self.results[ray] = rgbValues[3 * rayCount:3 * rayCount + 3]
+            newRays.append(ray)
+            newValues.extend(self.results[ray])
+        
+        if len(newRays) != 0:
+            with open(self.raysFile, "a") as raysOutf:
+                raysOutf.write("\n".join(newRays) + "\n")
+            with open(self.valuesFile, "ab") as valuesOutf:
+                newValues.tofile(valuesOutf)
+        return True
+    
+    def writeResultFile(self, resultFile, rays):
+        """Write the cached results of the rays as a float Radiance result file which can be used by RADResultAux."""
+        values = array.array("f")
+        for ray in rays: values.extend(self.results[ray.strip()])
+        with open(resultFile, "wb") as resOutf:
+            resOutf.write("#?RADIANCE\nFORMAT=float\n\n")
+            values.tofile(resOutf)
+        return resultFile
+
+
+DCZ_MAGIC = "#HONEYBEE DC ZLIB\n"
+
+
+class hb_DcFile(object):
+    """
+    Read the daylight coefficients of a Daysim .dc file line by line. The file can be
+    a plain .dc file or a zlib compressed .dcz file (see DSResultAux.compressDcFile).
+    Point indices are 0 based and each point is one line in the file.
+    """
+    
+    def __init__(self, dcFile):
+        self.dcFile = dcFile
+        self.inf = None
+        self.numOfPts = None
+        
+        if dcFile.endswith(".dcz"):
+            if zlib == None: raise Exception("zlib is not available to read " + dcFile)
+            self.inf = open(dcFile, "rb")
+            footerSize = struct.calcsize("<QIII")
+            self.inf.seek(-footerSize, 2)
+            indexOffset, self.numOfPts, self.ptsPerBlock, numOfBlocks = struct.unpack("<QIII", self.inf.read(footerSize))
+            self.inf.seek(indexOffset)
+            self.blocks = [struct.unpack("<QI", self.inf.read(12)) for blockCount in range(numOfBlocks)]
+            self.inf.seek(len(DCZ_MAGIC))
+            headingLength = struct.unpack("<I", self.inf.read(4))[0]
+            self.heading = zlib.decompress(self.inf.read(headingLength))
+        
+        else:
+            self.heading = ""
+            with open(dcFile, "r") as dcInf:
+                for line in dcInf:
+                    if not line.startswith("#"): break
+                    self.heading += line
+    
+    def getLines(self, st = 0, end = None):
+        """Yield the lines for the points from st to end."""
+        if self.numOfPts != None:
+            if end == None or end > self.numOfPts: end = self.numOfPts
+        
+        if self.inf != None:
+            for blockCount in range(st // self.ptsPerBlock, (end - 1) // self.ptsPerBlock + 1):
+                blockOffset, blockLength = self.blocks[blockCount]
+                self.inf.seek(blockOffset)
+                lines = zlib.decompress(self.inf.read(blockLength)).splitlines(True)
+                blockSt = blockCount * self.ptsPerBlock
+                for line in lines[max(st - blockSt, 0):end - blockSt]:
+                    yield line
+        
+        else:
+            ptCount = 0
+            with open(self.dcFile, "r") as dcInf:
+                for line in dcInf:
+                    if line.startswith("#"): continue
+                    if end != None and ptCount >= end: break
+                    if ptCount >= st: yield line
+                    ptCount += 1
+    
+    def close(self):
+        if self.inf != None: self.inf.close()
+
+
+class DSResultAux(object):
+    
+    def getOffsets(self, numOfPtsInEachSpace):
+        """Cumulative index of the first point of each space (plus the total number of points)."""
+        offsets = [0]
+        for numOfPts in numOfPtsInEachSpace: offsets.append(offsets[-1] + numOfPts)
+        return offsets
+    
+    def getSpaceViews(self, illFiles, numOfPtsInEachSpace):
+        """
+        Return an hb_IllSpaceView for each space over the merged ill files instead
+        of splitting the files. Call closeSpaceViews when you are done.
+        """
+        return self.loadIllResultSet(illFiles).getSpaceViews(numOfPtsInEachSpace)
+    
+    def closeSpaceViews(self, spaceViews):
+        if len(spaceViews) == 0: return
+        for illMatrix in spaceViews[0].illMatrices: illMatrix.close()
+    
+    def splitIllFiles(self, illFiles, numOfPtsInEachSpace, targetFiles, bufferSize = 2**16):
+        """
+        Merge the lines of the CPU-chunked .ill files and write the values of each space
+        to a separate .ill file. The offsets of the spaces are only calculated once and
+        each target file is written through a buffered writer.
+        """
+        offsets = self.getOffsets(numOfPtsInEachSpace)
+        illInfs = [open(illFile, "r") for illFile in illFiles]
+        outfs = [open(targetFile, "w", bufferSize) for targetFile in targetFiles]
+        
+        try:
+            for line in illInfs[0]:
+                lineSeg = line.strip().split(" ")
+                dateInfo = " ".join(lineSeg[:4])
+                mergedLine = lineSeg[4:]
+                for illInf in illInfs[1:]:
+                    mergedLine.extend(illInf.readline().strip().split(" ")[4:])
+                
+                for spaceCount, outf in enumerate(outfs):
+                    outf.write(dateInfo + " " + " ".join(mergedLine[offsets[spaceCount]:offsets[spaceCount + 1]]) + "\n")
+        finally:
+            for illInf in illInfs: illInf.close()
+            for outf in outfs: outf.close()
+    
+    def splitDcFiles(self, dcFiles, numOfPtsInEachSpace, targetFiles, bufferSize = 2**16):
+        """
+        Write the daylight coefficients of each space to a separate .dc file. The header
+        of the first .dc file is copied to all the new files. The source files can be
+        compressed (.dcz) but the new files are always plain .dc files that Daysim can read.
+        Returns the list of the files that are written.
+        """
+        offsets = self.getOffsets(numOfPtsInEachSpace)
+        dcFiles = map(self.getDcStorageFile, dcFiles)
+        
+        sources = map(hb_DcFile, dcFiles)
+        outfs = [open(targetFile, "w", bufferSize) for targetFile in targetFiles]
+        for outf in outfs: outf.write(sources[0].heading)
+        
+        try:
+            ptCount = 0
+            spaceCount = 0
+            for source in sources:
+                for line in source.getLines():
+                    # move to the next space with points
+                    while spaceCount < len(outfs) - 1 and ptCount >= offsets[spaceCount + 1]:
+                        spaceCount += 1
+                    outfs[spaceCount].write(line)
+                    ptCount += 1
+        finally:
+            for outf in outfs: outf.close()
+            for source in sources: source.close()
+        
+        return targetFiles
+    
+    def getDcStorageFile(self, dcFile):
+        """Return the file that stores the coefficients for a .dc file address (.dc or .dcz)."""
+        if os.path.isfile(dcFile) or not os.path.isfile(dcFile + "z"): return dcFile
+        return dcFile + "z"
+    
+    def compressDcFile(self, dcFile, ptsPerBlock = 256, removeSource = False):
+        """
+        Compress a Daysim .dc file to a .dcz file. The lines are compressed in blocks
+        of points with zlib and an index of the blocks is written at the end of the file
+        so a range of points can be read without decompressing the whole file.
+        """
+        if zlib == None: return None
+        dczFile = dcFile + "z"
+        source = hb_DcFile(dcFile)
+        
+        blocks = []
+        numOfPts = 0
+        with open(dczFile, "wb") as dczOutf:
+            dczOutf.write(DCZ_MAGIC)
+            heading = zlib.compress(source.heading)
+            dczOutf.write(struct.pack("<I", len(heading)))
+            dczOutf.write(heading)
+            
+            lines = []
+            for line in source.getLines():
+                lines.append(line)
+                numOfPts += 1
+                if len(lines) == ptsPerBlock:
+                    block = zlib.compress("".join(lines))
+                    blocks.append((dczOutf.tell(), len(block)))
+                    dczOutf.write(block)
+                    lines = []
+            if len(lines) != 0:
+                block = zlib.compress("".join(lines))
+                blocks.append((dczOutf.tell(), len(block)))
+                dczOutf.write(block)
+            
+            indexOffset = dczOutf.tell()
+            for blockOffset, blockLength in blocks:
+                dczOutf.write(struct.pack("<QI", blockOffset, blockLength))
+            dczOutf.write(struct.pack("<QIII", indexOffset, numOfPts, ptsPerBlock, len(blocks)))
+        
+        source.close()
+        if removeSource: os.remove(dcFile)
+        return dczFile
+    
+    def compressDcFiles(self, dcFiles, removeSource = False, parallel = True):
+        """Compress a list of .dc files in parallel."""
+        dczFiles = [None] * len(dcFiles)
+        
+        def compressFile(fileCount):
+            dczFiles[fileCount] = self.compressDcFile(dcFiles[fileCount], removeSource = removeSource)
+        
+        if parallel and len(dcFiles) > 1:
+            tasks.Parallel.ForEach(range(len(dcFiles)), compressFile)
+        else:
+            for fileCount in range(len(dcFiles)): compressFile(fileCount)
+        
+        return dczFiles
+    
+    def getIllCacheFileNames(self, illFile):
+        # the binary matrix and the header are saved next to the .ill file
+        return illFile + "b", illFile + "h"
+    
+    def readIllCacheHeader(self, illFile):
+        binFile, headerFile = self.getIllCacheFileNames(illFile)
+        if not (os.path.isfile(binFile) and os.path.isfile(headerFile)): return None
+        
+        header = {}
+        dates = []
+        with open(headerFile, "r") as headerInf:
+            for line in headerInf:
+                line = line.strip()
+                if line == "" or line.startswith("#"): continue
+                key, value = line.split(" ", 1)
+                if key == "date": dates.append(value)
+                else: header[key] = value
+        header["dates"] = dates
+        return header
+    
+    def isIllCacheValid(self, illFile):
+        header = self.readIllCacheHeader(illFile)
+        if header == None: return False
+        try:
+            # cache is stale if the .ill file is changed after the conversion
+            if int(header["source_size"]) != os.path.getsize(illFile): return False
+            if "%.2f"%os.path.getmtime(illFile) != header["source_mtime"]: return False
+            binFile = self.getIllCacheFileNames(illFile)[0]
+            return os.path.getsize(binFile) == 4 * int(header["hours"]) * int(header["points"])
+        except:
+            return False
+    
+    def illToBinary(self, illFile):
+        """
+        Convert a Daysim .ill file to a float32 hour x point matrix (*.illb)
+        plus a small text header (*.illh) for the date columns.
+        """
+        binFile, headerFile = self.getIllCacheFileNames(illFile)
+        
+        dates = []
+        numOfPts = None
+        with open(illFile, "r") as illInf:
+            with open(binFile, "wb") as binOutf:
+                for line in illInf:
+                    if line.startswith("#"): continue
+                    lineSeg = line.split()
+                    if len(lineSeg) == 0: continue
+                    # first three columns are month, day and hour
+                    dates.append(" ".join(lineSeg[:3]))
+                    values = array.array('f', map(float, lineSeg[3:]))
+                    if numOfPts == None: numOfPts = len(values)
+                    values.tofile(binOutf)
+        
+        if numOfPts == None: numOfPts = 0
+        
+        self.writeIllCacheHeader(illFile, dates, numOfPts)
+        return hb_IllMatrix(binFile, len(dates), numOfPts, dates)
+    
+    def writeIllCacheHeader(self, illFile, dates, numOfPts):
+        """Write the header of the binary cache. Call it after the .ill file is written."""
+        headerFile = self.getIllCacheFileNames(illFile)[1]
+        with open(headerFile, "w") as headerOutf:
+            headerOutf.write("#HONEYBEE ILL CACHE\n")
+            headerOutf.write("source_size " + str(os.path.getsize(illFile)) + "\n")
+            headerOutf.write("source_mtime " + "%.2f"%os.path.getmtime(illFile) + "\n")
+            headerOutf.write("hours " + str(len(dates)) + "\n")
+            headerOutf.write("points " + str(numOfPts) + "\n")
+            for date in dates: headerOutf.write("date " + date + "\n")
+    
+    def loadIllMatrix(self, illFile, convert = False):
+        """
+        Return an hb_IllMatrix for the .ill file if the binary cache exists.
+        Set convert to True to generate the cache if it is missing or out of date.
+        """
+        if self.isIllCacheValid(illFile):
+            header = self.readIllCacheHeader(illFile)
+            return hb_IllMatrix(self.getIllCacheFileNames(illFile)[0], int(header["hours"]), \
+                                int(header["points"]), header["dates"])
+        elif convert:
+            return self.illToBinary(illFile)
+        else:
+            return None
+    
+    def loadIllMatrices(self, illFiles, convert = True, parallel = True):
+        """
+        Load the binary matrices for a list of ill files. The files are converted
+        in parallel since parsing the text files is the expensive part.
+        """
+        illMatrices = [None] * len(illFiles)
+        
+        def loadFile(fileCount):
+            illMatrices[fileCount] = self.loadIllMatrix(illFiles[fileCount], convert)
+        
+        if parallel and len(illFiles) > 1:
+            tasks.Parallel.ForEach(range(len(illFiles)), loadFile)
+        else:
+            for fileCount in range(len(illFiles)): loadFile(fileCount)
+        
+        return illMatrices
+    
+    def sortIllFiles(self, illFiles):
+        """Sort the CPU-chunked ill files based on the CPU number (_10.ill should come after _9.ill)."""
+        try:
+            return sorted(illFiles, key=lambda fileName: int(fileName.split(".")[-2].split("_")[-1]))
+        except:
+            return list(illFiles)
+    
+    def findPatternFile(self, illFile):
+        """Find the .ptn file of the study for a chunked ill file. Returns None if there is no pattern file."""
+        return PtsFileAux().findPatternFile(illFile)
+    
+    def readPatternFile(self, ptnFile):
+        """Read the number of points in each branch from a .ptn file."""
+        return PtsFileAux().readPatternFile(ptnFile)
+    
+    def loadIllResultSet(self, illFiles, ptnFile = None, parallel = True):
+        """
+        Load the CPU-chunked ill files of a study and stitch them together in the
+        global order of the test points. The chunks are loaded (and converted if needed)
+        in parallel. Returns an hb_IllMatrixSet. Call close when you are done.
+        """
+        illFiles = self.sortIllFiles(illFiles)
+        illMatrices = self.loadIllMatrices(illFiles, convert = True, parallel = parallel)
+        
+        if ptnFile == None and len(illFiles) != 0: ptnFile = self.findPatternFile(illFiles[0])
+        pattern = None
+        if ptnFile != None: pattern = self.readPatternFile(ptnFile)
+        
+        illMatrixSet = hb_IllMatrixSet(illMatrices, pattern)
+        if pattern != None and sum(pattern) != illMatrixSet.numOfPts:
+            illMatrixSet.close()
+            raise Exception("Number of points in " + os.path.basename(ptnFile) + " [" + str(sum(pattern)) + \
+                            "] doesn't match the number of points in the ill files [" + str(illMatrixSet.numOfPts) + "].")
+        return illMatrixSet
+    
+    def getIllHourIndexFileName(self, illFile):
+        return illFile + "x"
+    
+    def illHourIndex(self, illFile):
+        """
+        Write the byte offset of each hour in a text .ill file to an index
+        file (*.illx) and return the offsets.
+        """
+        offsets = []
+        with open(illFile, "rb") as illInf:
+            offset = 0
+            line = illInf.readline()
+            while line:
+                if not line.startswith("#") and line.strip() != "":
+                    offsets.append(offset)
+                offset += len(line)
+                line = illInf.readline()
+        
+        with open(self.getIllHourIndexFileName(illFile), "w") as indexOutf:
+            indexOutf.write("#HONEYBEE ILL HOUR INDEX\n")
+            indexOutf.write("source_size " + str(os.path.getsize(illFile)) + "\n")
+            indexOutf.write("source_mtime " + "%.2f"%os.path.getmtime(illFile) + "\n")
+            for offset in offsets: indexOutf.write(str(offset) + "\n")
+        
+        return offsets
+    
+    def loadIllHourIndex(self, illFile):
+        """Return the hour offsets of a .ill file. The index is generated if it is missing or out of date."""
+        indexFile = self.getIllHourIndexFileName(illFile)
+        if os.path.isfile(indexFile):
+            with open(indexFile, "r") as indexInf:
+                lines = indexInf.readlines()
+            try:
+                if lines[1].split()[-1] == str(os.path.getsize(illFile)) and \
+                   lines[2].split()[-1] == "%.2f"%os.path.getmtime(illFile):
+                    return map(int, lines[3:])
+            except:
+                pass
+        
+        return self.illHourIndex(illFile)
+    
+    def readIllHours(self, illFile, hours):
+        """
+        Return the values of a .ill file for a list of hours (0 based). The binary
+        matrix is used if it is available, otherwise each hour is one seek in the
+        text file using the hour index.
+        """
+        illMatrix = self.loadIllMatrix(illFile)
+        if illMatrix != None:
+            hourlyValues = [list(values) for values in illMatrix.getHours(hours)]
+            illMatrix.close()
+            return hourlyValues
+        
+        offsets = self.loadIllHourIndex(illFile)
+        hourlyValues = []
+        with open(illFile, "rb") as illInf:
+            for hour in hours:
+                illInf.seek(offsets[hour])
+                hourlyValues.append(map(float, illInf.readline().split()[3:]))
+        return hourlyValues
+    
+    def readOccupancyFile(self, occFile):
+        """Return a list of booleans for the hours of the year from a Daysim occupancy file."""
+        occupancy = []
+        with open(occFile, "r") as occInf:
+            for line in occInf:
+                if line.startswith("#") or line.strip() == "": continue
+                occupancy.append(float(line.strip().split(",")[-1]) > 0)
+        return occupancy
+    
+    def calculateAnnualMetrics(self, illFiles, numOfPtsInEachSpace, occFiles, DLAIllumThresholds, sDAThreshold = 50):
+        """
+        Calculate Daylight Autonomy, Continuous Daylight Autonomy, Useful Daylight
+        Illuminance and spatial Daylight Autonomy for all the spaces in a single pass
+        over the hours of the year.
+        
+        illFiles is the list of .ill files for the case with no dynamic shading, sorted
+        in the same order as the points. Each space can have its own occupancy file and
+        illuminance threshold. The results are returned as a dictionary of lists with
+        one list of values for each space.
+        """
+        numOfSpaces = len(numOfPtsInEachSpace)
+        
+        # load each occupancy file only once
+        occProfiles = {}
+        spaceOccFiles = []
+        thresholds = []
+        for spaceCount in range(numOfSpaces):
+            try: occFile = occFiles[spaceCount]
+            except: occFile = occFiles[0]
+            if occFile not in occProfiles: occProfiles[occFile] = self.readOccupancyFile(occFile)
+            spaceOccFiles.append(occFile)
+            
+            try: thresholds.append(float(DLAIllumThresholds[spaceCount]))
+            except: thresholds.append(float(DLAIllumThresholds[0]))
+        
+        spaceViews = self.getSpaceViews(illFiles, numOfPtsInEachSpace)
+        # the occupancy files should have the same hours as the ill files
+        for occFile, occProfile in occProfiles.items():
+            if len(occProfile) != spaceViews[0].numOfHours:
+                self.closeSpaceViews(spaceViews)
+                raise Exception("The occupancy file " + occFile + " has " + str(len(occProfile)) + " hours but the results have " + \
+                                str(spaceViews[0].numOfHours) + " hours.")
+        
+        DA = [[0] * numOfPts for numOfPts in numOfPtsInEachSpace]
+        CDA = [[0.0] * numOfPts for numOfPts in numOfPtsInEachSpace]
+        UDILess = [[0] * numOfPts for numOfPts in numOfPtsInEachSpace]
+        UDIIn = [[0] * numOfPts for numOfPts in numOfPtsInEachSpace]
+        UDIMore = [[0] * numOfPts for numOfPts in numOfPtsInEachSpace]
+        occHours = [0] * numOfSpaces
+        
+        for hour in range(spaceViews[0].numOfHours):
+            for spaceCount, spaceView in enumerate(spaceViews):
+                if not occProfiles[spaceOccFiles[spaceCount]][hour]: continue
+                occHours[spaceCount] += 1
+                threshold = thresholds[spaceCount]
+                spaceDA, spaceCDA = DA[spaceCount], CDA[spaceCount]
+                spaceUDILess, spaceUDIIn, spaceUDIMore = UDILess[spaceCount], UDIIn[spaceCount], UDIMore[spaceCount]
+                for ptCount, illuminance in enumerate(spaceView.getHour(hour)):
+                    if illuminance >= threshold:
+                        spaceDA[ptCount] += 1
+                        spaceCDA[ptCount] += 1
+                    else:
+                        spaceCDA[ptCount] += illuminance / threshold
+                    if illuminance < 100: spaceUDILess[ptCount] += 1
+                    elif illuminance <= 2000: spaceUDIIn[ptCount] += 1
+                    else: spaceUDIMore[ptCount] += 1
+        
+        self.closeSpaceViews(spaceViews)
+        
+        # convert the values to percentage
+        results = {"DA": [], "CDA": [], "UDI_less_100": [], "UDI_100_2000": [], "UDI_more_2000": [], "sDA": []}
+        for spaceCount in range(numOfSpaces):
+            totalHours = float(max(occHours[spaceCount], 1))
+            
+            def toPercentage(values):
+                return [round(100 * value / totalHours, 2) for value in values[spaceCount]]
+            
+            results["DA"].append(toPercentage(DA))
+            results["CDA"].append(toPercentage(CDA))
+            results["UDI_less_100"].append(toPercentage(UDILess))
+            results["UDI_100_2000"].append(toPercentage(UDIIn))
+            results["UDI_more_2000"].append(toPercentage(UDIMore))
+            results["sDA"].append(self.getsDA(results["DA"][-1], sDAThreshold))
+        
+        return results
+    
+    def getAnnualMetricsFileName(self, illFile):
+        return os.path.splitext(illFile)[0] + "_metrics.json"
+    
+    def saveAnnualMetrics(self, metrics, metricsFile):
+        """Save the results of calculateAnnualMetrics to a json file."""
+        with open(metricsFile, "w") as metricsOutf:
+            json.dump(metrics, metricsOutf)
+    
+    def loadAnnualMetrics(self, metricsFile):
+        """Load the results of calculateAnnualMetrics from a json file. Returns None if the file can't be read."""
+        try:
+            with open(metricsFile, "r") as metricsInf:
+                return json.load(metricsInf)
+        except:
+            return None
+    
+    def readBlindProfiles(self, annualProfile):
+        """Read the blind columns of a Daysim annual profile (*_intgain.csv). Returns one list of values for each blind group."""
+        headings = []
+        resultDict = {}
+        with open(annualProfile, "r") as inf:
+            for lineCount, line in enumerate(inf):
+                if lineCount == 3:
+                    headings = line.strip().split(",")[3:]
+                    for heading in range(len(headings)):
+                        resultDict[heading] = []
+                elif lineCount > 3:
+                    results = line.strip().split(",")[3:]
+                    for resCount, result in enumerate(results):
+                        resultDict[resCount].append(float(result))
+        
+        return [resultDict[headingCount] for headingCount, heading in enumerate(headings) \
+                if heading.strip().startswith("blind")]
+    
+    def blendDynamicShading(self, illFileSets, numOfPtsInEachSpace, annualProfiles, targetIllFile):
+        """
+        Mix the results of the case with no blinds and the shading groups based on
+        the blind schedules in the annual profiles of the spaces. If more than one group
+        is closed in an hour the first one wins (shading group I before shading group II)
+        the same as Read DS Result for a point.
+        
+        illFileSets is a list of the ill files for no blinds, shading group I, etc.
+        The mixed hour x point matrix is written to targetIllFile together with its
+        binary cache so it can be used by any of the readers. The file is only
+        recalculated if the ill files or the annual profiles have changed.
+        """
+        illFileSets = [self.sortIllFiles(illFileSets[setCount]) for setCount in range(len(illFileSets))]
+        
+        manifest = hb_ResultManifest(os.path.splitext(targetIllFile)[0] + "_manifest.json")
+        inputFiles = list(chain.from_iterable(illFileSets)) + list(annualProfiles)
+        if manifest.isStageValid("blend", inputFiles, numOfPtsInEachSpace, [targetIllFile]) \
+           and self.isIllCacheValid(targetIllFile):
+            return targetIllFile
+        
+        blindProfiles = map(self.readBlindProfiles, annualProfiles)
+        illMatrixSets = [self.loadIllResultSet(illFiles) for illFiles in illFileSets]
+        offsets = self.getOffsets(numOfPtsInEachSpace)
+        dates = illMatrixSets[0].dates
+        
+        binFile = self.getIllCacheFileNames(targetIllFile)[0]
+        with open(targetIllFile, "w") as illOutf:
+            with open(binFile, "wb") as binOutf:
+                for hour in range(illMatrixSets[0].numOfHours):
+                    # find the shading group in effect for each space. the first group that is closed wins
+                    groupsInEffect = []
+                    for spaceCount in range(len(numOfPtsInEachSpace)):
+                        groupInEffect = 0
+                        if spaceCount < len(blindProfiles):
+                            for groupCount, blindProfile in enumerate(blindProfiles[spaceCount]):
+                                if groupCount + 1 < len(illMatrixSets) and blindProfile[hour] == 1:
+                                    groupInEffect = groupCount + 1
+                                    break
+                        groupsInEffect.append(groupInEffect)
+                    
+                    # only read the matrices that are in effect for this hour
+                    hourlyValues = {}
+                    for groupInEffect in set(groupsInEffect):
+                        hourlyValues[groupInEffect] = illMatrixSets[groupInEffect].getHour(hour)
+                    
+                    mixedValues = array.array('f')
+                    for spaceCount, groupInEffect in enumerate(groupsInEffect):
+                        mixedValues.extend(hourlyValues[groupInEffect][offsets[spaceCount]:offsets[spaceCount + 1]])
+                    
+                    mixedValues.tofile(binOutf)
+                    illOutf.write(dates[hour] + "  " + " ".join(["%.2f"%value for value in mixedValues]) + "\n")
+        
+        for illMatrixSet in illMatrixSets: illMatrixSet.close()
+        
+        self.writeIllCacheHeader(targetIllFile, dates, offsets[-1])
+        manifest.updateStage("blend", inputFiles, numOfPtsInEachSpace, [targetIllFile])
+        manifest.save()
+        return targetIllFile
+    
+    def calculateIlluminanceBins(self, illFiles, hourMask, thresholds, parallel = True):
+        """
+        Count the number of hours that each point falls in each illuminance bin.
+        
+        The bins are defined by a sorted list of thresholds: [<= t0], (t0, t1], ... [> tn].
+        hourMask is a list of 8760 booleans for the hours that should be considered.
+        Each ill file is loaded once as a binary matrix and the files are processed in
+        parallel. Returns one list of counts for each bin in the order of the points.
+        """
+        thresholds = sorted(thresholds)
+        numOfBins = len(thresholds) + 1
+        hours = [hour for hour, isIncluded in enumerate(hourMask) if isIncluded]
+        fileResults = [None] * len(illFiles)
+        
+        def calculateFile(fileCount):
+            illMatrix = self.loadIllMatrix(illFiles[fileCount], convert = True)
+            counts = [[0] * illMatrix.numOfPts for binCount in range(numOfBins)]
+            for hour in hours:
+                if hour >= illMatrix.numOfHours: break
+                for ptCount, illuminance in enumerate(illMatrix.getHour(hour)):
+                    counts[bisect.bisect_left(thresholds, illuminance)][ptCount] += 1
+            illMatrix.close()
+            fileResults[fileCount] = counts
+        
+        if parallel and len(illFiles) > 1:
+            tasks.Parallel.ForEach(range(len(illFiles)), calculateFile)
+        else:
+            for fileCount in range(len(illFiles)): calculateFile(fileCount)
+        
+        # put the results of all the files together
+        bins = [[] for binCount in range(numOfBins)]
+        for counts in fileResults:
+            for binCount in range(numOfBins): bins[binCount].extend(counts[binCount])
+        return bins
+    
+    def getsDA(self, DLARes, threshold = 50):
+        """Percentage of the points that meet the threshold for Daylight Autonomy."""
+        if len(DLARes) == 0: return "%.2f"%0
+        moreThan = 0
+        for res in DLARes:
+            if res >= threshold:
+                moreThan += 1
+        return "%.2f"%((float(moreThan)/len(DLARes)) * 100)
+
+
+class hb_Command(object):
+    """
+    A command as a list of arguments with the files for stdin and stdout, the working
+    directory and the environment. The program is started directly without a shell so
+    the command runs the same way on Windows and other systems. Relative stdin and stdout
+    files are relative to the working directory. toBatchLine returns the same command as
+    a line for a batch file.
+    """
+    
+    def __init__(self, argv, stdin = None, stdout = None, cwd = None, env = None):
+        self.argv = [str(arg) for arg in argv]
+        self.stdin = stdin
+        self.stdout = stdout
+        self.cwd = cwd
+        self.env = env
+    
+    @staticmethod
+    def getEnvironment(paths = [], rayPaths = []):
+        """Copy of the current environment with the folders added to PATH and RAYPATH."""
+        env = dict(os.environ)
+        # the name of the variable is not case-sensitive on Windows
+        pathKey = "PATH"
+        for key in env.keys():
+            if key.upper() == "PATH": pathKey = key
+        env[pathKey] = os.pathsep.join(list(paths) + [env.get(pathKey, "")])
+        env["RAYPATH"] = os.pathsep.join(["."] + list(rayPaths))
+        return env
+    
+    def getFilePath(self, fileName):
+        if fileName == None or self.cwd == None: return fileName
+        return os.path.join(self.cwd, fileName)
+    
+    def run(self):
+        """Run the command and wait for it to finish. Returns the exit code and the error output."""
+        stdinFile = None
+        stdoutFile = subprocess.PIPE
+        try:
+            if self.stdin != None: stdinFile = open(self.getFilePath(self.stdin), "rb")
+            if self.stdout != None: stdoutFile = open(self.getFilePath(self.stdout), "wb")
+            process = subprocess.Popen(self.argv, stdin = stdinFile, stdout = stdoutFile, stderr = subprocess.PIPE, \
+                                       cwd = self.cwd, env = self.env)
+            stdout, stderr = process.communicate()
+            return process.returncode, stderr
+        except Exception, e:
+            return -1, `e`
+        finally:
+            if stdinFile != None: stdinFile.close()
+            if stdoutFile != subprocess.PIPE: stdoutFile.close()
+    
+    def toBatchLine(self):
+        args = []
+        for arg in self.argv:
+            if " " in arg: arg = '"' + arg + '"'
+            args.append(arg)
+        line = " ".join(args)
+        if self.stdin != None: line += " < " + self.stdin
+        if self.stdout != None: line += " > " + self.stdout
+        return line + "\n"
+
+
+class hb_JobQueue(object):
+    """
+    Run a list of jobs with a limited number of workers. Each job is a command (e.g. a
+    batch file) and the list of the files that it should generate. Each worker starts the
+    next job from the queue as soon as its last job is over and waits on the process so
+    all the workers are busy until the end and no time is spent on polling. A job fails if
+    the exit code is not 0 or any of its output files is missing. The failed jobs are put
+    back in the queue for the number of retries. The exit code and the error output of
+    each job are kept in jobResults.
+    """
+    
+    def __init__(self, numOfWorkers, retries = 1):
+        self.numOfWorkers = max(int(numOfWorkers), 1)
+        self.retries = retries
+        self.jobResults = []
+    
+    def runJob(self, command, outputFiles, attempt = 0):
+        """
+        Run a command and wait for it to finish. The command is a shell command or an hb_Command
+        or a list of hb_Commands which run one after another. Returns the result of the job as a
+        dictionary.
+        """
+        startTime = time.time()
+        if isinstance(command, basestring):
+            process = subprocess.Popen(command, shell = True, stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+            # the output is read so the job never waits for us
+            stdout, stderr = process.communicate()
+            exitCode = process.returncode
+        else:
+            if isinstance(command, hb_Command): command = [command]
+            for cmd in command:
+                exitCode, stderr = cmd.run()
+                if exitCode != 0: break
+            command = " && ".join([cmd.toBatchLine().strip() for cmd in command])
+        
+        success = exitCode == 0 and all(map(os.path.isfile, outputFiles))
+        return {"command": command, "success": success, "exitCode": exitCode, "stderr": stderr,
+                "attempts": attempt + 1, "duration": time.time() - startTime}
+    
+    def run(self, jobs):
+        """
+        jobs is a list of (command, outputFiles). Returns a list of True/False for
+        the jobs in the same order.
+        """
+        queue = [(jobCount, 0) for jobCount in range(len(jobs))]
+        queue.reverse()
+        lock = threading.Lock()
+        self.jobResults = [None] * len(jobs)
+        
+        def worker():
+            while True:
+                with lock:
+                    if len(queue) == 0: return
+                    jobCount, attempt = queue.pop()
+                command, outputFiles = jobs[jobCount]
+                self.jobResults[jobCount] = self.runJob(command, outputFiles, attempt)
+                
+                # retry the failed job before the rest of the jobs
+                if not self.jobResults[jobCount]["success"] and attempt < self.retries:
+                    with lock: queue.append((jobCount, attempt + 1))
+        
+        workers = [threading.Thread(target = worker) for workerCount in range(min(self.numOfWorkers, len(jobs)))]
+        for thread in workers: thread.start()
+        for thread in workers: thread.join()
+        
+        self.printReport()
+        return [jobResult != None and jobResult["success"] for jobResult in self.jobResults]
+    
+    def printReport(self):
+        for jobCount, jobResult in enumerate(self.jobResults):
+            if jobResult == None or jobResult["success"]: continue
+            print "Job " + str(jobResult.get("name", jobCount)) + " failed after " + str(jobResult["attempts"]) + " attempt(s) " + \
+                  "with exit code " + str(jobResult["exitCode"]) + ": " + jobResult["command"]
+            if jobResult["stderr"] != None and jobResult["stderr"].strip() != "":
+                print jobResult["stderr"].strip()
+
+
+class hb_TaskGraph(hb_JobQueue):
+    """
+    Run the tasks of a study as a dependency graph with a limited number of workers.
+    A task is a command (see hb_JobQueue.runJob) or a python function, the names of the tasks that should
+    be finished before it can start and the files that it should generate. A task starts
+    as soon as all its dependencies are finished so independent tasks (e.g. the direct and
+    the diffuse passes of different chunks) overlap. The tasks that depend on a failed task
+    are skipped. jobResults keeps the result of each task in the order that they are added.
+    """
+    
+    def __init__(self, numOfWorkers, retries = 1):
+        hb_JobQueue.__init__(self, numOfWorkers, retries)
+        self.tasks = {}
+        self.taskNames = []
+    
+    def addTask(self, name, command, dependencies = [], outputFiles = []):
+        """Add a task to the graph and return its name so it can be used as a dependency."""
+        if self.tasks.has_key(name): raise Exception("There is already a task named " + name + ".")
+        self.tasks[name] = (command, list(dependencies), outputFiles)
+        self.taskNames.append(name)
+        return name
+    
+    def runTask(self, name, attempt = 0):
+        command, dependencies, outputFiles = self.tasks[name]
+        if not callable(command):
+            result = self.runJob(command, outputFiles, attempt)
+        else:
+            startTime = time.time()
+            try:
+                command()
+                exitCode, stderr = 0, ""
+            except Exception, e:
+                exitCode, stderr = -1, `e`
+            success = exitCode == 0 and all(map(os.path.isfile, outputFiles))
+            result = {"command": name, "success": success, "exitCode": exitCode, "stderr": stderr,
+                      "attempts": attempt + 1, "duration": time.time() - startTime}
+        result["name"] = name
+        return result
+    
+    def run(self):
+        """Run all the tasks. Returns a dictionary of True/False for each task name."""
+        for name in self.taskNames:
+            for dependency in self.tasks[name][1]:
+                if not self.tasks.has_key(dependency):
+                    raise Exception(name + " depends on " + dependency + " which is not a task.")
+        
+        # pending, running, done, failed or skipped
+        status = dict([(name, "pending") for name in self.taskNames])
+        attempts = dict([(name, 0) for name in self.taskNames])
+        results = {}
+        condition = threading.Condition()
+        
+        def getNextTask():
+            # skip the tasks that can't run anymore and return the first task that is ready
+            for name in self.taskNames:
+                if status[name] != "pending": continue
+                dependencyStatus = [status[dependency] for dependency in self.tasks[name][1]]
+                if "failed" in dependencyStatus or "skipped" in dependencyStatus:
+                    status[name] = "skipped"
+                    return getNextTask()
+            for name in self.taskNames:
+                if status[name] == "pending" and all([status[dependency] == "done" for dependency in self.tasks[name][1]]):
+                    return name
+            return None
+        
+        def worker():
+            while True:
+                with condition:
+                    while True:
+                        name = getNextTask()
+                        if name != None: break
+                        if "running" not in status.values():
+                            # nothing is running so the rest of the tasks can never start
+                            for taskName in self.taskNames:
+                                if status[taskName] == "pending": status[taskName] = "skipped"
+                            condition.notify_all()
+                            return
+                        condition.wait()
+                    status[name] = "running"
+                
+                result = self.runTask(name, attempts[name])
+                
+                with condition:
+                    results[name] = result
+                    if result["success"]:
+                        status[name] = "done"
+                    elif attempts[name] < self.retries:
+                        attempts[name] += 1
+                        status[name] = "pending"
+                    else:
+                        status[name] = "failed"
+                    condition.notify_all()
+        
+        workers = [threading.Thread(target = worker) for workerCount in range(min(self.numOfWorkers, len(self.taskNames)))]
+        for thread in workers: thread.start()
+        for thread in workers: thread.join()
+        
+        self.jobResults = [results.get(name) for name in self.taskNames]
+        self.printReport()
+        for name in self.taskNames:
+            if status[name] == "skipped": print "Task " + name + " is skipped since its dependencies did not finish."
+        return dict([(name, status[name] == "done") for name in self.taskNames])
+
+
+class hb_WorkQueue(hb_TaskGraph):
+    """
+    Run the tasks of a study on many nodes with a work queue in a shared folder. The
+    commands of each task are published as a job file in queueFolder\\jobs. Worker processes
+    on any node claim the jobs by moving them to queueFolder\\claimed and write the exit code
+    of each job to queueFolder\\results. The dependencies, the retries and the python functions
+    (e.g. merging the results) are handled here the same way as hb_TaskGraph. The results of the
+    chunks are written to the study folder so the study folder and the queue folder should have
+    the same path on all the nodes (e.g. \\\\server\\share\\...).
+    
+    Run "python hb_worker.py queueFolder" on each node to add it to the queue. numOfLocalWorkers
+    workers also run on this machine while the study is running. A worker sends a heartbeat while
+    it runs a job and the jobs of the workers that stop sending heartbeats for claimTimeout seconds
+    are put back in the queue. The output of a job is only moved in place by the worker that still
+    has the claim when the job is over. One poller checks the results and the claims of all the jobs.
+    """
+    
+    # the worker only needs python so the same file runs on this machine and on the other nodes
+    workerScript = r'''# Honeybee work queue worker
+# usage: python hb_worker.py queueFolder [idleTimeout]
+# the worker stops after idleTimeout seconds without any jobs or if there is a file named stop in queueFolder
+import os
+import sys
+import json
+import time
+import socket
+import subprocess
+import threading
+
+# seconds between the heartbeats if the job doesn't set it
+heartbeatInterval = 10
+
+def makeFolders(queueFolder):
+    for folder in ["jobs", "claimed", "results"]:
+        try: os.makedirs(os.path.join(queueFolder, folder))
+        except OSError: pass
+
+def getWorkerName(suffix = ""):
+    return socket.gethostname() + "_" + str(os.getpid()) + suffix
+
+def claimJob(queueFolder, workerName):
+    jobsFolder = os.path.join(queueFolder, "jobs")
+    for jobFileName in sorted(os.listdir(jobsFolder)):
+        if not jobFileName.endswith(".json"): continue
+        # each claim has its own file so a worker never touches the claim of another worker
+        claimFile = os.path.join(queueFolder, "claimed", jobFileName[:-5] + "__" + workerName + ".json")
+        try:
+            # rename is atomic so only one of the workers gets the job
+            os.rename(os.path.join(jobsFolder, jobFileName), claimFile)
+        except OSError:
+            continue
+        # rename keeps the time of the job file. the first heartbeat is sent right away
+        # so the coordinator doesn't take a job that has waited in the queue as stale
+        try: os.utime(claimFile, None)
+        except OSError: pass
+        with open(claimFile, "r") as jobFile:
+            return json.load(jobFile), claimFile
+    return None, None
+
+def getEnvironment(command):
+    env = dict(os.environ)
+    pathKey = "PATH"
+    for key in env.keys():
+        if key.upper() == "PATH": pathKey = key
+    if command.get("path"): env[pathKey] = command["path"] + os.pathsep + env.get(pathKey, "")
+    if command.get("rayPath"): env["RAYPATH"] = command["rayPath"]
+    return env
+
+def replaceFile(source, target):
+    # os.replace is atomic on all the systems. python 2 can only rename over a file on posix
+    if hasattr(os, "replace"): return os.replace(source, target)
+    if os.name == "nt" and os.path.isfile(target): os.remove(target)
+    os.rename(source, target)
+
+def runCommand(command, tempFiles, workerName):
+    cwd = command.get("cwd")
+    def getFilePath(fileName):
+        if cwd == None: return fileName
+        return os.path.join(cwd, fileName)
+    # stdout is written to a file of this claim. a job that is put back in the queue can
+    # run on two workers at the same time and only the worker that keeps the claim moves
+    # its files in place. the later commands of the job read the files of this claim
+    argv = [tempFiles.get(getFilePath(arg), arg) for arg in command["argv"]]
+    stdinFile = None
+    stdoutFile = subprocess.PIPE
+    try:
+        if command.get("stdin") != None:
+            stdinPath = getFilePath(command["stdin"])
+            stdinFile = open(tempFiles.get(stdinPath, stdinPath), "rb")
+        if command.get("stdout") != None:
+            stdoutPath = getFilePath(command["stdout"])
+            tempFiles[stdoutPath] = stdoutPath + "." + workerName + ".tmp"
+            stdoutFile = open(tempFiles[stdoutPath], "wb")
+        process = subprocess.Popen(argv, stdin = stdinFile, stdout = stdoutFile, stderr = subprocess.PIPE, \
+                                   cwd = cwd, env = getEnvironment(command))
+        stdout, stderr = process.communicate()
+        if not isinstance(stderr, str): stderr = stderr.decode("utf-8", "replace")
+        return process.returncode, stderr
+    except Exception as e:
+        return -1, repr(e)
+    finally:
+        if stdinFile != None: stdinFile.close()
+        if stdoutFile != subprocess.PIPE: stdoutFile.close()
+
+def keepAlive(claimFile, jobIsOver, interval):
+    # the coordinator puts the job back in the queue if the claim file stops changing
+    while not jobIsOver.wait(interval):
+        try: os.utime(claimFile, None)
+        except OSError: return
+
+def runJob(queueFolder, job, claimFile, workerName):
+    startTime = time.time()
+    jobIsOver = threading.Event()
+    heartbeat = threading.Thread(target = keepAlive, args = (claimFile, jobIsOver, job.get("heartbeatInterval", heartbeatInterval)))
+    heartbeat.daemon = True
+    heartbeat.start()
+    tempFiles = {}
+    try:
+        exitCode, stderr = 0, ""
+        for command in job["commands"]:
+            exitCode, stderr = runCommand(command, tempFiles, workerName)
+            if exitCode != 0: break
+    finally:
+        jobIsOver.set()
+    
+    # the job is accepted if the claim is still there. the coordinator puts the claims of
+    # the stopped workers back in the queue with a rename too so only one worker gets here
+    acceptedFile = claimFile[:-5] + ".accepted"
+    try:
+        os.rename(claimFile, acceptedFile)
+    except OSError:
+        for tempFile in tempFiles.values():
+            try: os.remove(tempFile)
+            except OSError: pass
+        return
+    
+    try:
+        for outputFile, tempFile in tempFiles.items():
+            if os.path.isfile(tempFile): replaceFile(tempFile, outputFile)
+    except OSError as e:
+        exitCode, stderr = -1, "Failed to write the output of the job: " + repr(e)
+    
+    result = {"id": job["id"], "exitCode": exitCode, "stderr": stderr, "worker": workerName, \
+              "duration": time.time() - startTime}
+    writeResult(os.path.join(queueFolder, "results", job["id"] + ".json"), result, workerName)
+    try: os.remove(acceptedFile)
+    except OSError: pass
+
+def writeResult(resultFile, result, workerName):
+    # the result is written to a temporary file and then linked (or renamed on Windows) to
+    # the result file in one step. both fail if the file is there so the first worker wins
+    # and the coordinator never reads a half-written result
+    tempFile = resultFile[:-5] + "__" + workerName + ".tmp"
+    with open(tempFile, "w") as outf: json.dump(result, outf)
+    try:
+        if os.name == "nt": os.rename(tempFile, resultFile)
+        else: os.link(tempFile, resultFile)
+        return True
+    except OSError:
+        return False
+    finally:
+        if os.path.isfile(tempFile): os.remove(tempFile)
+
+def work(queueFolder, idleTimeout = None, shouldStop = None, workerName = None):
+    if workerName == None: workerName = getWorkerName()
+    makeFolders(queueFolder)
+    lastJobTime = time.time()
+    while not os.path.isfile(os.path.join(queueFolder, "stop")):
+        if shouldStop != None and shouldStop(): return
+        job, claimFile = claimJob(queueFolder, workerName)
+        if job == None:
+            if idleTimeout != None and time.time() - lastJobTime > idleTimeout: return
+            time.sleep(1)
+            continue
+        runJob(queueFolder, job, claimFile, workerName)
+        lastJobTime = time.time()
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.stderr.write("usage: python hb_worker.py queueFolder [idleTimeout]\n")
+        sys.exit(1)
+    idleTimeout = None
+    if len(sys.argv) > 2: idleTimeout = float(sys.argv[2])
+    work(sys.argv[1], idleTimeout)
+'''
+    
+    def __init__(self, queueFolder, numOfLocalWorkers = 0, retries = 1, claimTimeout = 120, pollInterval = 1):
+        hb_TaskGraph.__init__(self, 1, retries)
+        self.queueFolder = queueFolder
+        self.numOfLocalWorkers = numOfLocalWorkers
+        self.claimTimeout = claimTimeout
+        self.pollInterval = pollInterval
+        # the jobs of this run don't clash with the jobs of the other studies in the queue
+        self.runId = time.strftime("%Y%m%d%H%M%S") + "_" + hashlib.md5(`time.time()` + `id(self)`).hexdigest()[:6]
+        self.workerModule = None
+        # the jobs that the tasks are waiting for (see pollJobs)
+        self.isPolling = False
+        self.waitingJobs = {}
+        self.jobsLock = threading.Lock()
+    
+    def getWorkerModule(self):
+        if self.workerModule == None:
+            self.workerModule = {"__name__": "hb_worker"}
+            exec self.workerScript in self.workerModule
+        return self.workerModule
+    
+    def getWorkerScriptFile(self):
+        return os.path.join(self.queueFolder, "hb_worker.py")
+    
+    def publishJob(self, name, command, attempt = 0):
+        """Write the commands of a task to the queue as a job file. Returns the id of the job."""
+        if isinstance(command, hb_Command): command = [command]
+        jobId = self.runId + "_" + name + "_" + `attempt`
+        commands = []
+        for cmd in command:
+            jobCommand = {"argv": cmd.argv, "stdin": cmd.stdin, "stdout": cmd.stdout, "cwd": cmd.cwd}
+            # only PATH and RAYPATH are sent. the rest of the environment is from the node
+            if cmd.env != None:
+                for key, value in cmd.env.items():
+                    if key.upper() == "PATH": jobCommand["path"] = value
+                    elif key == "RAYPATH": jobCommand["rayPath"] = value
+            commands.append(jobCommand)
+        
+        jobFile = os.path.join(self.queueFolder, "jobs", jobId + ".json")
+        # the workers only look for json files so they never read a half-written job
+        with open(jobFile + ".tmp", "w") as outf:
+            json.dump({"id": jobId, "name": name, "commands": commands, "heartbeatInterval": self.getHeartbeatInterval()}, outf)
+        os.rename(jobFile + ".tmp", jobFile)
+        return jobId
+    
+    def getHeartbeatInterval(self):
+        # a few heartbeats are sent in each claimTimeout so a late one doesn't free a running job
+        if self.claimTimeout == None: return 10
+        return max(min(self.claimTimeout / 4.0, 10), 0.5)
+    
+    def getClaimFile(self, jobId):
+        claimedFolder = os.path.join(self.queueFolder, "claimed")
+        for fileName in os.listdir(claimedFolder):
+            if fileName.startswith(jobId + "__") and fileName.endswith(".json"): return os.path.join(claimedFolder, fileName)
+        return None
+    
+    def checkJobs(self, jobIds, heartbeats):
+        """
+        Check the results and the claims of the jobs with one listing of the results and the
+        claimed folders so the number of calls to the shared folder doesn't grow with the number
+        of jobs. heartbeats keeps the claim file of each job, its last heartbeat and the time that
+        the heartbeat is seen here. The times are measured on this machine so the clocks of the
+        nodes don't matter. The jobs of the workers that have stopped sending heartbeats are put
+        back in the queue. Returns the results of the jobs that are over.
+        """
+        resultsFolder = os.path.join(self.queueFolder, "results")
+        claimedFolder = os.path.join(self.queueFolder, "claimed")
+        results = {}
+        try:
+            resultFileNames = set(os.listdir(resultsFolder))
+            # the claims that are accepted (.accepted) are already over
+            claimFileNames = dict([(fileName.split("__")[0], fileName) for fileName in os.listdir(claimedFolder) \
+                                   if fileName.endswith(".json")])
+        except OSError:
+            return results
+        
+        for jobId in jobIds:
+            try:
+                if jobId + ".json" in resultFileNames:
+                    # the result file is kept until the end of the run so a second run of a job
+                    # that was put back in the queue can't write another result
+                    with open(os.path.join(resultsFolder, jobId + ".json"), "r") as inf: results[jobId] = json.load(inf)
+                    heartbeats.pop(jobId, None)
+                    continue
+                if not claimFileNames.has_key(jobId):
+                    heartbeats.pop(jobId, None)
+                    continue
+                claimFile = os.path.join(claimedFolder, claimFileNames[jobId])
+                heartbeat = heartbeats.get(jobId)
+                if heartbeat == None or heartbeat[:2] != (claimFile, os.path.getmtime(claimFile)):
+                    heartbeats[jobId] = (claimFile, os.path.getmtime(claimFile), time.time())
+                elif self.claimTimeout != None and time.time() - heartbeat[2] > self.claimTimeout:
+                    # the worker has stopped sending heartbeats
+                    os.rename(claimFile, os.path.join(self.queueFolder, "jobs", jobId + ".json"))
+                    heartbeats.pop(jobId)
+                    print "The worker of " + jobId + " has stopped. The job is put back in the queue."
+            except OSError:
+                pass
+        return results
+    
+    def pollJobs(self, studyIsOver):
+        """Check all the jobs that are waited for in one loop until the study is over (see waitForJob)."""
+        heartbeats = {}
+        while not studyIsOver.isSet():
+            with self.jobsLock: jobIds = self.waitingJobs.keys()
+            if len(jobIds) != 0:
+                results = self.checkJobs(jobIds, heartbeats)
+                with self.jobsLock:
+                    for jobId, result in results.items():
+                        jobIsOver, jobResult = self.waitingJobs.pop(jobId)
+                        jobResult.append(result)
+                        jobIsOver.set()
+            studyIsOver.wait(self.pollInterval)
+    
+    def waitForJob(self, jobId):
+        """
+        Wait for the result of a job and return it as a dictionary. While the study is running the
+        jobs are checked by one poller for all the tasks. Otherwise the job is checked here.
+        """
+        with self.jobsLock:
+            if self.isPolling:
+                jobIsOver, jobResult = threading.Event(), []
+                self.waitingJobs[jobId] = (jobIsOver, jobResult)
+        if self.isPolling:
+            jobIsOver.wait()
+            return jobResult[0]
+        
+        heartbeats = {}
+        while True:
+            results = self.checkJobs([jobId], heartbeats)
+            if results.has_key(jobId): return results[jobId]
+            time.sleep(self.pollInterval)
+    
+    def removeResults(self):
+        resultsFolder = os.path.join(self.queueFolder, "results")
+        for fileName in os.listdir(resultsFolder):
+            if fileName.startswith(self.runId + "_") and fileName.endswith(".json"):
+                try: os.remove(os.path.join(resultsFolder, fileName))
+                except OSError: pass
+    
+    def runTask(self, name, attempt = 0):
+        command, dependencies, outputFiles = self.tasks[name]
+        # python functions and shell commands can only run on this machine
+        if callable(command) or isinstance(command, basestring):
+            return hb_TaskGraph.runTask(self, name, attempt)
+        
+        if isinstance(command, hb_Command): command = [command]
+        startTime = time.time()
+        jobResult = self.waitForJob(self.publishJob(name, command, attempt))
+        # the output files are checked here since the study folder is shared
+        success = jobResult["exitCode"] == 0 and all(map(os.path.isfile, outputFiles))
+        return {"name": name, "command": " && ".join([cmd.toBatchLine().strip() for cmd in command]),
+                "success": success, "exitCode": jobResult["exitCode"], "stderr": jobResult["stderr"],
+                "attempts": attempt + 1, "duration": time.time() - startTime, "worker": jobResult["worker"]}
+    
+    def run(self):
+        """Publish the tasks as soon as they are ready and wait for the workers. Returns a dictionary of True/False for each task name."""
+        workerModule = self.getWorkerModule()
+        workerModule["makeFolders"](self.queueFolder)
+        with open(self.getWorkerScriptFile(), "w") as outf: outf.write(self.workerScript)
+        print "Run python \"" + self.getWorkerScriptFile() + "\" \"" + self.queueFolder + "\" on the other nodes to run the study on them."
+        
+        # all the tasks that are ready are published at once and the workers take them from the queue.
+        # the threads of the tasks only wait for the poller so the shared folder is checked once for all the jobs
+        self.numOfWorkers = max(len(self.taskNames), 1)
+        studyIsOver = threading.Event()
+        self.isPolling = True
+        poller = threading.Thread(target = self.pollJobs, args = (studyIsOver,))
+        poller.start()
+        localWorkers = [threading.Thread(target = workerModule["work"], \
+                        args = (self.queueFolder, None, studyIsOver.isSet, workerModule["getWorkerName"]("_local_" + `workerCount`))) \
+                        for workerCount in range(self.numOfLocalWorkers)]
+        for thread in localWorkers: thread.start()
+        try:
+            return hb_TaskGraph.run(self)
+        finally:
+            studyIsOver.set()
+            poller.join()
+            self.isPolling = False
+            for thread in localWorkers: thread.join()
+            self.removeResults()
+
+
+class hb_RunLog(object):
+    """
+    Record the wall time of the stages and the tasks of a study in a json file in the
+    study folder. For each stage the log keeps the duration, the number of points, points
+    per second and the size of the output files. For each task (see hb_JobQueue) it also
+    keeps the exit code and the number of attempts so the slow or failed chunks can be found.
+    Use append to add the stages of another component (e.g. reading the results) to the log
+    of the last run. Only the last maxStages stages are kept so the log doesn't grow without
+    a limit. The readers use an input key (see getInputKey) to log each set of inputs once.
+    """
+    
+    def __init__(self, logFile, append = False, maxStages = 500):
+        self.logFile = logFile
+        self.maxStages = maxStages
+        self.log = {"startTime": time.strftime("%Y-%m-%d %H:%M:%S"), "stages": []}
+        if append and os.path.isfile(logFile):
+            try:
+                with open(logFile, "r") as logInf: self.log = json.load(logInf)
+            except:
+                pass
+        self.startTimes = {}
+    
+    def getFileSizes(self, files):
+        return dict([(filePath, os.path.getsize(filePath)) for filePath in files if os.path.isfile(filePath)])
+    
+    def addStage(self, name, duration, numOfPoints = None, files = [], **kwargs):
+        stage = {"name": name, "duration": round(duration, 3)}
+        if numOfPoints != None:
+            stage["numOfPoints"] = numOfPoints
+            if duration > 0: stage["pointsPerSecond"] = round(numOfPoints / duration, 1)
+        if len(files) != 0: stage["fileSizes"] = self.getFileSizes(files)
+        stage.update(kwargs)
+        self.log["stages"].append(stage)
+        return stage
+    
+    def startStage(self, name):
+        self.startTimes[name] = time.time()
+    
+    def endStage(self, name, numOfPoints = None, files = [], **kwargs):
+        """Record a stage that is started with startStage."""
+        return self.addStage(name, time.time() - self.startTimes.pop(name), numOfPoints, files, **kwargs)
+    
+    def getInputKey(self, files, values = []):
+        """A key for the input files (path, size and modification time) and values of a stage."""
+        inputKey = hashlib.md5(`values`)
+        for filePath in files:
+            inputKey.update(filePath)
+            if os.path.isfile(filePath): inputKey.update(`os.path.getsize(filePath)` + `os.path.getmtime(filePath)`)
+        return inputKey.hexdigest()
+    
+    def hasStage(self, name, inputKey):
+        """Check if the stage is already logged for the same inputs."""
+        for stage in self.log["stages"]:
+            if stage["name"] == name and stage.get("inputKey") == inputKey: return True
+        return False
+    
+    def addJobResults(self, jobResults, numOfPoints = {}, outputFiles = {}):
+        """
+        Record the results of the jobs of an hb_JobQueue or an hb_TaskGraph. numOfPoints and
+        outputFiles are dictionaries with the number of points and the output files of each job
+        by name (or by index for an hb_JobQueue).
+        """
+        for jobCount, jobResult in enumerate(jobResults):
+            if jobResult == None: continue
+            name = jobResult.get("name", jobCount)
+            self.addStage(str(name), jobResult["duration"], numOfPoints.get(name), outputFiles.get(name, []),
+                          exitCode = jobResult["exitCode"], attempts = jobResult["attempts"], success = jobResult["success"])
+    
+    def getSlowestStage(self, prefix = ""):
+        stages = [stage for stage in self.log["stages"] if stage["name"].startswith(prefix)]
+        if len(stages) == 0: return None
+        return max(stages, key = lambda stage: stage["duration"])
+    
+    def save(self):
+        self.log["stages"] = self.log["stages"][-self.maxStages:]
+        with open(self.logFile, "w") as logOutf:
+            json.dump(self.log, logOutf, indent = 1)
+
+
+class hb_RtraceWorkers(object):
+    """
+    Keep a number of rtrace processes alive for an octree and send the rays to them
+    over stdin so the octree and the scene are only loaded once. A ray with a zero
+    direction makes rtrace flush its output so each batch of rays can be read back
+    as soon as it is traced. Use getWorkers to reuse the workers between the runs.
+    The running workers are kept in sc.sticky so they can be closed after Honeybee
+    flies again (see closeAll).
+    """
+    
+    # key of the running workers for each octree and set of parameters in sc.sticky
+    registryKey = "honeybee_rtraceWorkersRegistry"
+    
+    def __init__(self, argv, numOfWorkers, workingDir = None, env = None, ambFiles = None):
+        self.argv = argv
+        self.processes = []
+        try:
+            for workerCount in range(max(int(numOfWorkers), 1)):
+                self.processes.append(subprocess.Popen(self.getWorkerArgv(argv, workerCount, ambFiles), stdin = subprocess.PIPE, \
+                                                       stdout = subprocess.PIPE, cwd = workingDir, env = env))
+        except:
+            # don't leave the workers that are already started behind
+            self.close()
+            raise
+    
+    @staticmethod
+    def getWorkerArgv(argv, workerCount, ambFiles = None):
+        """Add the ambient file of a worker (-af) before the octree. The workers share the file if there is only one."""
+        if ambFiles == None or len(ambFiles) == 0: return argv
+        return argv[:-1] + ["-af", ambFiles[workerCount % len(ambFiles)]] + argv[-1:]
+    
+    @classmethod
+    def getRegistry(cls):
+        return sc.sticky.setdefault(cls.registryKey, {})
+    
+    @classmethod
+    def getWorkers(cls, argv, numOfWorkers, workingDir = None, env = None, ambFiles = None):
+        """
+        Return the running workers for the same command or start new ones. The workers are
+        restarted if the content of the octree (last item of argv) has changed since they
+        were started. The content is checked since oconv writes the octree again on each run.
+        """
+        octFile = argv[-1]
+        if workingDir != None: octFile = os.path.join(workingDir, octFile)
+        octHash = hashlib.md5()
+        with open(octFile, "rb") as inf:
+            for block in iter(lambda: inf.read(1024 * 1024), ""):
+                octHash.update(block)
+        octHash = octHash.hexdigest()
+        if ambFiles != None: ambFiles = list(ambFiles)
+        key = (tuple(argv), tuple(ambFiles or []), workingDir)
+        
+        registry = cls.getRegistry()
+        if registry.has_key(key):
+            workers, workersOctHash = registry[key]
+            if workersOctHash == octHash and len(workers.processes) == numOfWorkers and workers.isAlive():
+                return workers
+        
+        # only one set of workers is kept for each folder. close the workers of the
+        # last run if the octree or the parameters have changed
+        for workersKey in registry.keys():
+            if workersKey[-1] == workingDir:
+                registry.pop(workersKey)[0].close()
+        
+        workers = cls(argv, numOfWorkers, workingDir, env, ambFiles)
+        registry[key] = (workers, octHash)
+        return workers
+    
+    @classmethod
+    def closeAll(cls):
+        """Close all the running workers. Honeybee calls this before it replaces the classes in sc.sticky."""
+        registry = sc.sticky.pop(cls.registryKey, {})
+        for workers, octHash in registry.values():
+            workers.close()
+    
+    def isAlive(self):
+        for process in self.processes:
+            if process.poll() != None: return False
+        return True
+    
+    def writeRays(self, process, rays):
+        process.stdin.write("".join(rays) + "0 0 0 0 0 0\n")
+        process.stdin.flush()
+    
+    def traceRays(self, process, rays):
+        # write in a separate thread so rtrace never waits for us to read the output
+        writer = threading.Thread(target = self.writeRays, args = (process, rays))
+        writer.start()
+        lines = []
+        try:
+            for rayCount in range(len(rays) + 1):
+                lines.append(process.stdout.readline())
+                if lines[-1] == "": raise Exception("rtrace has stopped before tracing all the rays.")
+        finally:
+            writer.join()
+        # the last line is the result of the flush ray
+        return lines[:-1]
+    
+    def trace(self, rays):
+        """
+        Trace a list of rays ("x y z dx dy dz\\n") and return the output lines of rtrace
+        in the same order. The rays are divided between the workers.
+        """
+        numOfWorkers = len(self.processes)
+        raysEachWorker = int(math.ceil(len(rays) / float(numOfWorkers)))
+        results = [[] for workerCount in range(numOfWorkers)]
+        
+        def traceWorker(workerCount):
+            workerRays = rays[workerCount * raysEachWorker:(workerCount + 1) * raysEachWorker]
+            if len(workerRays) != 0:
+                results[workerCount] = self.traceRays(self.processes[workerCount], workerRays)
+        
+        try:
+            tasks.Parallel.ForEach(range(numOfWorkers), traceWorker)
+        except:
+            # the workers can't be used after a failed batch
+            self.close()
+            raise
+        return list(chain.from_iterable(results))
+    
+    def close(self):
+        """Close the input of the workers and wait for them to finish. A worker is killed if it can't be closed."""
+        for process in self.processes:
+            try:
+                process.stdin.close()
+                process.wait()
+            except:
+                pass
+            finally:
+                if process.poll() == None:
+                    try: process.kill()
+                    except: pass
+                process.stdout.close()
+
+
+class PtsFileAux(object):
+    """
+    Write and read Radiance test point files. Each point is a line with the
+    coordinates of the point and the normal vector. Binary files (*.ptsb) have the
+    same six values for each point as float32 and can be used as rtrace input (-if).
+    """
+    
+    def getFlattenValues(self, testPoints, ptsNormals):
+        values = []
+        for ptCount, testPoint in enumerate(testPoints):
+            ptNormal = ptsNormals[ptCount]
+            values.extend((testPoint.X, testPoint.Y, testPoint.Z, ptNormal.X, ptNormal.Y, ptNormal.Z))
+        return values
+    
+    def getPtsStr(self, testPoints, ptsNormals):
+        """Format all the points and the normals in one go."""
+        return ("%.4f\t%.4f\t%.4f\t%.4f\t%.4f\t%.4f\n" * len(testPoints)) % \
+               tuple(self.getFlattenValues(testPoints, ptsNormals))
+    
+    def writePtsFile(self, ptsFileName, testPoints, ptsNormals, binary = False):
+        if binary:
+            with open(ptsFileName, "wb") as ptsFile:
+                array.array("f", self.getFlattenValues(testPoints, ptsNormals)).tofile(ptsFile)
+        else:
+            with open(ptsFileName, "w") as ptsFile:
+                ptsFile.write(self.getPtsStr(testPoints, ptsNormals))
+        return ptsFileName
+    
+    def readPtsFile(self, ptsFileName):
+        """Return the values of a .pts or .ptsb file as a flat list (x, y, z, nx, ny, nz for each point)."""
+        if ptsFileName.endswith(".ptsb"):
+            values = array.array("f")
+            with open(ptsFileName, "rb") as ptsFile:
+                values.fromstring(ptsFile.read())
+            return values.tolist()
+        
+        with open(ptsFileName, "r") as ptsFile:
+            lines = ptsFile.read()
+        values = lines.split()
+        if len(values) == 6 * len(lines.strip().splitlines()):
+            return map(float, values)
+        
+        # some of the lines are not valid points. check the lines one by one
+        values = []
+        for line in lines.splitlines():
+            lineSeg = line.split()
+            if len(lineSeg) == 6: values.extend(map(float, lineSeg))
+        return values
+    
+    def loadPtsFiles(self, ptsFiles):
+        """
+        Read the pts files of a study and return the values of all the points as a flat
+        array (x, y, z, nx, ny, nz for each point) in the order of the points.
+        """
+        values = array.array("d")
+        chunkPoints = []
+        for ptsFile in ptsFiles:
+            ptsValues = self.readPtsFile(ptsFile)
+            chunkPoints.append(range(len(values) // 6, (len(values) + len(ptsValues)) // 6))
+            values.extend(ptsValues)
+        
+        # put the points back in order in case the points are interleaved between the CPUs
+        order = self.mergeChunks(ptsFiles, chunkPoints)
+        if order == range(len(order)): return values
+        
+        orderedValues = array.array("d")
+        for ptCount in order: orderedValues.extend(values[6 * ptCount:6 * ptCount + 6])
+        return orderedValues
+    
+    def findPatternFile(self, fileName):
+        """
+        Find the .ptn file of a study from the name of one of its pts or result files
+        (e.g. study_0.pts > study.ptn). Returns None if there is no pattern file.
+        """
+        baseName = fileName.rsplit(".", 1)[0]
+        for ptnFile in [baseName.rsplit("_", 1)[0] + ".ptn", baseName + ".ptn"]:
+            if os.path.isfile(ptnFile): return ptnFile
+        
+        # the file is renamed or named after a shading group. use the pattern
+        # file of the folder if there is only one
+        studyFolder = os.path.dirname(fileName)
+        if not os.path.isdir(studyFolder): return None
+        ptnFiles = [ptnFile for ptnFile in os.listdir(studyFolder) if ptnFile.endswith(".ptn")]
+        if len(ptnFiles) == 1: return os.path.join(studyFolder, ptnFiles[0])
+        return None
+    
+    def readPatternFile(self, ptnFile):
+        """Read the number of points in each branch from a .ptn file."""
+        with open(ptnFile, "r") as ptnInf:
+            return [int(numOfPts) for numOfPts in ptnInf.read().split(",") if numOfPts.strip() != ""]
+    
+    def getBranchOffsets(self, pattern):
+        """Index of the first point of each branch. The last item is the total number of points."""
+        offsets = [0]
+        for numOfPts in pattern: offsets.append(offsets[-1] + numOfPts)
+        return offsets
+    
+    def getPartitions(self, numOfPoints, numOfCPUs, interleaved = False):
+        """
+        Return the indices of the points for each CPU. By default each CPU gets a
+        contiguous block of points and the last one gets the remainder. Interleaved
+        partitions give every n-th point to the same CPU so the expensive points
+        (e.g. deep inside the building) are shared between all the CPUs.
+        """
+        if interleaved:
+            return [range(cpuCount, numOfPoints, numOfCPUs) for cpuCount in range(numOfCPUs)]
+        
+        if numOfCPUs > 1: ptsEachCpu = int(numOfPoints/(numOfCPUs))
+        else: ptsEachCpu = numOfPoints
+        partitions = [range(cpuCount * ptsEachCpu, (cpuCount + 1) * ptsEachCpu) for cpuCount in range(numOfCPUs - 1)]
+        partitions.append(range((numOfCPUs - 1) * ptsEachCpu, numOfPoints))
+        return partitions
+    
+    def getIndexFileName(self, fileName):
+        """The index file of a chunk has the same name as the pts/res file of the chunk."""
+        return fileName.rsplit(".", 1)[0] + ".idx"
+    
+    def writeIndexFile(self, indexFileName, ptIndices):
+        with open(indexFileName, "wb") as idxFile:
+            array.array("i", ptIndices).tofile(idxFile)
+    
+    def readIndexFile(self, indexFileName):
+        indices = array.array("i")
+        with open(indexFileName, "rb") as idxFile:
+            indices.fromstring(idxFile.read())
+        return indices
+    
+    def mergeChunks(self, chunkFiles, chunkValues):
+        """
+        Put the values of the chunks (one item for each point) back in the order of the
+        points. If the points are not partitioned in contiguous blocks each chunk has an
+        index file with the original index of its points. A warning is printed if only some
+        of the index files are found or if they don't match the values.
+        """
+        indexFiles = map(self.getIndexFileName, chunkFiles)
+        missingFiles = [indexFile for indexFile in indexFiles if not os.path.isfile(indexFile)]
+        if len(missingFiles) == len(indexFiles):
+            # contiguous blocks
+            return list(chain.from_iterable(chunkValues))
+        elif len(missingFiles) != 0:
+            print "Warning: " + os.path.basename(missingFiles[0]) + " is missing. The values of " + \
+                  str(len(chunkFiles)) + " chunks are kept in the order of the files and can be out of order."
+            return list(chain.from_iterable(chunkValues))
+        
+        indices = map(self.readIndexFile, indexFiles)
+        numOfPoints = sum(map(len, chunkValues))
+        isConsistent = map(len, indices) == map(len, chunkValues) and \
+                       sorted(chain.from_iterable(indices)) == range(numOfPoints)
+        if not isConsistent:
+            # not all the chunks of the study are provided or the index files are from another run
+            print "Warning: The index files don't match the values of the " + str(len(chunkFiles)) + \
+                  " chunks. The values are kept in the order of the files and can be out of order."
+            return list(chain.from_iterable(chunkValues))
+        
+        values = [None] * numOfPoints
+        for fileCount, chunkIndices in enumerate(indices):
+            for ptIndex, value in zip(chunkIndices, chunkValues[fileCount]):
+                values[ptIndex] = value
+        return values
+
+
+class RADResultAux(object):
+    """
+    Read the results of rtrace for grid-based studies. The result files can be ASCII
+    (-h) or float binary (-ff) with the Radiance header so the format can be found
+    from the FORMAT line. Binary files are memory-mapped and converted in one go.
+    """
+    
+    def readResultHeader(self, resultFile):
+        """Return the format of the result file and the length of the header in bytes."""
+        with open(resultFile, "rb") as resInf:
+            if resInf.read(10) != "#?RADIANCE": return "ascii", 0
+            resInf.seek(0)
+            resultFormat = "ascii"
+            headerLength = 0
+            for line in iter(resInf.readline, ""):
+                headerLength += len(line)
+                line = line.strip()
+                # an empty line is the end of the header
+                if line == "": break
+                if line.startswith("FORMAT="): resultFormat = line.split("=")[-1]
+        return resultFormat, headerLength
+    
+    def readRGBValues(self, resultFile):
+        """Return the R, G, B values of all the points in a flat array."""
+        resultFormat, headerLength = self.readResultHeader(resultFile)
+        
+        if resultFormat == "float" or resultFormat == "double":
+            values = array.array({"float": "f", "double": "d"}[resultFormat])
+            with open(resultFile, "rb") as resInf:
+                try:
+                    data = mmap.mmap(resInf.fileno(), 0, access = mmap.ACCESS_READ)
+                    values.fromstring(data[headerLength:])
+                    data.close()
+                except:
+                    # mmap is not available
+                    resInf.seek(headerLength)
+                    values.fromstring(resInf.read())
+            return values
+        
+        with open(resultFile, "r") as resInf:
+            resInf.seek(headerLength)
+            return array.array("f", map(float, resInf.read().split()))
+    
+    def weightRGBValues(self, rgbValues, factor, maxValue = None):
+        """Apply the Radiance RGB weighting to all the points. Values are capped to maxValue if it is provided."""
+        weightedValues = [factor * (.265 * R + .67 * G + .065 * B) for R, G, B in \
+                          zip(rgbValues[0::3], rgbValues[1::3], rgbValues[2::3])]
+        if maxValue != None: weightedValues = [min(value, maxValue) for value in weightedValues]
+        return weightedValues
+    
+    def readIlluminance(self, resultFile, factor = 179):
+        """Illuminance (lux) or luminance (cd/m2) for each point."""
+        return self.weightRGBValues(self.readRGBValues(resultFile), factor)
+    
+    def readRadiation(self, resultFile, factor = 1):
+        return [factor * R for R in self.readRGBValues(resultFile)[0::3]]
+    
+    def readDaylightFactor(self, resultFile):
+        # divide by the sky horizontal illuminance = 1000
+        return self.weightRGBValues(self.readRGBValues(resultFile), 17.9, 100)
+    
+    def readResultFiles(self, resultFiles, studyType, parallel = True):
+        """
+        Read the result of a CPU-chunked study in the order of the points.
+        studyType: [0] illuminance, [1] radiation, [2] luminance, [3] daylight factor, [4] vertical sky component
+        """
+        if studyType == 0 or studyType == 2: readResultFile = self.readIlluminance
+        elif studyType == 1: readResultFile = self.readRadiation
+        else: readResultFile = self.readDaylightFactor
+        
+        fileResults = [None] * len(resultFiles)
+        
+        def readFile(fileCount):
+            fileResults[fileCount] = readResultFile(resultFiles[fileCount])
+        
+        if parallel and len(resultFiles) > 1:
+            tasks.Parallel.ForEach(range(len(resultFiles)), readFile)
+        else:
+            for fileCount in range(len(resultFiles)): readFile(fileCount)
+        
+        return PtsFileAux().mergeChunks(resultFiles, fileResults)
+
+
 def checkGHPythonVersion(target = "0.6.0.3"):
     
     currentVersion = int(ghenv.Version.ToString().replace(".", ""))
@@ -2586,6 +4699,21 @@ if letItFly:
         sc.sticky["honeybee_EPFenSurface"] = hb_EPFenSurface
         sc.sticky["honeybee_RADParameters"] = hb_RADParameters
         sc.sticky["honeybee_DSParameters"] = hb_DSParameters
+        sc.sticky["honeybee_DSResultAux"] = DSResultAux
+        sc.sticky["honeybee_RADResultAux"] = RADResultAux
+        sc.sticky["honeybee_PtsFileAux"] = PtsFileAux
+        sc.sticky["honeybee_Command"] = hb_Command
+        sc.sticky["honeybee_JobQueue"] = hb_JobQueue
+        sc.sticky["honeybee_TaskGraph"] = hb_TaskGraph
+        sc.sticky["honeybee_WorkQueue"] = hb_WorkQueue
+        sc.sticky["honeybee_RunLog"] = hb_RunLog
+        # close the rtrace workers of the last flight before the classes are replaced
+        hb_RtraceWorkers.closeAll()
+        sc.sticky["honeybee_RtraceWorkers"] = hb_RtraceWorkers
+        sc.sticky["honeybee_PointIndex"] = hb_PointIndex
+        sc.sticky["honeybee_ResultManifest"] = hb_ResultManifest
+        sc.sticky["honeybee_AmbientCache"] = hb_AmbientCache
+        sc.sticky["honeybee_ResultCache"] = hb_ResultCache
         
         # done! sharing the happiness.
         print "Hooohooho...Flying!!\nVviiiiiiizzz..."
@@ -25,6 +25,7 @@ except: pass
 
 
 import os
+import scriptcontext as sc
 import Rhino as rc
 from System import Object
 from clr import AddReference
@@ -33,47 +34,42 @@ import Grasshopper.Kernel as gh
 from Grasshopper import DataTree
 from Grasshopper.Kernel.Data import GH_Path
 
-pointsF = []
-vectorsF = []
-
 #
-if len(ptsFileAddress)!=0 and ptsFileAddress[0]!=None:
+if not sc.sticky.has_key('honeybee_release'):
+    msg = "You should first let Honeybee to fly..."
+    ghenv.Component.AddRuntimeMessage(gh.GH_RuntimeMessageLevel.Warning, msg)
+
+elif len(ptsFileAddress)!=0 and ptsFileAddress[0]!=None:
+    hb_ptsFileAux = sc.sticky["honeybee_PtsFileAux"]()
     
-    for fileAddress in ptsFileAddress:
-        with open(fileAddress, 'r') as pts:
-            for lineCount, line in enumerate(pts):
-                line = line.replace('\n', '', 10)
-                lineSeg = line.Split(' ')
-                if len(lineSeg)!=6: lineSeg = line.Split('\t')
-                if len(lineSeg)==6:
-                    pointsF.append(rc.Geometry.Point3d(float(lineSeg[0]), float(lineSeg[1]), float(lineSeg[2])))
-                    vectorsF.append(rc.Geometry.Vector3d(float(lineSeg[3]), float(lineSeg[4]), float(lineSeg[5])))
-            
-    # check if there is a pattern file in thr folder
-    workingDir = os.path.dirname(ptsFileAddress[0])
-    dirFiles = os.listdir(workingDir)
-    ptnFileName = None
-    for fn in dirFiles:
-        if fn.endswith(".ptn"):
-            ptnFileName = os.path.join(workingDir, fn)
-            break
+    # x, y, z, nx, ny, nz for each point in the order of the points
+    values = hb_ptsFileAux.loadPtsFiles(ptsFileAddress)
+    numOfPoints = len(values) // 6
     
-    if ptnFileName != None:
-        with open(ptnFileName, "r") as ptnInf:
-            pattern = ptnInf.readlines()[0].split(",")[:-1]
-        
-        pattern = map(int, pattern)
-        
+    def getGeometries(st, end):
+        # create the points and the vectors only for the points that are needed
+        points = [rc.Geometry.Point3d(values[6 * ptCount], values[6 * ptCount + 1], values[6 * ptCount + 2]) \
+                  for ptCount in xrange(st, end)]
+        vectors = [rc.Geometry.Vector3d(values[6 * ptCount + 3], values[6 * ptCount + 4], values[6 * ptCount + 5]) \
+                   for ptCount in xrange(st, end)]
+        return points, vectors
+    
+    # the pattern file of the study has the same name as the pts files
+    pattern = []
+    ptnFileName = hb_ptsFileAux.findPatternFile(ptsFileAddress[0])
+    if ptnFileName != None: pattern = hb_ptsFileAux.readPatternFile(ptnFileName)
+    offsets = hb_ptsFileAux.getBranchOffsets(pattern)
+    
+    if len(pattern) != 0 and offsets[-1] == numOfPoints:
         # graft the data based on the pattern
         points = DataTree[Object]()
         vectors = DataTree[Object]()
         for branchCount in range(len(pattern)):
             p = GH_Path(branchCount)
-            
-            points.AddRange(pointsF[sum(pattern[:branchCount]): sum(pattern[:branchCount+1])], p)
-            vectors.AddRange(vectorsF[sum(pattern[:branchCount]): sum(pattern[:branchCount+1])], p)
-               
+            branchPoints, branchVectors = getGeometries(offsets[branchCount], offsets[branchCount + 1])
+            points.AddRange(branchPoints, p)
+            vectors.AddRange(branchVectors, p)
+        
     else:
-        # no pattern do just put them together
-        points = pointsF
-        vectors = vectorsF
+        # no pattern (or the pattern is for a different set of points) so just put them together
+        points, vectors = getGeometries(0, numOfPoints)
@@ -14,7 +14,7 @@ Provided by Honeybee 0.0.51
     Returns:
         resFiles: List of result files from grid based analysis
         illFiles: List of ill files from annual analysis
-        ptsFiles: List of point files
+        ptsFiles: List of point files (.pts or binary .ptsb)
         hdrFiles: List of hdr files
         gifFiles: List of gif files
         
@@ -62,7 +62,8 @@ def main(studyFolder):
                 resFiles.append(os.path.join(studyFolder, fileName))
             elif fileName.lower().endswith(".ill") and fileName.split("_")[-2]!="space":
                 illFilesTemp.append(os.path.join(studyFolder, fileName))
-            elif fileName.lower().endswith(".pts") and fileName.split("_")[-2]!="space":
+            elif (fileName.lower().endswith(".pts") or fileName.lower().endswith(".ptsb")) and fileName.split("_")[-2]!="space":
+                # grid-based studies can write the points as binary files (.ptsb)
                 ptsFiles.append(os.path.join(studyFolder, fileName))
             elif fileName.lower().endswith(".epw"):
                 epwFile = os.path.join(studyFolder, fileName)
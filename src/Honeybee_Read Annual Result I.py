@@ -25,7 +25,7 @@ Provided by Honeybee 0.0.51
         UDLI_More_2000: Useful Daylight illuminance > Percentage of time during the active occupancy hours that the test point receives more than 2000 lux.
         CDA: Continuous Daylight Autonomy > Similar to Daylight Autonomy except that the point receives illuminaceLevel/illuminace threshold for hours that illuminance level is less than the threshold.
         sDA: Spatial Daylight Autonomy > sDA is the percent of analysis points across the analysis area that meet or exceed _DLAIllumThresholds value (set to 300 lux for LEED) for at least 50% of the analysis period.
-        annualProfiles: A .csv file generated by Daysim that can be used as an schedule for annual daylight simulation
+        annualProfiles: A .csv file generated by Daysim that can be used as an schedule for annual daylight simulation. Daysim only runs if there are lighting controls or dynamic shadings in the study. Otherwise the results are calculated by Honeybee, this output will be empty and the component shows a remark.
 """
 ghenv.Component.Name = "Honeybee_Read Annual Result I"
 ghenv.Component.NickName = 'readAnnualResultsI'
@@ -37,6 +37,7 @@ except: pass
 
 
 
+import System
 from System import Object
 import Grasshopper.Kernel as gh
 from Grasshopper import DataTree
@@ -48,36 +49,6 @@ import subprocess
 import time
 import shutil
 
-"""
-    def testPtsStr(self, testPoint, ptsNormal):
-        return  '%.4f'%testPoint.X + '\t' + \
-                '%.4f'%testPoint.Y + '\t' + \
-                '%.4f'%testPoint.Z + '\t' + \
-                '%.4f'%ptsNormal.X + '\t' + \
-                '%.4f'%ptsNormal.Y + '\t' + \
-                '%.4f'%ptsNormal.Z + '\n'
-"""
-
-def getFilelength(fileName):
-    with open(fileName) as inf:
-        for i, l in enumerate(inf):
-            pass
-    return i + 1
-
-def isTheStudyOver(fileNames):
-    while True:
-        cmd = 'WMIC PROCESS get Commandline' #,Processid'
-        proc = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE)
-        cmdCount = 0
-        for line in proc.stdout:
-            if line.strip().startswith("cmd") and line.strip().endswith(".bat"):
-                fileName = line.strip().split(" ")[-1].split("\\")[-1]
-                # I should check the file names and make sure they are the right files
-                if fileName in fileNames:
-                    cmdCount += 1
-        time.sleep(0.2)
-        if cmdCount == 0:
-            return
             
             
 def main(illFilesAddress, testPts, testVecs, occFiles, lightingControlGroups, SHDGroupI_Sensors, SHDGroupII_Sensors, DLAIllumThresholds):
@@ -89,6 +60,9 @@ def main(illFilesAddress, testPts, testVecs, occFiles, lightingControlGroups, SH
         hb_DSPath = hb_folders["DSPath"]
         hb_DSCore = hb_folders["DSCorePath"]
         hb_DSLibPath = hb_folders["DSLibPath"]
+        hb_dsResultAux = sc.sticky["honeybee_DSResultAux"]()
+        hb_ptsFileAux = sc.sticky["honeybee_PtsFileAux"]()
+        hb_PointIndex = sc.sticky["honeybee_PointIndex"]
     
     else:
         msg = "You should first let Honeybee to fly first..."
@@ -105,16 +79,6 @@ def main(illFilesAddress, testPts, testVecs, occFiles, lightingControlGroups, SH
         "sensor_file_info", "daylight_autonomy_active_RGB", "electric_lighting", "direct_sunlight_file", "thermal_simulation",
         "user_profile", "PNGScheduleExists" ]
     
-    # I will remove this function later and just use WriteDS class
-    def isSensor(testPt, sensors):
-        for pt in sensors:
-            if pt==None: return False
-            if pt.DistanceTo(testPt) < sc.doc.ModelAbsoluteTolerance:
-                # this is a senor point
-                return True
-        # not a sensor
-        return False
-    
     
     
     msg = str.Empty
@@ -189,37 +153,65 @@ def main(illFilesAddress, testPts, testVecs, occFiles, lightingControlGroups, SH
     
     # sort the ill files based on their names
     # this only matter in case of multiple ill files produced by Honeybee
-    originalIllFilesSorted = []
-    for illFiles in originalIllFiles:
-        try:
-            illFiles = sorted(illFiles, key=lambda fileName: int(fileName.split(".")[-2].split("_")[-1]))
-            originalIllFilesSorted.append(illFiles)
-        except:
-            originalIllFilesSorted = originalIllFiles
+    originalIllFilesSorted = [hb_dsResultAux.sortIllFiles(illFiles) for illFiles in originalIllFiles]
     
     
     # number of points should be the same in all the illfile lists
     # that's why I just try the first list of the ill files
-    numOfPtsInEachFile = []
-    for illFile in originalIllFilesSorted[0]:
-        with open(illFile, "r") as illInf:
-            for lineCount, line in enumerate(illInf):
-                if not line.startswith("#"):
-                    numOfPtsInEachFile.append(len(line.strip().split(" ")) - 4)
-                    break
+    try:
+        illMatrixSet = hb_dsResultAux.loadIllResultSet(originalIllFilesSorted[0])
+    except Exception, e:
+        return str(e), None
+    numOfPtsInIllFiles = illMatrixSet.numOfPts
+    illMatrixSet.close()
     
     # find the current project directory that could be differnt from the old one
     projectDirectory = os.path.dirname(originalIllFilesSorted[0][0]) + "\\"
-    #print numOfPtsInEachFile
     #print numOfPtsInEachSpace
     
     # make sure the number of points inside the ill file matches the number of points
     # inside the point list
-    if sum(numOfPtsInEachFile) != numOfPts:
-        msg = "Number of points in ill files: " + `sum(numOfPtsInEachFile)` + \
+    if numOfPtsInIllFiles != numOfPts:
+        msg = "Number of points in ill files: " + `numOfPtsInIllFiles` + \
               " doesn't match the number of points in point files: " + `numOfPts`
         return msg, None
-   
+    
+    # if there is no dynamic shading and no lighting control the standard metrics
+    # can be calculated here directly from the ill files. There is no need to split
+    # the files and run ds_el_lighting for each space.
+    # the manifest keeps track of the inputs of each stage so the stages that are
+    # still valid from the last run can be skipped
+    manifest = sc.sticky["honeybee_ResultManifest"](os.path.splitext(originalIllFilesSorted[0][0])[0] + "_manifest.json")
+    # the stages are only logged when they run so the log only grows when the inputs change
+    runLog = sc.sticky["honeybee_RunLog"](os.path.join(os.path.dirname(originalIllFilesSorted[0][0]), "runLog.json"), append = True)
+    
+    hasLightingControls = sum(map(len, lightingControls)) != 0
+    if len(originalIllFilesSorted) == 1 and not hasLightingControls:
+        metricsFiles = originalIllFilesSorted[0] + list(set(occFiles))
+        metricsValues = [numOfPtsInEachSpace, map(float, DLAIllumThresholds), occFiles]
+        # the values are saved next to the manifest and the manifest only keeps the path
+        metricsFile = hb_dsResultAux.getAnnualMetricsFileName(originalIllFilesSorted[0][0])
+        metrics = None
+        if manifest.isStageValid("metrics", metricsFiles, metricsValues, [metricsFile]):
+            metrics = hb_dsResultAux.loadAnnualMetrics(metricsFile)
+        if metrics == None:
+            runLog.startStage("annualMetrics")
+            try:
+                metrics = hb_dsResultAux.calculateAnnualMetrics(originalIllFilesSorted[0], numOfPtsInEachSpace, occFiles, DLAIllumThresholds)
+            except Exception, e:
+                return str(e), None
+            hb_dsResultAux.saveAnnualMetrics(metrics, metricsFile)
+            manifest.updateStage("metrics", metricsFiles, metricsValues, [metricsFile])
+            runLog.endStage("annualMetrics", sum(numOfPtsInEachSpace), originalIllFilesSorted[0])
+            runLog.save()
+        manifest.save()
+        # Daysim doesn't run for this case so there are no annual profiles and no reports
+        ghenv.Component.AddRuntimeMessage(gh.GH_RuntimeMessageLevel.Remark, \
+            "There is no dynamic shading or lighting control so the metrics are calculated without Daysim.\n" + \
+            "annualProfiles and htmReport are only generated when Daysim runs.")
+        return None, [metrics["DA"], metrics["UDI_less_100"], metrics["UDI_100_2000"], metrics["UDI_more_2000"], \
+                      metrics["CDA"], metrics["sDA"], [], []]
+    
     # find the heading files and creat multiple ill files for the study
     heaFiles = []
     filePath =  os.path.dirname(originalIllFiles[0][0])
@@ -330,120 +322,49 @@ def main(illFilesAddress, testPts, testVecs, occFiles, lightingControlGroups, SH
     # available files
     
     #
-    # check if the files are already generated once
-    firstRun = False
+    # split the ill and dc files for each space unless the split files are already
+    # generated from the same ill and dc files and the same point pattern
     newIllFileNamesDict = {}
+    newDcFileNamesDict = {}
     for shdGroupCounter, illFileList in enumerate(originalIllFilesSorted):
-        newIllFileNamesDict[shdGroupCounter] = []
+        
+        newIllFileNames = []
+        newDcFileNames = []
         for spaceCount in range(numOfSpaces):
-            newIllFileName  = illFileList[0].split(".ill")[0] + "_space_" + str(spaceCount) + ".ill"
-            newDcFileName  = illFileList[0].split(".ill")[0] + "_space_" + str(spaceCount) + ".dc"
-            newIllFileNamesDict[shdGroupCounter].append(newIllFileName) #collect ill files to calculate sDA
-            if not (os.path.isfile(newIllFileName) and os.path.isfile(newDcFileName)):
-                firstRun = True
-                break
-    
-    # open all the available ill files and put them in the dictionary
-    if firstRun:
-        for shdGroupCounter, illFileList in enumerate(originalIllFilesSorted):
-            illFilesDict = {}
-            newIllFilesDict = {}
-            newIllFileNamesDict[shdGroupCounter] = []
-            #illFileDict[shaidngGroupCounter]
-            for counter, illFile in enumerate(illFileList):
-                illfile = open(illFile, "r")
-                illFilesDict[counter] = illfile
-            
-            # open new ill files for each space and put them in the same directory
-            for spaceCount in range(numOfSpaces):
-                newIllFileName  = illFileList[0].split(".ill")[0] + "_space_" + str(spaceCount) + ".ill"
-                newIllFileNamesDict[shdGroupCounter].append(newIllFileName) #collect ill files to calculate sDA
-                newIllFile = open(newIllFileName, "w")
-                newIllFilesDict[spaceCount] = newIllFile
-            
-            # all the files will have the same length of 8760 lines for the hours of the year
-            for line in range(8760):
-                # merge the line from all the source file
-                mergedLine = []
-                for illFileKey in illFilesDict.keys():
-                    line = illFilesDict[illFileKey].readline()
-                    
-                    if illFileKey==0:
-                        dateInfo = line.strip().split(" ")[:4]
-                    mergedLine.extend(line.strip().split(" ")[4:])
-            
-            
-                # write the values to the target files
-                for illFileKey in newIllFilesDict.keys():
-                    line = " ".join(dateInfo + mergedLine[sum(numOfPtsInEachSpace[:illFileKey]):sum(numOfPtsInEachSpace[:illFileKey+1])])
-                    newIllFilesDict[illFileKey].write(line + "\n")
-            
-            # close all the opened files
-            for illFileKey in illFilesDict.keys(): illFilesDict[illFileKey].close()
-            for illFileKey in newIllFilesDict.keys(): newIllFilesDict[illFileKey].close()
+            newIllFileNames.append(illFileList[0].split(".ill")[0] + "_space_" + str(spaceCount) + ".ill")
+            newDcFileNames.append(illFileList[0].split(".ill")[0] + "_space_" + str(spaceCount) + ".dc")
+        newIllFileNamesDict[shdGroupCounter] = newIllFileNames #collect ill files to calculate sDA
+        newDcFileNamesDict[shdGroupCounter] = newDcFileNames
+        
+        dcFiles = []
+        for illFile in illFileList:
+            if illFile.endswith("_up.ill"):
+                dcFiles.append(illFile.replace("_up.ill", ".dc"))
+            elif illFile.endswith("_down.ill"):
+                dcFiles.append(illFile.replace("_down.ill", ".dc"))
+            else:
+                dcFiles.append(illFile.replace(".ill", ".dc"))
         
-        # print numOfPtsInEachSpace
-        # write the new .dc files for 
-        for shdGroupCounter, illFileList in enumerate(originalIllFilesSorted):
-            
-            dcFilesDict = {}
-            newDcFilesDict = {}
-            
-            #illFileDict[shaidngGroupCounter]
-            lenOfDCFiles = []
-            for counter, illFile in enumerate(illFileList):
-                if illFile.endswith("_up.ill"):
-                    dcFile = illFile.replace("_up.ill", ".dc")
-                    
-                elif illFile.endswith("_down.ill"):
-                    dcFile = illFile.replace("_down.ill", ".dc")
-                    
-                else:
-                    dcFile = illFile.replace(".ill", ".dc")
-                    
-                lenOfDCFile = getFilelength(dcFile) - 6 #Daysim files has 6 lines as header
-                lenOfDCFiles.append(lenOfDCFile)
-                dcfile = open(dcFile, "r")
-                dcFilesDict[counter] = dcfile
-            
-            # open new ill files for each space and put them in the same directory
-            for spaceCount in range(numOfSpaces):
-                newDcFileName  = illFileList[0].split(".ill")[0] + "_space_" + str(spaceCount) + ".dc"
-                newDcFile = open(newDcFileName, "w")
-                newDcFilesDict[spaceCount] = newDcFile
-            
-            heading = str.Empty
-            for line in dcFilesDict[0]:
-                if line.startswith("#"):
-                    #make one instance of heading
-                    heading += line
-                else:
-                    newDcFilesDict[0].write(heading)
-                    newDcFilesDict[0].write(line)
-                    break
-            
-            pointCount = 1
-            spaceCount = 0
-            for dcFileKey in dcFilesDict.keys():
-                for line in dcFilesDict[dcFileKey]:
-                    if not line.startswith("#"):
-                        # write the line
-                        newDcFilesDict[spaceCount].write(line)
-                        pointCount+=1
-                        if pointCount == sum(numOfPtsInEachSpace[:spaceCount + 1]):
-                            # end of the file, start a new file
-                            spaceCount += 1
-                            try: newDcFilesDict[spaceCount].write(heading)
-                            except: pass
-            
-            # close all the opened files
-            for dcFileKey in dcFilesDict.keys(): dcFilesDict[dcFileKey].close()
-            for dcFileKey in newDcFilesDict.keys(): newDcFilesDict[dcFileKey].close()
+        # the dc files can be compressed but the .hea files send gen_directsunlight and
+        # ds_el_lighting to the .dc file of each space and Daysim can only read plain
+        # .dc files. the coefficients of each space are always expanded to a .dc file
+        dcFiles = map(hb_dsResultAux.getDcStorageFile, dcFiles)
         
+        splitStage = "split_" + str(shdGroupCounter)
+        splitOutputs = newIllFileNames + newDcFileNames
+        if not manifest.isStageValid(splitStage, illFileList + dcFiles, numOfPtsInEachSpace, splitOutputs):
+            runLog.startStage(splitStage)
+            hb_dsResultAux.splitIllFiles(illFileList, numOfPtsInEachSpace, newIllFileNames)
+            hb_dsResultAux.splitDcFiles(dcFiles, numOfPtsInEachSpace, newDcFileNames)
+            manifest.updateStage(splitStage, illFileList + dcFiles, numOfPtsInEachSpace, splitOutputs)
+            runLog.endStage(splitStage, sum(numOfPtsInEachSpace), newIllFileNames + newDcFileNames)
+    
+    manifest.save()
     
     
     
     heaFileNames = []
+    staleSpaces = []
     # write point files and heading files
     for spaceCount in range(numOfSpaces):
         tmpFolder = os.path.join(projectDirectory, "tmp_space_" + str(spaceCount))
@@ -452,17 +373,10 @@ def main(illFilesAddress, testPts, testVecs, occFiles, lightingControlGroups, SH
         ptsFileName = subProjectName + ".pts"
         modifiedHea = modifiedHeaBase
         
+        ptsStr = hb_ptsFileAux.getPtsStr(testPoints[spaceCount], testVectors[spaceCount])
+        
         with open(os.path.join(filePath, ptsFileName), "w") as ptsf:
-            for ptCount, testPoint in enumerate(testPoints[spaceCount]):
-                ptNormal = testVectors[spaceCount][ptCount]
-                ptStr = '%.4f'%testPoint.X + '\t' + \
-                        '%.4f'%testPoint.Y + '\t' + \
-                        '%.4f'%testPoint.Z + '\t' + \
-                        '%.4f'%ptNormal.X + '\t' + \
-                        '%.4f'%ptNormal.Y + '\t' + \
-                        '%.4f'%ptNormal.Z + '\n'
-                
-                ptsf.write(ptStr)
+            ptsf.write(ptsStr)
         
         # replace some of the values
         
@@ -534,20 +448,30 @@ def main(illFilesAddress, testPts, testVecs, occFiles, lightingControlGroups, SH
         # write sensor info
         modifiedHea += "\nsensor_file_info "
         
+        # index the sensors once so each test point is only compared with the sensors next to it
+        shdGroupIndices = []
+        for groupCount, shdGroupSensor in enumerate([SHDGroupISensors[spaceCount], SHDGroupIISensors[spaceCount]]):
+            if shdGroupSensor!=None:
+                shdGroupIndices.append((groupCount, hb_PointIndex(shdGroupSensor.intSensors), hb_PointIndex(shdGroupSensor.extSensors)))
+        
+        lightingGroupIndices = []
+        for groupCount, lightingGroupSensor in enumerate(lightingGroupSensors):
+            if lightingGroupSensor!=[]:
+                lightingGroupIndices.append((groupCount, hb_PointIndex(lightingGroupSensor)))
+        
         for pt in testPoints[spaceCount]:
             sensorInfo = []
             
             # test shading group
-            for groupCount, shdGroupSensor in enumerate([SHDGroupISensors[spaceCount], SHDGroupIISensors[spaceCount]]):
-                if shdGroupSensor!=None:
-                    if isSensor(pt, shdGroupSensor.intSensors):
-                        sensorInfo.append('BG' + str(groupCount+1))
-                    if isSensor(pt, shdGroupSensor.extSensors):
-                        sensorInfo.append('BG' + str(groupCount+1) + '_Ext')
+            for groupCount, intSensorIndex, extSensorIndex in shdGroupIndices:
+                if intSensorIndex.hasPoint(pt):
+                    sensorInfo.append('BG' + str(groupCount+1))
+                if extSensorIndex.hasPoint(pt):
+                    sensorInfo.append('BG' + str(groupCount+1) + '_Ext')
             
             # test lighting group
-            for groupCount, lightingGroupSensor in enumerate(lightingGroupSensors):
-                if lightingGroupSensor!=[] and isSensor(pt, lightingGroupSensor):
+            for groupCount, lightingGroupIndex in lightingGroupIndices:
+                if lightingGroupIndex.hasPoint(pt):
                     sensorInfo.append('LG' + str(groupCount+1))
             if len(sensorInfo)==0:
                 modifiedHea += "0 "
@@ -574,10 +498,25 @@ def main(illFilesAddress, testPts, testVecs, occFiles, lightingControlGroups, SH
                            
                            
         heaFileName = subProjectName + ".hea"
-        heaFileNames.append(heaFileName)
         with open(os.path.join(filePath, heaFileName), "w") as heaf:
             heaf.write(modifiedHea)
-            
+        
+        # only run ds_el_lighting for the spaces that their inputs have changed
+        spaceFiles = [occFileFullPath]
+        for shdGroupCounter in range(len(originalIllFilesSorted)):
+            spaceFiles.append(newIllFileNamesDict[shdGroupCounter][spaceCount])
+            spaceFiles.append(newDcFileNamesDict[shdGroupCounter][spaceCount])
+        spaceValues = [modifiedHea, ptsStr]
+        spaceResultFiles = [os.path.join(filePath, subProjectName + postfix) for postfix in \
+                            ["_autonomy.DA", ".CDA", "_less_than_100.UDI", "_100_2000.UDI", "_more_than_2000.UDI"]]
+        
+        if not manifest.isStageValid("space_" + str(spaceCount), spaceFiles, spaceValues, spaceResultFiles):
+            # remove the old results so a failed run can't be mistaken for a valid one
+            for resultFile in spaceResultFiles:
+                if os.path.isfile(resultFile): os.remove(resultFile)
+            heaFileNames.append(heaFileName)
+            staleSpaces.append((spaceCount, spaceFiles, spaceValues, spaceResultFiles))
+    
     # write batch files
     batchFileNames = []
     pathStr = "SET RAYPATH=.;" + hb_RADLibPath + ";" + hb_DSPath + ";" + hb_DSLibPath + ";\nPATH=" + hb_RADPath + ";" + hb_DSPath + ";" + hb_DSLibPath + ";$PATH\n"
@@ -597,23 +536,40 @@ def main(illFilesAddress, testPts, testVecs, occFiles, lightingControlGroups, SH
             batchInf.write(batchFileStr)
             
     # write a batch file and run the study
-    ncpus = int(os.environ["NUMBER_OF_PROCESSORS"])
+    # NUMBER_OF_PROCESSORS is only set on Windows
+    ncpus = int(os.environ.get("NUMBER_OF_PROCESSORS", System.Environment.ProcessorCount))
     if ncpus == 0: ncpus = 1
     
-    #execute the batch files in parallel if there is enough CPUs!
-    fileNames = []
-
-    if ncpus >= numOfSpaces:
-        for fileName in batchFileNames:
-            batchFileName = os.path.join(filePath, fileName)
-            fileNames.append(batchFileName)
-            p = subprocess.Popen(r'start cmd /c ' + batchFileName , shell=True)
-        
-        isTheStudyOver(batchFileNames)
-    else:
-        for fileName in batchFileNames:
-            batchFileName = os.path.join(filePath, fileName)
-            os.system(batchFileName)
+    # run the commands of the batch files directly in parallel with as many CPUs as there are.
+    # the batch files are kept so the study can be run by hand
+    hb_Command = sc.sticky["honeybee_Command"]
+    dsEnv = hb_Command.getEnvironment([hb_RADPath, hb_DSPath, hb_DSLibPath], [hb_RADLibPath, hb_DSPath, hb_DSLibPath])
+    jobs = []
+    for heaCount, heaFileName in enumerate(heaFileNames):
+        commands = []
+        if len(originalIllFiles)>1:
+            commands.append(hb_Command([os.path.join(hb_DSPath, "gen_directsunlight"), os.path.join(filePath, heaFileName)], \
+                                       cwd = filePath, env = dsEnv))
+        commands.append(hb_Command([os.path.join(hb_DSPath, "ds_el_lighting"), os.path.join(filePath, heaFileName)], \
+                                   cwd = filePath, env = dsEnv))
+        jobs.append((commands, staleSpaces[heaCount][3]))
+    hb_jobQueue = sc.sticky["honeybee_JobQueue"](ncpus, retries = 0)
+    hb_jobQueue.run(jobs)
+    
+    spacePoints = {}
+    for heaCount, jobResult in enumerate(hb_jobQueue.jobResults):
+        if jobResult == None: continue
+        spaceCount = staleSpaces[heaCount][0]
+        jobResult["name"] = "ds_el_lighting_space_" + str(spaceCount)
+        spacePoints[jobResult["name"]] = numOfPtsInEachSpace[spaceCount]
+    runLog.addJobResults(hb_jobQueue.jobResults, spacePoints)
+    runLog.save()
+    
+    # record the spaces that are calculated successfully
+    for spaceCount, spaceFiles, spaceValues, spaceResultFiles in staleSpaces:
+        if all(map(os.path.isfile, spaceResultFiles)):
+            manifest.updateStage("space_" + str(spaceCount), spaceFiles, spaceValues, spaceResultFiles)
+    manifest.save()
     
     # calculate sDA    
     
@@ -696,7 +652,19 @@ def main(illFilesAddress, testPts, testVecs, occFiles, lightingControlGroups, SH
     try: overUDLILists = sorted(overUDLILists, key=lambda fileName: int(fileName.split(".")[-2].split("_")[-4]))
     except: pass
     
-    return None, [DLALists, underUDLILists, inRangeUDLILists, overUDLILists, CDALists, EPLSchLists, htmLists]
+    def readDSStandardResults(filePath):
+        results = []
+        with open(filePath, "r") as inf:
+            for line in inf:
+                if not line.startswith("#"):
+                    results.append(float(line.split("\t")[-1]))
+        return results
+    
+    DLAValues = map(readDSStandardResults, DLALists)
+    sDAValues = [hb_dsResultAux.getsDA(DLARes) for DLARes in DLAValues]
+    
+    return None, [DLAValues, map(readDSStandardResults, underUDLILists), map(readDSStandardResults, inRangeUDLILists), \
+                  map(readDSStandardResults, overUDLILists), map(readDSStandardResults, CDALists), sDAValues, EPLSchLists, htmLists]
 
 def isAllNone(dataList):
     for item in dataList.AllData():
@@ -717,7 +685,7 @@ if _runIt and not isAllNone(_illFilesAddress) and not isAllNone(_testPoints):
         ghenv.Component.AddRuntimeMessage(w, msg)
         
     else:
-        DLALists, underUDLILists, inRangeUDLILists, overUDLILists, CDALists, EPLSchLists, htmLists = results
+        DLAValues, underUDLIValues, inRangeUDLIValues, overUDLIValues, CDAValues, sDAValues, EPLSchLists, htmLists = results
         DLA = DataTree[Object]()
         UDLI_Less_100 = DataTree[Object]()    
         UDLI_100_2000 = DataTree[Object]()
@@ -727,32 +695,16 @@ if _runIt and not isAllNone(_illFilesAddress) and not isAllNone(_testPoints):
         sDA = DataTree[Object]()
         htmReport = DataTree[Object]()
         
-        def readDSStandardResults(filePath):
-            results = []
-            with open(filePath, "r") as inf:
-                for line in inf:
-                    if not line.startswith("#"):
-                        results.append(float(line.split("\t")[-1]))
-            return results
-        
-        def getsDA(DLARes, threshold = 50):
-            moreThan = 0
-            for res in DLARes:
-                if res >= threshold:
-                    moreThan += 1
-            return "%.2f"%((moreThan/len(DLARes)) * 100)
-        
-        
         for branchNum in range(_testPoints.BranchCount):
             p = GH_Path(branchNum)
-            DLARes = readDSStandardResults(DLALists[branchNum])
-            DLA.AddRange(DLARes, p)
-            UDLI_Less_100.AddRange(readDSStandardResults(underUDLILists[branchNum]), p)
-            UDLI_100_2000.AddRange(readDSStandardResults(inRangeUDLILists[branchNum]), p)
-            UDLI_More_2000.AddRange(readDSStandardResults(overUDLILists[branchNum]), p)
-            CDA.AddRange(readDSStandardResults(CDALists[branchNum]), p)
-            annualProfiles.Add(EPLSchLists[branchNum], p)
-            sDA.Add(getsDA(DLARes), p)
-            htmReport.Add(htmLists[branchNum], p)
+            DLA.AddRange(DLAValues[branchNum], p)
+            UDLI_Less_100.AddRange(underUDLIValues[branchNum], p)
+            UDLI_100_2000.AddRange(inRangeUDLIValues[branchNum], p)
+            UDLI_More_2000.AddRange(overUDLIValues[branchNum], p)
+            CDA.AddRange(CDAValues[branchNum], p)
+            sDA.Add(sDAValues[branchNum], p)
+            # annual profiles and the reports are only generated by Daysim
+            if len(EPLSchLists)!=0: annualProfiles.Add(EPLSchLists[branchNum], p)
+            if len(htmLists)!=0: htmReport.Add(htmLists[branchNum], p)
                 
 
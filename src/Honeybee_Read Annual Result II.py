@@ -17,11 +17,13 @@ Provided by Honeybee 0.0.51
         timeStep: Timestep for the annual study. Default is 1.
         minThreshold: Minimum of desired value (default is illuminance and 300 lux)
         maxThreshold: Maximum of desired value (default is infinite)
+        illuminanceBins_: Optional list of illuminance thresholds (e.g. 100, 300, 2000, 3000). The component calculates the percentage of the time in each bin: [< t1], [t1-t2], ... [> tn]. All the bins are calculated in a single pass over the results.
     Returns:
         readMe!: ...
         lessThanRange: Percentage of the time that the value is less than desired value
         inTheRange: Percentage of the time that the value is between minimum and maximum Thresholds
         moreThanRange: Percentage of the time that the value is more than desired value
+        valuesInBins: Percentage of the time that the value is in each of the illuminance bins. The results are branched as {space;bin}.
 """
 ghenv.Component.Name = "Honeybee_Read Annual Result II"
 ghenv.Component.NickName = 'readAnnualResultsII'
@@ -37,6 +39,8 @@ from System import Object
 from clr import AddReference
 AddReference('Grasshopper')
 import Grasshopper.Kernel as gh
+import scriptcontext as sc
+import os
 from Grasshopper import DataTree
 from Grasshopper.Kernel.Data import GH_Path
 
@@ -46,16 +50,22 @@ def isAllNone(dataList):
         if item!=None: return False
     return True
 
-if (testPts.DataCount!=0 or not isAllNone(testPts.AllData())) and resultFilesAddress and resultFilesAddress[0]!=None:
+if (testPts.DataCount!=0 or not isAllNone(testPts.AllData())) and resultFilesAddress and resultFilesAddress[0]!=None and \
+   not sc.sticky.has_key('honeybee_release'):
+    msg = "You should first let Honeybee to fly..."
+    ghenv.Component.AddRuntimeMessage(gh.GH_RuntimeMessageLevel.Warning, msg)
+    
+elif (testPts.DataCount!=0 or not isAllNone(testPts.AllData())) and resultFilesAddress and resultFilesAddress[0]!=None:
+    
+    hb_dsResultAux = sc.sticky["honeybee_DSResultAux"]()
+    runLog = sc.sticky["honeybee_RunLog"](os.path.join(os.path.dirname(resultFilesAddress[0]), "runLog.json"), append = True)
+    runLog.startStage("illuminanceBins")
     
     numOfPts = 0
     testPts.SimplifyPaths()
     numOfBranches = testPts.BranchCount
     for branchNum in range(numOfBranches):
         numOfPts = numOfPts + len(testPts.Branch(branchNum))
-    #print numOfPts
-# for path in range(len(testPts.Branch(branchNum))): print testPts.Branch(branchNum)[path]
-    
     
     # setting up work hours
     if workingHours == None:
@@ -80,41 +90,53 @@ if (testPts.DataCount!=0 or not isAllNone(testPts.AllData())) and resultFilesAdd
     if not maxThreshold: maxThreshold = float('+Inf')
     print 'Maximum threshold is set to ' + `maxThreshold`
     
-    underValues = [0] * numOfPts
-    values = [0] * numOfPts
-    overValues = [0] * numOfPts
+    # additional bins. illuminanceBins_ is not on the component of the files that are made with the older versions
+    try: illuminanceBins = illuminanceBins_
+    except NameError: illuminanceBins = []
+    try: bins = sorted(set([float(b) for b in illuminanceBins if b!=None]))
+    except: bins = []
+    
+    # put all the thresholds together so the files are only read once
+    thresholds = sorted(set(bins + [minThreshold, maxThreshold]))
+    
+    # study hours mask for the hours of the year
+    hourMask = []
+    for hour in range(8760):
+        hourMask.append(stHour <= (hour + 1)%24 < lunchStHour or lunchEndHour <= (hour + 1)%24 < endHour)
     
     # number of study hours during a year
-    studyHours = ((lunchStHour - stHour) + (endHour - lunchEndHour)) * 365
-    
-    totalPtCount = 0
-    ptsCountSoFar = 0
-    for resultFile in resultFilesAddress:
-        result = open(resultFile, 'r')
-        for hour, line in enumerate(result):
-            line = line.replace('\n', '', 10)
-            lineSeg = line.Split(' ')
-            #if len(lineSeg)!= len(testPts) + 4: print 'ERROR!'
-            for ptCount, hourLuxValue in enumerate(lineSeg[4:]):
-                if hour == 0: totalPtCount += 1
-                if  stHour <= (hour + 1)%24 < lunchStHour or lunchEndHour <= (hour + 1)%24 < endHour:
-                    if float(hourLuxValue) <= minThreshold: underValues[ptsCountSoFar + ptCount] += 1
-                    elif minThreshold <= float(hourLuxValue) <= maxThreshold: values[ptsCountSoFar + ptCount] += 1
-                    elif maxThreshold <= float(hourLuxValue): overValues[ptsCountSoFar + ptCount] += 1
-        result.close()
-        ptsCountSoFar = ptsCountSoFar + (len(lineSeg) - 4)
-        
+    studyHours = float(max(sum(hourMask), 1))
     
+    counts = hb_dsResultAux.calculateIlluminanceBins(resultFilesAddress, hourMask, thresholds)
+    
+    def sumBins(binIndices, ptCount):
+        return sum([counts[binCount][ptCount] for binCount in binIndices])
+    
+    # (t[i-1], t[i]] is saved in bin i
+    minIndex, maxIndex = thresholds.index(minThreshold), thresholds.index(maxThreshold)
     
     # Change values to %
-    for ptCount, v in enumerate(values):
-        underValues[ptCount] = round((underValues[ptCount]/studyHours) * 100, 2)
-        values[ptCount] = round((values[ptCount]/studyHours) * 100, 2)
-        overValues[ptCount] = round((overValues[ptCount]/studyHours) * 100, 2)
+    underValues = []
+    values = []
+    overValues = []
+    for ptCount in range(numOfPts):
+        underValues.append(round((sumBins(range(minIndex + 1), ptCount)/studyHours) * 100, 2))
+        values.append(round((sumBins(range(minIndex + 1, maxIndex + 1), ptCount)/studyHours) * 100, 2))
+        overValues.append(round((sumBins(range(maxIndex + 1, len(counts)), ptCount)/studyHours) * 100, 2))
     
     lessThanRange = DataTree[Object]()
     inTheRange = DataTree[Object]()    
     moreThanRange = DataTree[Object]()
+    valuesInBins = DataTree[Object]()
+    
+    # find the bins of the merged thresholds that belong to each of the additional bins
+    binRanges = []
+    if len(bins)!=0:
+        binIndices = [thresholds.index(b) for b in bins]
+        binRanges.append(range(binIndices[0] + 1))
+        for binCount in range(1, len(bins)):
+            binRanges.append(range(binIndices[binCount-1] + 1, binIndices[binCount] + 1))
+        binRanges.append(range(binIndices[-1] + 1, len(counts)))
     
     ptCount = 0
     for branchNum in range(numOfBranches):
@@ -123,5 +145,14 @@ if (testPts.DataCount!=0 or not isAllNone(testPts.AllData())) and resultFilesAdd
             lessThanRange.Add(underValues[ptCount], p)
             inTheRange.Add(values[ptCount], p)
             moreThanRange.Add("%.2f"%overValues[ptCount], p)
+            
+            # percentage of the time in each of the additional bins
+            for binCount, binRange in enumerate(binRanges):
+                valuesInBins.Add(round((sumBins(binRange, ptCount)/studyHours) * 100, 2), GH_Path(branchNum, binCount))
             ptCount += 1
-
+    
+    # the same inputs are only logged once while the definition is recalculated
+    inputKey = runLog.getInputKey(resultFilesAddress, [numOfPts, thresholds, stHour, endHour, lunchStHour, lunchEndHour])
+    if not runLog.hasStage("illuminanceBins", inputKey):
+        runLog.endStage("illuminanceBins", numOfPts, list(resultFilesAddress), inputKey = inputKey)
+        runLog.save()
@@ -13,12 +13,12 @@ Provided by Honeybee 0.0.51
         _illFilesAddress: List of .ill files
         _testPoints: List of 3d Points
         _annualProfiles: Address to a valid *_intgain.csv generated by daysim.
-        _targetPoint: One of the points from the test points
+        _targetPoint: One of the points from the test points. Connect a list of points to read the results for several points in one go.
     Returns:
         iIllumLevelsNoDynamicSHD: Illuminance values without dynamic shadings
         iIllumLevelsDynamicSHDGroupI: Illuminance values when shading group I is closed
         iIllumLevelsDynamicSHDGroupII: Illuminance values when shading group II is closed
-        iIlluminanceBasedOnOccupancy: Illuminance values based on Daysim user behavior
+        iIlluminanceBasedOnOccupancy: Illuminance values based on Daysim user behavior. If both shading groups are closed in an hour shading group I is in effect.
 """
 ghenv.Component.Name = "Honeybee_Read DS Result for a point"
 ghenv.Component.NickName = 'readDSHourlyResults'
@@ -31,6 +31,7 @@ except: pass
 
 
 import os
+import bisect
 import scriptcontext as sc
 from System import Object
 import Grasshopper.Kernel as gh
@@ -86,9 +87,15 @@ def sortIllFiles(illFilesAddress, returnFirstBranch = False):
     
     return illFileSets
 
-def main(illFilesAddress, testPoints, targetPoint, annualProfiles):
+def main(illFilesAddress, testPoints, targetPoints, annualProfiles):
     msg = str.Empty
     
+    if sc.sticky.has_key('honeybee_release'):
+        hb_dsResultAux = sc.sticky["honeybee_DSResultAux"]()
+    else:
+        msg = "You should first let Honeybee to fly..."
+        return msg, None, None
+    
     shadingProfiles = []
     
     #groups of groups here
@@ -111,27 +118,8 @@ def main(illFilesAddress, testPoints, targetPoint, annualProfiles):
             pass
         
         # import the shading groups
-        # this is a copy-paste from Daysim annual profiles
         for branchCount in range(len(annualProfiles)):
-            # open the file
-            filePath = annualProfiles[branchCount]
-            with open(filePath, "r") as inf:
-                for lineCount, line in enumerate(inf):
-                    if lineCount == 3:
-                        headings = line.strip().split(",")[3:]
-                        resultDict = {}
-                        for heading in range(len(headings)):
-                            resultDict[heading] = []
-                    elif lineCount> 3:
-                        results = line.strip().split(",")[3:]
-                        for resCount, result in enumerate(results):
-                            resultDict[resCount].append(float(result))
-                            
-                shadingCounter = 0
-                for headingCount, heading in enumerate(headings):
-                    if heading.strip().startswith("blind"):
-                        shadingProfiles[branchCount].append(resultDict[headingCount])
-                        shadingCounter += 1
+            shadingProfiles[branchCount] = hb_dsResultAux.readBlindProfiles(annualProfiles[branchCount])
         # make sure number of ill files matches the number of the shading groups
         # and sort them to work together
         for shadingProfile in shadingProfiles:
@@ -154,87 +142,74 @@ def main(illFilesAddress, testPoints, targetPoint, annualProfiles):
     else:
         illFileSets = sortIllFiles(illFilesAddress)
         
-    # find the index of the point
-    pointFound = False
-    targetPtIndex = 0
+    # find the index of the target points using a spatial index
+    allPoints = []
     for branch in range(testPoints.BranchCount):
-        for pt in testPoints.Branch(branch):
-            if pt.DistanceTo(targetPoint) < sc.doc.ModelAbsoluteTolerance:
-                pointFound = True
-                break
-            targetPtIndex+=1
-        if pointFound ==True: break
-    
-    # check number of points in each of the ill files
-    # number of points should be the same in all the illfile lists
-    # that's why I just try the first list of the ill files
-    numOfPtsInEachFile = []
-    for illFile in illFileSets[0]:
-        with open(illFile, "r") as illInf:
-            for lineCount, line in enumerate(illInf):
-                if not line.startswith("#"):
-                    numOfPtsInEachFile.append(len(line.strip().split(" ")) - 4)
-                    break
+        allPoints.extend(testPoints.Branch(branch))
+    targetPtIndices = sc.sticky["honeybee_PointIndex"](allPoints).findPoints(targetPoints)
     
-    # find the right ill file(s) to look into and read the results
-    # print targetPtIndex
-    targetListNumber = None
-    targetIndexNumber = None
-    for listCount, numOfPts in enumerate(numOfPtsInEachFile):
-        if sum(numOfPtsInEachFile[:listCount]) >= targetPtIndex + 1:
-            targetListNumber = listCount - 1
-            targetIndexNumber = targetPtIndex - sum(numOfPtsInEachFile[:listCount-1])
-            #print "list number is: ", listCount - 1
-            #print "index number is:", targetPtIndex - sum(numOfPtsInEachFile[:listCount-1])
-            break
+    if -1 in targetPtIndices:
+        msg = "The target point is not inside the point list"
+        return msg, None, None
     
-    # Probably this is not the best way but I really want to get it done tonight!
-    if targetListNumber == None:
-        targetListNumber = len(numOfPtsInEachFile)-1
-        targetIndexNumber = targetPtIndex - sum(numOfPtsInEachFile[:targetListNumber])
+    # stitch the ill files of each shading group together in the order of the points
+    illMatrixSets = {}
+    try:
+        for shadingGroupCount in range(len(illFileSets.keys())):
+            illMatrixSets[shadingGroupCount] = hb_dsResultAux.loadIllResultSet(illFileSets[shadingGroupCount])
+    except Exception, e:
+        for illMatrixSet in illMatrixSets.values(): illMatrixSet.close()
+        return str(e), None, None
     
-    if targetIndexNumber < 0:
+    # number of points should be the same in all the illfile lists
+    # that's why I just check the first list of the ill files
+    if max(targetPtIndices) >= illMatrixSets[0].numOfPts:
+        for illMatrixSet in illMatrixSets.values(): illMatrixSet.close()
         msg = "The target point is not inside the point list"
         return msg, None, None
     
-    # find in which space the point is located
-    targetSpace = None
-    for listCount, numOfPts in enumerate(numOfPtsInEachSpace):
-        if sum(numOfPtsInEachSpace[:listCount]) >= targetPtIndex + 1:
-            targetSpace = listCount - 1
-            break    
-    if targetSpace == None:
-        targetSpace = len(numOfPtsInEachSpace)-1
+    # find in which space each point is located
+    spaceOffsets = hb_dsResultAux.getOffsets(numOfPtsInEachSpace)
+    targetSpaces = [min(bisect.bisect_right(spaceOffsets, targetPtIndex) - 1, len(numOfPtsInEachSpace) - 1) \
+                    for targetPtIndex in targetPtIndices]
     
-    # 4 place holderd for the potential 3 outputs
+    # 3 place holderd for the potential 3 outputs
     # no blinds, shading group I and shading group II
-    illuminanceValues = {0: [],
-                         1: [],
-                         2: [],
+    # each one has a list of annual values for each target point
+    illuminanceValues = {0: [[] for pt in targetPoints],
+                         1: [[] for pt in targetPoints],
+                         2: [[] for pt in targetPoints],
                          }
-                         
-    for shadingGroupCount in range(len(illFileSets.keys())):
-        targetIllFile = illFileSets[shadingGroupCount][targetListNumber]
-        result = open(targetIllFile, 'r')
-        for lineCount, line in enumerate(result):
-            hourLuxValue = line.strip().split(" ")[targetIndexNumber + 4]
-            illuminanceValues[shadingGroupCount].append(float(hourLuxValue))
-        result.close()
+    
+    # read all the target points of each shading group in a single pass
+    for shadingGroupCount, illMatrixSet in illMatrixSets.items():
+        try:
+            columns = illMatrixSet.getColumns(targetPtIndices)
+        finally:
+            illMatrixSet.close()
+        illuminanceValues[shadingGroupCount] = [list(column) for column in columns]
         
-    return msg, illuminanceValues, shadingProfiles[targetSpace]
+    return msg, illuminanceValues, [shadingProfiles[targetSpace] for targetSpace in targetSpaces]
+
 
+def getTargetPoints(targetPoint):
+    # the input can be a single point or a list of points
+    try: return [pt for pt in targetPoint if pt!=None]
+    except TypeError: return [targetPoint]
 
 
-if _targetPoint!=None and not isAllNone(_illFilesAddress) and not isAllNone(_testPoints):
+if _targetPoint!=None and len(getTargetPoints(_targetPoint))!=0 and not isAllNone(_illFilesAddress) and not isAllNone(_testPoints):
     
     _testPoints.SimplifyPaths()
     _illFilesAddress.SimplifyPaths()
     
+    targetPoints = getTargetPoints(_targetPoint)
+    
     numOfPtsInEachSpace = []
     for branch in range(_testPoints.BranchCount):
         numOfPtsInEachSpace.append(len(_testPoints.Branch(branch)))
     
-    msg, illuminanceValues, shadingProfile = main(_illFilesAddress, _testPoints, _targetPoint, annualProfiles_)
+    msg, illuminanceValues, shadingProfiles = main(_illFilesAddress, _testPoints, targetPoints, annualProfiles_)
 
     if msg!=str.Empty:
         w = gh.GH_RuntimeMessageLevel.Warning
@@ -254,28 +229,31 @@ if _targetPoint!=None and not isAllNone(_illFilesAddress) and not isAllNone(_tes
         # Fore now it will work for one shading with one state. I'll check for more later.
         
         blindsGroupInEffect = []
-        annualIllumNoDynamicSHD.AddRange(heading + illuminanceValues[0])
+        if len(illuminanceValues[1][0])!=0: blindsGroupInEffect.append(1)
+        if len(illuminanceValues[2][0])!=0: blindsGroupInEffect.append(2)
         
-        if len(illuminanceValues[1])!=0:
-            blindsGroupInEffect.append(1)
-            annualIllumDynamicSHDGroupI.AddRange(heading + illuminanceValues[1])
+        # one branch for each target point
+        for targetCount in range(len(targetPoints)):
+            p = GH_Path(targetCount)
+            annualIllumNoDynamicSHD.AddRange(heading + illuminanceValues[0][targetCount], p)
             
-        if len(illuminanceValues[2])!=0:
-            blindsGroupInEffect.append(2)
-            iIllumLevelsDynamicSHDGroupII.AddRange(heading + illuminanceValues[2])
-        
-        # create the mixed result with the shadings
-        mixResults = heading
-        for HOY in range(8760):
-            blindModeFound = False
-            for blindGroup in blindsGroupInEffect:
-                if shadingProfile[blindGroup-1][HOY]==1:
-                    mixResults.append(illuminanceValues[blindGroup][HOY])
-                    blindModeFound = True
-                    break
-            if blindModeFound != True:
-                mixResults.append(illuminanceValues[0][HOY])
-                
-
-        iIlluminanceBasedOnOccupancy.AddRange(mixResults)
-
+            if 1 in blindsGroupInEffect:
+                annualIllumDynamicSHDGroupI.AddRange(heading + illuminanceValues[1][targetCount], p)
+            if 2 in blindsGroupInEffect:
+                iIllumLevelsDynamicSHDGroupII.AddRange(heading + illuminanceValues[2][targetCount], p)
+            
+            # create the mixed result with the shadings
+            shadingProfile = shadingProfiles[targetCount]
+            mixResults = heading + []
+            for HOY in range(8760):
+                blindModeFound = False
+                # the first group that is closed wins
+                for blindGroup in blindsGroupInEffect:
+                    if shadingProfile[blindGroup-1][HOY]==1:
+                        mixResults.append(illuminanceValues[blindGroup][targetCount][HOY])
+                        blindModeFound = True
+                        break
+                if blindModeFound != True:
+                    mixResults.append(illuminanceValues[0][targetCount][HOY])
+            
+            iIlluminanceBasedOnOccupancy.AddRange(mixResults, p)
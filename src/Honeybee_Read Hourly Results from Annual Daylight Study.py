@@ -13,13 +13,14 @@ Provided by Honeybee 0.0.51
         _illFilesAddress: List of .ill files
         _testPoints: List of 3d Points
         _annualProfiles: Address to a valid *_intgain.csv generated by daysim.
-        _HOY: Hour of the year
+        _HOY: Hour of the year. Connect a list of hours to read several hours in one go.
     Returns:
         iIllumLevelsNoDynamicSHD: Illuminance values without dynamic shadings
         iIllumLevelsDynamicSHDGroupI: Illuminance values when shading group I is closed
         iIllumLevelsDynamicSHDGroupII: Illuminance values when shading group II is closed
-        iIlluminanceBasedOnOccupancy: Illuminance values based on Daysim user behavior
+        iIlluminanceBasedOnOccupancy: Illuminance values based on Daysim user behavior. If both shading groups are closed in an hour shading group I is in effect.
         shadingGroupInEffect: 0: no blind, 1: shading group I, 2: shading group II
+        illFileBasedOnOccupancy: Address to the .ill file for the annual results based on Daysim user behavior. The file is written to the occupancyBased subfolder of the study. You can connect this file to the other result readers.
 """
 ghenv.Component.Name = "Honeybee_Read Hourly Results from Annual Daylight Study"
 ghenv.Component.NickName = 'readDSHourlyResults'
@@ -32,6 +33,7 @@ except: pass
 
 
 import os
+import scriptcontext as sc
 from System import Object
 import Grasshopper.Kernel as gh
 from Grasshopper import DataTree
@@ -65,9 +67,15 @@ def sortIllFiles(illFilesAddress):
     
     return illFileSets
 
-def main(illFilesAddress, testPoints, HOY, annualProfiles):
+def main(illFilesAddress, testPoints, numOfPtsInEachSpace, HOYs, annualProfiles):
     msg = str.Empty
     
+    if sc.sticky.has_key('honeybee_release'):
+        hb_dsResultAux = sc.sticky["honeybee_DSResultAux"]()
+    else:
+        msg = "You should first let Honeybee to fly..."
+        return msg, None, None, None
+    
     shadingProfiles = []
     
     #groups of groups here
@@ -81,7 +89,7 @@ def main(illFilesAddress, testPoints, HOY, annualProfiles):
             msg = "Number of annual profiles doesn't match the number of point groups!\n" + \
                   "NOTE: If you have no idea what I'm talking about just disconnect the annual Profiles\n" + \
                   "In that case the component will give you the results with no dynamic shadings."
-            return msg, None, None
+            return msg, None, None, None
         
         # sort the annual profiles
         try:
@@ -90,27 +98,8 @@ def main(illFilesAddress, testPoints, HOY, annualProfiles):
             pass
             
         # import the shading groups
-        # this is a copy-paste from Daysim annual profiles
         for branchCount in range(len(annualProfiles)):
-            # open the file
-            filePath = annualProfiles[branchCount]
-            with open(filePath, "r") as inf:
-                for lineCount, line in enumerate(inf):
-                    if lineCount == 3:
-                        headings = line.strip().split(",")[3:]
-                        resultDict = {}
-                        for heading in range(len(headings)):
-                            resultDict[heading] = []
-                    elif lineCount> 3:
-                        results = line.strip().split(",")[3:]
-                        for resCount, result in enumerate(results):
-                            resultDict[resCount].append(float(result))
-                            
-                shadingCounter = 0
-                for headingCount, heading in enumerate(headings):
-                    if heading.strip().startswith("blind"):
-                        shadingProfiles[branchCount].append(resultDict[headingCount])
-                        shadingCounter += 1
+            shadingProfiles[branchCount] = hb_dsResultAux.readBlindProfiles(annualProfiles[branchCount])
         # make sure number of ill files matches the number of the shading groups
         # and sort them to work together
         for shadingProfile in shadingProfiles:
@@ -118,7 +107,7 @@ def main(illFilesAddress, testPoints, HOY, annualProfiles):
                 msg = "Number of annual profiles doesn't match the number of shading groups!\n" + \
                       "NOTE: If you have no idea what I'm talking about just disconnect the annual Profiles\n" + \
                       "In that case the component will give you the results with no dynamic shadings."
-                return msg, None, None
+                return msg, None, None, None
             else:
                 # looks right so let's sort them
                 # sort each list inside the branch and took the first one for sorting the branches!
@@ -140,37 +129,62 @@ def main(illFilesAddress, testPoints, HOY, annualProfiles):
     
     # 3 place holderd for the potential 3 outputs
     # no blinds, shading group I and shading group II
-    illuminanceValues = {0: [],
-                         1: [],
-                         2: [],
+    # each one has a list of values for each of the hours
+    illuminanceValues = {0: [[] for HOY in HOYs],
+                         1: [[] for HOY in HOYs],
+                         2: [[] for HOY in HOYs],
+                         "mixed": [[] for HOY in HOYs]
                          }
     
-    totalPtCount = 0
-    ptsCountSoFar = 0
+    # read all the hours of the stitched ill files of each shading group in one go
+    hours = [int(HOY-1) for HOY in HOYs]
     for shadingGroupCount in range(len(illFileSets.keys())):
-        for resultFile in illFileSets[shadingGroupCount]:
-            result = open(resultFile, 'r')
-            for lineCount, line in enumerate(result):
-                if lineCount == int(HOY-1):
-                   line = line.replace('\n', '', 10)
-                   lineSeg = line.Split(' ')
-                   for hourLuxValue in lineSeg[4:]:
-                      illuminanceValues[shadingGroupCount].append(float(hourLuxValue))
-            result.close()
+        try:
+            illMatrixSet = hb_dsResultAux.loadIllResultSet(illFileSets[shadingGroupCount])
+        except Exception, e:
+            return str(e), None, None, None
+        try:
+            hourlyValues = illMatrixSet.getHours(hours)
+        finally:
+            illMatrixSet.close()
+        illuminanceValues[shadingGroupCount] = [list(values) for values in hourlyValues]
+    
+    # mix the results for all the hours and all the points in one go. The mixed
+    # results are saved as a new ill file so next time only the hours are read
+    mixedIllFile = None
+    if len(illFileSets.keys()) > 1 and len(annualProfiles) != 0:
+        illFiles = illFileSets[0]
+        # the mixed file is written to a subfolder so Lookup Daylighting Folder doesn't
+        # take it as one of the CPU chunks of the study
+        firstIllFile = hb_dsResultAux.sortIllFiles(illFiles)[0]
+        blendFolder = os.path.join(os.path.dirname(firstIllFile), "occupancyBased")
+        if not os.path.isdir(blendFolder): os.mkdir(blendFolder)
+        mixedIllFile = os.path.join(blendFolder, os.path.basename(firstIllFile).rsplit("_", 1)[0] + "_occupancyBased.ill")
+        hb_dsResultAux.blendDynamicShading([illFileSets[key] for key in range(len(illFileSets.keys()))], \
+                                           numOfPtsInEachSpace, annualProfiles, mixedIllFile)
+        illuminanceValues["mixed"] = hb_dsResultAux.readIllHours(mixedIllFile, hours)
+    
+    return msg, illuminanceValues, shadingProfiles, mixedIllFile
 
-    return msg, illuminanceValues, shadingProfiles
 
+def getHOYs(HOY):
+    # the input can be a single hour or a list of hours
+    try: return [int(h) for h in HOY if h!=None]
+    except TypeError: return [int(HOY)]
 
-if _HOY!=None and _illFilesAddress.DataCount!=0 and _illFilesAddress.Branch(0)[0]!=None and _testPoints:
+
+if _HOY!=None and len(getHOYs(_HOY))!=0 and _illFilesAddress.DataCount!=0 and _illFilesAddress.Branch(0)[0]!=None and _testPoints:
     
     _testPoints.SimplifyPaths()
     _illFilesAddress.SimplifyPaths()
     
+    HOYs = getHOYs(_HOY)
+    
     numOfPtsInEachSpace = []
     for branch in range(_testPoints.BranchCount):
         numOfPtsInEachSpace.append(len(_testPoints.Branch(branch)))
     
-    msg, illuminanceValues, shadingProfiles = main(_illFilesAddress, _testPoints, _HOY, annualProfiles_)
+    msg, illuminanceValues, shadingProfiles, illFileBasedOnOccupancy = main(_illFilesAddress, _testPoints, numOfPtsInEachSpace, HOYs, annualProfiles_)
 
     if msg!=str.Empty:
         w = gh.GH_RuntimeMessageLevel.Warning
@@ -181,28 +195,41 @@ if _HOY!=None and _illFilesAddress.DataCount!=0 and _illFilesAddress.Branch(0)[0
         iIllumLevelsDynamicSHDGroupI = DataTree[Object]()
         iIllumLevelsDynamicSHDGroupII = DataTree[Object]()
         iIlluminanceBasedOnOccupancy = DataTree[Object]()
+        shadingGroupInEffect = []
         
         # now this is the time to create the mixed results
         # I think I confused blind groups and shading states at some point or maybe I didn't!
         # Fore now it will work for one shading with one state. I'll check for more later.
         
-        blindsGroupInEffect = 0
-        # for each space
-        for spaceCount in range(len(numOfPtsInEachSpace)):
-            p = GH_Path(spaceCount)
-            iIllumLevelsNoDynamicSHD.AddRange(illuminanceValues[0][sum(numOfPtsInEachSpace[:spaceCount]):sum(numOfPtsInEachSpace[:spaceCount+1])], p)
-            
-            if len(illuminanceValues[1])!=0 and shadingProfiles[spaceCount]!=[]:
+        for hourCount, HOY in enumerate(HOYs):
+            blindsGroupInEffect = 0
+            # for each space
+            ptsCountSoFar = 0
+            for spaceCount in range(len(numOfPtsInEachSpace)):
+                # keep the old structure for a single hour
+                if len(HOYs) == 1: p = GH_Path(spaceCount)
+                else: p = GH_Path(hourCount, spaceCount)
                 
-                if shadingProfiles[spaceCount][0][_HOY-1] == 1: blindsGroupInEffect = 1
-                iIllumLevelsDynamicSHDGroupI.AddRange(illuminanceValues[1][sum(numOfPtsInEachSpace[:spaceCount]):sum(numOfPtsInEachSpace[:spaceCount+1])], p)
+                st, end = ptsCountSoFar, ptsCountSoFar + numOfPtsInEachSpace[spaceCount]
+                ptsCountSoFar = end
                 
-            if len(illuminanceValues[2])!=0 and shadingProfiles[spaceCount]!=[]:
-                if shadingProfiles[spaceCount][1][_HOY-1] == 1: blindsGroupInEffect = 2
-                iIllumLevelsDynamicSHDGroupII.AddRange(illuminanceValues[2][sum(numOfPtsInEachSpace[:spaceCount]):sum(numOfPtsInEachSpace[:spaceCount+1])], p)
+                iIllumLevelsNoDynamicSHD.AddRange(illuminanceValues[0][hourCount][st:end], p)
                 
-
-            iIlluminanceBasedOnOccupancy.AddRange(illuminanceValues[blindsGroupInEffect][sum(numOfPtsInEachSpace[:spaceCount]):sum(numOfPtsInEachSpace[:spaceCount+1])], p)
-            
-            shadingGroupInEffect =  blindsGroupInEffect
-
+                if len(illuminanceValues[1][hourCount])!=0 and shadingProfiles[spaceCount]!=[]:
+                    
+                    if shadingProfiles[spaceCount][0][HOY-1] == 1: blindsGroupInEffect = 1
+                    iIllumLevelsDynamicSHDGroupI.AddRange(illuminanceValues[1][hourCount][st:end], p)
+                    
+                if len(illuminanceValues[2][hourCount])!=0 and shadingProfiles[spaceCount]!=[]:
+                    # shading group I wins if both groups are closed
+                    if shadingProfiles[spaceCount][1][HOY-1] == 1 and blindsGroupInEffect != 1: blindsGroupInEffect = 2
+                    iIllumLevelsDynamicSHDGroupII.AddRange(illuminanceValues[2][hourCount][st:end], p)
+                    
+                if len(illuminanceValues["mixed"][hourCount])!=0:
+                    iIlluminanceBasedOnOccupancy.AddRange(illuminanceValues["mixed"][hourCount][st:end], p)
+                else:
+                    iIlluminanceBasedOnOccupancy.AddRange(illuminanceValues[blindsGroupInEffect][hourCount][st:end], p)
+                
+            shadingGroupInEffect.append(blindsGroupInEffect)
+        
+        if len(HOYs) == 1: shadingGroupInEffect = shadingGroupInEffect[0]
@@ -14,6 +14,7 @@ Provided by Honeybee 0.0.51
         _testPts: A list of 3d test points
         _analysisType: [0] illuminance, [1] radiation, [2] luminance, [3] daylight factor, [4] vertical sky component
         writeToFile_: set to True if you want the final results be saves as a text file
+        numericValues_: set to True to get the results as numbers. By default the results are text with two decimal places.
     Returns:
         readMe!: ...
         unit: Unit of the results
@@ -33,37 +34,22 @@ import System
 from clr import AddReference
 AddReference('Grasshopper')
 import Grasshopper.Kernel as gh
+import scriptcontext as sc
 import math
+import os
 from Grasshopper import DataTree
 from Grasshopper.Kernel.Data import GH_Path
 
-def readRadiationResult(resultFile):
-    result = []
-    resultFile = open(resultFile,"r")
-    for line in resultFile:
-        result.append(float(line.split('	')[0]))
-    return result
+if not sc.sticky.has_key('honeybee_release'):
+    msg = "You should first let Honeybee to fly..."
+    ghenv.Component.AddRuntimeMessage(gh.GH_RuntimeMessageLevel.Warning, msg)
 
-def readDLResult(resultFile):
-    result = []
-    resultFile = open(resultFile,"r")
-    for line in resultFile:
-        R, G, B = line.split('	')[0:3]
-        result.append(179*(.265 * float(R) + .67 * float(G) + .065 * float(B)))
-    return result
-
-def readDFResult(resultFile):
-    result = []
-    resultFile = open(resultFile,"r")
-    for line in resultFile:
-        R, G, B = line.split('	')[0:3]
-        # divide by the sky horizontal illuminance = 1000
-        res = 17900*(.265 * float(R) + .67 * float(G) + .065 * float(B))/1000
-        if res > 100: res = 100
-        result.append(res)
-    return result
-
-if _testPts and _resultFilesAddress and _analysisType and _resultFilesAddress[0]!=None:
+elif _testPts and _resultFilesAddress and _analysisType and _resultFilesAddress[0]!=None:
+    hb_radResultAux = sc.sticky["honeybee_RADResultAux"]()
+    # add the time of reading the results to the log of the study
+    # the same files are only logged once while the definition is recalculated
+    runLog = sc.sticky["honeybee_RunLog"](os.path.join(os.path.dirname(_resultFilesAddress[0]), "runLog.json"), append = True)
+    runLog.startStage("readResults")
     _testPts.SimplifyPaths()
     numOfPts = []
     numOfBranches = _testPts.BranchCount
@@ -72,37 +58,41 @@ if _testPts and _resultFilesAddress and _analysisType and _resultFilesAddress[0]
         
     studyType = int(_analysisType.split(":")[0].strip()[0])
     
-    resultValues = []
-    for fileCount, resultFile in enumerate(_resultFilesAddress):
-        if studyType == 0 or studyType == 2:
-            #illuminance / luminance
-            resultValues.extend(readDLResult(resultFile))
-        elif studyType == 1:
-            # radiation
-            resultValues.extend(readRadiationResult(resultFile))
-        elif studyType == 3 or studyType == 4:
-            resultValues.extend(readDFResult(resultFile))
+    # the result files can be ASCII or binary. the reader finds the format from the header
+    resultValues = hb_radResultAux.readResultFiles(_resultFilesAddress, studyType)
+    
+    resultValues = resultValues[:sum(numOfPts)]
+    
+    # numericValues_ is not on the component of the files that are made with the older versions
+    try: numericValues = numericValues_ == True
+    except NameError: numericValues = False
+    
+    # only format the values if they are needed as text
+    formattedValues = []
+    if writeToFile_ == True or not numericValues:
+        formattedValues = ["%.2f"%resValue for resValue in resultValues]
+    
+    if numericValues: branchValues = resultValues
+    else: branchValues = formattedValues
     
     result = DataTree[System.Object]()
     # re-branching the results
     totalPtsCount = 0
-    if writeToFile_ == True:
-        resFileName = "_".join(".".join(_resultFilesAddress[0].split(".")[:-1]).split("_")[:-1]) + "_result.txt"
-        
-        resFile = open(resFileName, "w")
-        pass
-        
     for branchNum in range(numOfBranches):
         p = GH_Path(branchNum)
-        for ptCount in range(numOfPts[branchNum]):
-            resValue = "%.2f"%resultValues[totalPtsCount]
-            result.Add(resValue, p)
-            if writeToFile_ == True: resFile.write(resValue + "\n")
-            totalPtsCount += 1
+        result.AddRange(branchValues[totalPtsCount:totalPtsCount + numOfPts[branchNum]], p)
+        totalPtsCount += numOfPts[branchNum]
+    
+    inputKey = runLog.getInputKey(_resultFilesAddress, [numOfPts, studyType])
+    if not runLog.hasStage("readResults", inputKey):
+        runLog.endStage("readResults", sum(numOfPts), list(_resultFilesAddress), inputKey = inputKey)
+        runLog.save()
     
     if writeToFile_ == True:
+        resFileName = "_".join(".".join(_resultFilesAddress[0].split(".")[:-1]).split("_")[:-1]) + "_result.txt"
+        with open(resFileName, "w") as resFile:
+            resFile.write("\n".join(formattedValues) + "\n")
         print "Result file path: " + resFileName
-        resFile.close()
     
     # add analysis type
     analysisTypesDict = {0: ["0:illuminance" , "lux"],
@@ -16,6 +16,13 @@ Provided by Honeybee 0.0.52
         _writeRad: Write simulation files
         runRad_: Run the analysis. _writeRad should be also set to true
         _numOfCPUs_: Number of CPUs to be used for the studies. This option doesn't work for image-based analysis
+        chunksPerCPU_: Set to a number larger than 1 to split the test points into smaller chunks. The chunks are run from a queue by _numOfCPUs_ workers so all the CPUs stay busy until the end of the study. A failed chunk is run again and the errors of the chunks that fail again are printed. Default is 1.
+        interleavePts_: Set to True to give every n-th test point of grid-based studies to the same chunk instead of a contiguous block of points, so the expensive points (e.g. deep inside the building) are shared between the CPUs. Each chunk gets an index file (*.idx) that is used to put the results back in the order of the points. Annual studies always use contiguous blocks. Default is False.
+        binaryPts_: Set to True to write the test points of grid-based studies as binary floats (*.ptsb) instead of text files (*.pts). rtrace reads the binary points faster but the files can't be read by the older versions of the readers or the other tools. Annual studies always use text files. Default is False.
+        persistentWorkers_: Set to True to keep rtrace running in the background for grid-based studies. The next runs of the same scene with the same parameters only send the test points to the running rtrace processes instead of loading the scene again. The processes are restarted when the scene changes and use the same ambient files as reuseAmbient_. Default is False.
+        reuseAmbient_: Set to False to start the indirect calculation from scratch in each run. By default the ambient files (-af) of grid-based and image-based studies are kept in _workingDir_\_radFileName_\ambientCache and are reused as long as the scene and the ambient parameters are the same. Default is True.
+        reuseResults_: Set to False to trace all the test points in each run. By default the results of grid-based studies are kept in _workingDir_\_radFileName_\resultCache for each scene (geometry, materials, sky and Radiance parameters) and only the test points that are not in the cache are traced. If all the points are in the cache the results are returned without running Radiance. Default is True.
+        shardFolder_: A shared folder (e.g. \\server\share\queue) to run the chunks of grid-based and annual studies on several nodes. The chunks are written to a work queue in this folder and the workers on each node take them from the queue. Run "python hb_worker.py shardFolder_" from the folder on each node to add it to the study. _numOfCPUs_ workers also run on this machine. _workingDir_ should be a shared folder with the same path on all the nodes. persistentWorkers_ is not used for sharded studies.
         _workingDir_: Working directory on your system. Default is set to C:\Ladybug
         _radFileName_: Input the project name as a string
         meshingLevel_: Level of meshing [0] Coarse [1] Smooth
@@ -59,22 +66,6 @@ from Grasshopper.Kernel.Data import GH_Path
 
 
 
-def isTheStudyOver(fileNames):
-    while True:
-        cmd = 'WMIC PROCESS get Commandline' #,Processid'
-        proc = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE)
-        cmdCount = 0
-        for line in proc.stdout:
-            if line.strip().startswith("cmd") and line.strip().endswith(".bat"):
-                fileName = line.strip().split(" ")[-1].split("\\")[-1]
-                # I should check the file names and make sure they are the right files
-                if fileName in fileNames:
-                    cmdCount += 1
-        time.sleep(0.2)
-        if cmdCount == 0:
-            return
-        #if cmdCount > 1: return
-
 class WriteRAD(object):
     
     def shiftList(self, list, number = 1):
@@ -376,6 +367,11 @@ class WriteRADAUX(object):
         line = "oconv -f " +  senceFiles + " > " + octFileName + ".oct\n"
         
         return line
+    
+    def oconvCommand(self, octFileName, radFilesList, hb_RADPath = "", workingDir = None, env = None):
+        """Same as oconvLine as an hb_Command which can run without a batch file."""
+        argv = [os.path.join(hb_RADPath, "oconv"), "-f"] + [address.replace("\\" , "/") for address in radFilesList]
+        return sc.sticky["honeybee_Command"](argv, stdout = octFileName + ".oct", cwd = workingDir, env = env)
 
     def rpictLine(self, viewFileName, projectName, viewName, radParameters):
         line = "rpict -t 10 -i -ab " + `radParameters["_ab_"]` + \
@@ -385,45 +381,55 @@ class WriteRADAUX(object):
            projectName + "_" + viewName + "_RadStudy.pic\n"
         return line
     
-    def rpictLineAlternate(self, view, projectName, viewName, radParameters, analysisType = 0):
+    def rpictCommands(self, view, projectName, viewName, radParameters, analysisType = 0, ambFile = None, \
+                      hb_RADPath = "", workingDir = None, env = None):
+        """rpict and pfilt commands to render a view as a list of hb_Commands. view is the view string from exportView."""
+        hb_Command = sc.sticky["honeybee_Command"]
         octFile = projectName + ".oct"
-        ambFile = projectName + "_" + viewName + ".amb"
+        # the first pass fills the ambient file which is used by the second pass.
+        # an ambient file from the previous runs doesn't need the first pass.
+        firstPass = ambFile == None or not os.path.isfile(ambFile)
+        if ambFile == None: ambFile = projectName + "_" + viewName + ".amb"
         unfFile = projectName + "_" + viewName + ".unf" 
         outputFile = projectName + "_" + viewName + ".HDR"
         
+        rpictArgv = [os.path.join(hb_RADPath, "rpict")]
         if analysisType==0:
             # illuminance (lux)
-            line0 = "rpict -i "
+            rpictArgv.append("-i")
         elif analysisType==2:
             # luminance (cd)
-            line0 = "rpict "
+            pass
         else:
             # radiation analysis
-            line0 = "rpict -i "
+            rpictArgv.append("-i")
         
         # check got translucant materials
         # St = A6*A7*( 1  photopic average (A1,A2,A3) * A4 )
         # radParameters["_st_"]
         
-        line1 = "-t 10 "+ \
-                view + " -af " + ambFile +  " " + \
-                " -ps " + str(radParameters["_ps_"]) + " -pt " + str(radParameters["_pt_"]) + \
-                " -pj " + str(radParameters["_pj_"]) + " -dj " + str(radParameters["_dj_"]) + \
-                " -ds " + str(radParameters["_ds_"]) + " -dt " + str(radParameters["_dt_"]) + \
-                " -dc " + str(radParameters["_dc_"]) + " -dr " + str(radParameters["_dr_"]) + \
-                " -dp " + str(radParameters["_dp_"]) + " -st " + str(radParameters["_st_"])  + \
-                " -ab " + `radParameters["_ab_"]` + \
-                " -ad " + `radParameters["_ad_"]` + " -as " +  `radParameters["_as_"]` + \
-                " -ar " + `radParameters["_ar_"]` + " -aa " +  '%.3f'%radParameters["_aa_"] + \
-                " -lr " + `radParameters["_lr_"]`  + " -lw " + '%.3f'%radParameters["_lw_"] + " -av 0 0 0 " + \
-                " " + octFile + " > " + unfFile + "\n"
+        rpictArgv += ["-t", "10"] + view.split() + ["-af", ambFile,
+                      "-ps", str(radParameters["_ps_"]), "-pt", str(radParameters["_pt_"]),
+                      "-pj", str(radParameters["_pj_"]), "-dj", str(radParameters["_dj_"]),
+                      "-ds", str(radParameters["_ds_"]), "-dt", str(radParameters["_dt_"]),
+                      "-dc", str(radParameters["_dc_"]), "-dr", str(radParameters["_dr_"]),
+                      "-dp", str(radParameters["_dp_"]), "-st", str(radParameters["_st_"]),
+                      "-ab", `radParameters["_ab_"]`,
+                      "-ad", `radParameters["_ad_"]`, "-as", `radParameters["_as_"]`,
+                      "-ar", `radParameters["_ar_"]`, "-aa", '%.3f'%radParameters["_aa_"],
+                      "-lr", `radParameters["_lr_"]`, "-lw", '%.3f'%radParameters["_lw_"], "-av", "0", "0", "0",
+                      octFile]
+        
+        rpictCommand = hb_Command(rpictArgv, stdout = unfFile, cwd = workingDir, env = env)
+        pfiltCommand = hb_Command([os.path.join(hb_RADPath, "pfilt"), "-1", "-r", ".6", "-x/2", "-y/2", unfFile], \
+                                  stdout = outputFile, cwd = workingDir, env = env)
+        
+        if firstPass: return [rpictCommand, rpictCommand, pfiltCommand]
+        else: return [rpictCommand, pfiltCommand]
     
-        line2 = "del " + ambFile + "\n"
-        
-        line3 = "pfilt -1 -r .6 -x/2 -y/2 " + unfFile + " > " + outputFile + \
-                    "\nexit\n"
-        
-        return line0 + line1 + line2 + line0 + line1 + line3
+    def rpictLineAlternate(self, view, projectName, viewName, radParameters, analysisType = 0, ambFile = None):
+        return "".join([command.toBatchLine() for command in \
+                        self.rpictCommands(view, projectName, viewName, radParameters, analysisType, ambFile)]) + "exit\n"
         
         
     def falsecolorLine(self, projectName, viewName):
@@ -432,61 +438,72 @@ class WriteRADAUX(object):
            "ra_gif " + projectName + "_" + viewName + "_FalseColored.pic " + projectName + "_" + viewName + "_FalseColored.gif\n"
         return line
 
-    def rtraceLine(self, projectName, octFileName, radParameters, simulationType = 0, cpuCount = 0):
+    def rtraceParameters(self, radParameters):
+        """Radiance parameters for rtrace as a list of arguments."""
+        return ["-ms", "0.063", "-dp", str(radParameters["_dp_"]),
+                "-ds", str(radParameters["_ds_"]), "-dt", str(radParameters["_dt_"]),
+                "-dc", str(radParameters["_dc_"]), "-dr", str(radParameters["_dr_"]),
+                "-st", str(radParameters["_st_"]), "-lr", str(radParameters["_lr_"]),
+                "-lw", str(radParameters["_lw_"]), "-ab", str(radParameters["_ab_"]),
+                "-ad", str(radParameters["_ad_"]), "-as", str(radParameters["_as_"]),
+                "-ar", str(radParameters["_ar_"]), "-aa", str(radParameters["_aa_"])]
+    
+    def rtraceArgv(self, octFileName, radParameters, simulationType = 0, hb_RADPath = ""):
+        """Arguments to run rtrace directly with ASCII input and output (e.g. for hb_RtraceWorkers which adds the ambient files)."""
+        argv = [os.path.join(hb_RADPath, "rtrace")]
+        if simulationType != 2: argv.append("-I")
+        return argv + ["-h", "-faa"] + self.rtraceParameters(radParameters) + [octFileName + ".oct"]
+    
+    def rtraceCommand(self, projectName, octFileName, radParameters, simulationType = 0, cpuCount = 0, binaryOutput = False, \
+                      binaryInput = False, ambFile = None, hb_RADPath = "", workingDir = None, env = None):
+        """rtrace for the test points of a cpu as an hb_Command which can run without a batch file."""
         ptsFile = projectName + "_" + str(cpuCount) + ".pts"
         outputFile = projectName + "_" + str(cpuCount) + ".res"
+        argv = [os.path.join(hb_RADPath, "rtrace")]
         if simulationType == 0:
-            line0 = "rtrace -I "
+            argv.append("-I")
         elif simulationType == 2:
-            line0 = "rtrace "
+            pass
         else:
             print "Fix this for radiation analysis"
-            line0 = "rtrace -I "
-            
-        line1 = " -h -ms 0.063 -dp " + str(radParameters["_dp_"]) + \
-                " -ds " + str(radParameters["_ds_"]) + " -dt " + str(radParameters["_dt_"]) + \
-                " -dc " + str(radParameters["_dc_"]) + " -dr " + str(radParameters["_dr_"]) + \
-                " -st " + str(radParameters["_st_"]) + " -lr " + str(radParameters["_lr_"]) + \
-                " -lw " + str(radParameters["_lw_"]) + " -ab " + str(radParameters["_ab_"]) + \
-                " -ad " + str(radParameters["_ad_"]) + " -as " + str(radParameters["_as_"]) + \
-                " -ar " + str(radParameters["_ar_"]) + " -aa " + str(radParameters["_aa_"]) + \
-                " " + octFileName + ".oct < " + ptsFile + \
-                " > " + outputFile + "\n"
-        
-        return line0 + line1
-        
-    def testPtsStr(self, testPoint, ptsNormal):
-        return  '%.4f'%testPoint.X + '\t' + \
-                '%.4f'%testPoint.Y + '\t' + \
-                '%.4f'%testPoint.Z + '\t' + \
-                '%.4f'%ptsNormal.X + '\t' + \
-                '%.4f'%ptsNormal.Y + '\t' + \
-                '%.4f'%ptsNormal.Z + '\n'
+            argv.append("-I")
         
-
+        # -fio sets the format of the input and the output. binary output keeps
+        # the header so the readers can find the format
+        if binaryInput:
+            ptsFile += "b"
+            inputFormat = "f"
+        else:
+            inputFormat = "a"
+        
+        if binaryOutput: argv += ["-f" + inputFormat + "f"]
+        elif binaryInput: argv += ["-h", "-f" + inputFormat + "a"]
+        else: argv += ["-h"]
+        
+        if ambFile != None: argv += ["-af", ambFile]
+        
+        argv += self.rtraceParameters(radParameters) + [octFileName + ".oct"]
+        return sc.sticky["honeybee_Command"](argv, stdin = ptsFile, stdout = outputFile, cwd = workingDir, env = env)
+    
+    def rtraceLine(self, projectName, octFileName, radParameters, simulationType = 0, cpuCount = 0, binaryOutput = False, binaryInput = False, ambFile = None):
+        return self.rtraceCommand(projectName, octFileName, radParameters, simulationType, cpuCount, \
+                                  binaryOutput, binaryInput, ambFile).toBatchLine()
+    
     def readRadiationResult(self, resultFile):
-        result = []
-        resultFile = open(resultFile,"r")
-        for line in resultFile: result.append(float(line.split('	')[0])*179)
-        return result
+        return sc.sticky["honeybee_RADResultAux"]().readRadiation(resultFile, 179)
     
     def readDLResult(self, resultFile):
-        result = []
-        resultFile = open(resultFile,"r")
-        for line in resultFile:
-            R, G, B = line.split('	')[0:3]
-            result.append( 179 * (.265 * float(R) + .67 * float(G) + .065 * float(B)))
-        return result
+        return sc.sticky["honeybee_RADResultAux"]().readIlluminance(resultFile)
 
 class WriteDS(object):
     
-    def isSensor(self, testPt, sensors):
-        for pt in sensors:
-            if pt.DistanceTo(testPt) < sc.doc.ModelAbsoluteTolerance:
-                # this is a senor point
-                return True
-        # not a sensor
-        return False
+    def getSensorIndex(self, sensors):
+        # build the index once for the sensors of a shading group and use it for all the test points
+        return sc.sticky["honeybee_PointIndex"](sensors)
+    
+    def isSensor(self, testPt, sensorIndex):
+        # sensorIndex is the hb_PointIndex of the sensors from getSensorIndex
+        return sensorIndex.hasPoint(testPt)
     
     def DSHeadingStr(self, projectName, subWorkingDir, tempFolder, hb_DSPath, cpuCount = 0):
         return   '#######################################\n' + \
@@ -715,8 +732,9 @@ class WriteDS(object):
         
         #sensorInfoStr = 'sensor_file_info'
         #if type == 0 or type == 2:
+        #    sensorIndex = self.getSensorIndex(sensors)
         #    for pt in testPts:
-        #        if self.isSensor(pt, sensors):
+        #        if self.isSensor(pt, sensorIndex):
         #            sensorInfoStr += ' BG' + str(recipeCount+1)
         #        # if BG1_Ext
         #        # add external sensor_ This should happen inside the loop for each group
@@ -756,7 +774,7 @@ sc.sticky["honeybee_WriteRAD"] = WriteRAD
 sc.sticky["honeybee_WriteRADAUX"] = WriteRADAUX
 sc.sticky["honeybee_WriteDS"] = WriteDS
 
-def main(north, HBObjects, analysisRecipe, runRad, numOfCPUs, workingDir, radFileName, meshingLevel, waitingTime, overwriteResults):
+def main(north, HBObjects, analysisRecipe, runRad, numOfCPUs, workingDir, radFileName, meshingLevel, waitingTime, overwriteResults, chunksPerCPU = 1, persistentWorkers = False, reuseAmbient = True, reuseResults = True, shardFolder = None, interleavePts = False, binaryPts = False):
     # import the classes
     if sc.sticky.has_key('ladybug_release')and sc.sticky.has_key('honeybee_release'):
         lb_preparation = sc.sticky["ladybug_Preparation"]()
@@ -827,6 +845,7 @@ def main(north, HBObjects, analysisRecipe, runRad, numOfCPUs, workingDir, radFil
                 outputUnits = analysisRecipe.DSParameters.outputUnits
                 adaptiveZone = analysisRecipe.DSParameters.adaptiveZone
                 dgp_imageSize = analysisRecipe.DSParameters.dgp_imageSize
+                compressDcFiles = analysisRecipe.DSParameters.compressDcFiles
                 dynamicShadingRecipes = analysisRecipe.DSParameters.DShdR
                 numOfIllFiles = analysisRecipe.DSParameters.numOfIll
                 
@@ -977,6 +996,36 @@ def main(north, HBObjects, analysisRecipe, runRad, numOfCPUs, workingDir, radFil
         
         radFileFullName = subWorkingDir + "\\" + radFileName + '.rad'
         
+        # time of each stage and each chunk of the study
+        runLog = sc.sticky["honeybee_RunLog"](os.path.join(subWorkingDir, "runLog.json"))
+        
+        def saveRunLog(stageName, startTime, numOfPoints = None, jobResults = [], chunkNames = [], chunkFiles = {}):
+            # add the tasks and the total time of the simulation to the log
+            # chunkFiles has the result file of each chunk for the tasks that write them
+            chunkPoints = {}
+            outputFiles = {}
+            for cpuCount, numOfPts in enumerate(lenOfPts):
+                for chunkName in chunkNames: chunkPoints[chunkName + "_" + `cpuCount`] = numOfPts
+            for chunkName, resultFiles in chunkFiles.items():
+                for cpuCount, resultFile in enumerate(resultFiles): outputFiles[chunkName + "_" + `cpuCount`] = [resultFile]
+            runLog.addJobResults(jobResults, chunkPoints, outputFiles)
+            stage = runLog.addStage(stageName, time.time() - startTime, numOfPoints)
+            runLog.save()
+            
+            report = "The " + stageName + " took " + "%.1f"%stage["duration"] + " seconds"
+            if stage.has_key("pointsPerSecond"): report += " (" + `stage["pointsPerSecond"]` + " points per second)"
+            slowestChunk = None
+            for chunkName in chunkNames:
+                chunk = runLog.getSlowestStage(chunkName + "_")
+                if chunk != None and (slowestChunk == None or chunk["duration"] > slowestChunk["duration"]): slowestChunk = chunk
+            if slowestChunk != None: report += ". The slowest chunk is " + slowestChunk["name"] + " (" + "%.1f"%slowestChunk["duration"] + " seconds)"
+            print report + "."
+        
+        def getTaskGraph():
+            # the tasks are sent to the work queue if the study is sharded
+            if shardFolder != None: return sc.sticky["honeybee_WorkQueue"](shardFolder, numOfLocalWorkers = numOfCPUs)
+            return sc.sticky["honeybee_TaskGraph"](numOfCPUs)
+        
         ######################### WRITE RAD FILES ###########################
         
         # 2.1 write the geometry file
@@ -985,6 +1034,7 @@ def main(north, HBObjects, analysisRecipe, runRad, numOfCPUs, workingDir, radFil
         # call the objects from the lib
         hb_hive = sc.sticky["honeybee_Hive"]()
         HBObjects = hb_hive.callFromHoneybeeHive(HBObjects)
+        runLog.startStage("geometry")
         geoRadFile = open(radFileFullName, 'w')
         geoRadFile.write("#GENERATED BY HONEYBEE\n")
         customRADMat = {} # dictionary to collect the custom material names
@@ -1045,9 +1095,11 @@ def main(north, HBObjects, analysisRecipe, runRad, numOfCPUs, workingDir, radFil
                             geoRadFile.write(hb_writeRAD.RADNonPlanarChildSurface(HBObj))
                             
         geoRadFile.close()
+        runLog.endStage("geometry", files = [radFileFullName])
         
         ########################################################################
         ######################## GENERATE THE BASE RAD FILE ####################
+        runLog.startStage("materials")
         materialFileName = subWorkingDir + "\\material_" + radFileName + '.rad'
         # This part should be fully replaced with the new method where I generate the materials from the 
         
@@ -1138,10 +1190,14 @@ def main(north, HBObjects, analysisRecipe, runRad, numOfCPUs, workingDir, radFil
                                 radInf.write("#empty shading file")
                             pass
                             
+        runLog.endStage("materials", files = [materialFileName])
+        
         ######################## GENERATE POINT FILES #######################
         # test points should be generated if the study is grid based
         # except image-based simulation
+        lenOfPts = []
         if analysisType != 0:
+            runLog.startStage("points")
             # write a pattern file which I can use later to re-branch the points
             ptnFileName = radFileFullName.replace('.rad','.ptn')
             with open(ptnFileName, "w") as ptnFile:
@@ -1154,33 +1210,57 @@ def main(north, HBObjects, analysisRecipe, runRad, numOfCPUs, workingDir, radFil
             numOfPoints = len(flattenTestPoints)
         
             if numOfCPUs > numOfPoints: numOfCPUs = numOfCPUs
+            
+            # with more than one chunk for each CPU the chunks are run from a queue
+            numOfChunks = numOfCPUs * chunksPerCPU
         
-            if numOfCPUs > 1: ptsEachCpu = int(numOfPoints/(numOfCPUs))
-            else: ptsEachCpu = numOfPoints
-        
-            lenOfPts = []
             testPtsEachCPU = []
+            normalsEachCPU = []
+            
+            # Daysim needs text files but rtrace can read the points as binary floats
+            binaryPtsFiles = binaryPts and analysisType != 2
+            hb_ptsFileAux = sc.sticky["honeybee_PtsFileAux"]()
             
-            for cpuCount in range(numOfCPUs):
+            # the results of annual studies are merged in the order of the CPUs so the points
+            # should stay in contiguous blocks. for the other studies the points can be interleaved
+            # between the CPUs so the expensive points are not all in the same chunk
+            interleavePts = interleavePts and analysisType != 2
+            
+            # only the points which are not in the result cache are traced
+            resultCache = None
+            tracedIndices = range(numOfPoints)
+            if reuseResults and runRad and analysisType != 2:
+                resultCache = sc.sticky["honeybee_ResultCache"](os.path.join(workingDir, radFileName, "resultCache"), \
+                              [materialFileName, radSkyFileName, radFileFullName], [analysisType, int(simulationType), radParameters])
+                allRays = hb_ptsFileAux.getPtsStr(flattenTestPoints, flattenPtsNormals).splitlines()
+                tracedIndices = resultCache.getMissingIndices(allRays)
+                print `numOfPoints - len(tracedIndices)` + " of " + `numOfPoints` + " test points are loaded from the result cache."
+            
+            partitions = [[tracedIndices[ptCount] for ptCount in ptIndices] for ptIndices in \
+                          hb_ptsFileAux.getPartitions(len(tracedIndices), numOfChunks, interleavePts)]
+            
+            for cpuCount, ptIndices in enumerate(partitions):
                 # write pts file
-                ptsForThisCPU = []
                 ptsFileName = radFileFullName.replace('.rad', '_' + `cpuCount` + '.pts')
-                ptsFile = open(ptsFileName, "w")
-                if cpuCount + 1 != numOfCPUs:
-                    for ptCount in range(cpuCount * ptsEachCpu, (cpuCount + 1) * ptsEachCpu):
-                        ptsFile.write(hb_writeRADAUX.testPtsStr(flattenTestPoints[ptCount], flattenPtsNormals[ptCount]))
-                        ptsForThisCPU.append(flattenTestPoints[ptCount])
-                    lenOfPts.append(ptsEachCpu)
-                    
-                else:
-                    for ptCount in range(cpuCount * ptsEachCpu, numOfPoints):
-                        ptsFile.write(hb_writeRADAUX.testPtsStr(flattenTestPoints[ptCount], flattenPtsNormals[ptCount]))
-                        ptsForThisCPU.append(flattenTestPoints[ptCount])
-                    lenOfPts.append(numOfPoints - (cpuCount * ptsEachCpu))
+                # remove the points of the other format from the last run so the readers don't find both
+                if binaryPtsFiles: oldPtsFileName, ptsFileName = ptsFileName, ptsFileName + "b"
+                else: oldPtsFileName = ptsFileName + "b"
+                if os.path.isfile(oldPtsFileName): os.remove(oldPtsFileName)
+                
+                ptsForThisCPU = [flattenTestPoints[ptCount] for ptCount in ptIndices]
+                normalsForThisCPU = [flattenPtsNormals[ptCount] for ptCount in ptIndices]
+                hb_ptsFileAux.writePtsFile(ptsFileName, ptsForThisCPU, normalsForThisCPU, binaryPtsFiles)
+                lenOfPts.append(len(ptIndices))
                 
-                ptsFile.close()
+                # the readers use the index file to put the results back in order
+                indexFileName = hb_ptsFileAux.getIndexFileName(ptsFileName)
+                if interleavePts: hb_ptsFileAux.writeIndexFile(indexFileName, ptIndices)
+                elif os.path.isfile(indexFileName): os.remove(indexFileName)
                 
                 testPtsEachCPU.append(ptsForThisCPU)
+                normalsEachCPU.append(normalsForThisCPU)
+            
+            runLog.endStage("points", numOfPoints)
                 
         ######################## WRITE ANNUAL SIMULATION - DAYSIM #######################
         if analysisRecipe.type == 2:
@@ -1214,9 +1294,8 @@ def main(north, HBObjects, analysisRecipe, runRad, numOfCPUs, workingDir, radFil
                             
             initBatchFile.write(initBatchStr)
             initBatchFile.close()
-            fileNames = []
             # write the rest of the files
-            for cpuCount in range(numOfCPUs):
+            for cpuCount in range(numOfChunks):
                 heaFileName = radFileFullName.replace('.rad', '_' + `cpuCount` + '.hea')
                 heaFile = open(heaFileName, "w")
                 projectName =  radFileName
@@ -1263,8 +1342,6 @@ def main(north, HBObjects, analysisRecipe, runRad, numOfCPUs, workingDir, radFil
                 DSBatchFileName = radFileFullName.replace('.rad', '_' + `cpuCount` + '_DS.bat')
                 DSBatchFile = open(DSBatchFileName, "w")
                 
-                fileNames.append(DSBatchFileName.split("\\")[-1])
-                
                 heaFileName = radFileFullName.replace('.rad', '_' + `cpuCount` + '.hea')
                 
                 #SET PATH = " + subWorkingDir + "\n" + workingDrive +"\n"
@@ -1283,30 +1360,66 @@ def main(north, HBObjects, analysisRecipe, runRad, numOfCPUs, workingDir, radFil
                 DSBatchFile.close()
                 
             if runRad:
-                os.system(initBatchFileName)
-                time.sleep(waitingTime)
-                for cpuCount in range(numOfCPUs):
-                    # running batch file in background
-                    DSBatchFileName = radFileFullName.replace('.rad', '_' + `cpuCount` + '_DS.bat')
-                    # print DSBatchFileName
-                    p = subprocess.Popen(r'start cmd /c ' + DSBatchFileName , shell=True)
-                    time.sleep(waitingTime)
-                    #p.wait()
-                    #os.system(DSBatchFileName)
-                # read the number of .ill files
-                # and the number of .dc files
-                if subWorkingDir[-1] == os.sep: subWorkingDir = subWorkingDir[:-1]
+                # run the same commands as the batch files directly. the batch files
+                # are kept so the study can be run by hand
+                hb_Command = sc.sticky["honeybee_Command"]
+                dsEnv = hb_Command.getEnvironment([hb_RADPath, hb_DSPath, hb_DSLibPath], [hb_RADLibPath, hb_DSPath, hb_DSLibPath])
+                weatherFileName = subWorkingDir + "\\" + lb_preparation.removeBlankLight(locName)
+                initCommands = [hb_Command([os.path.join(hb_DSPath, "epw2wea"), weatherFileName + '.epw', weatherFileName + '.wea'], \
+                                           cwd = hb_DSPath, env = dsEnv),
+                                hb_Command([os.path.join(hb_DSPath, "radfiles2daysim"), radFileFullName.replace('.rad', '_0.hea'), "-m", "-g"], \
+                                           cwd = hb_DSPath, env = dsEnv)]
+                
+                # run the study as a graph of tasks. the chunks can run at the same time as soon as
+                # the Daysim files are ready. the direct and the diffuse passes of a chunk write to the
+                # same files of the .hea file so the direct pass waits for the diffuse pass
                 startTime = time.time()
-                # print fileNames
-                isTheStudyOver(fileNames)
-                # check if the results are available
-                files = os.listdir(subWorkingDir)
-                numIll = 0
-                numDc = 0
-                for file in files:
-                    if file.EndsWith('ill'): numIll+=1
-                    elif file.EndsWith('dc'): numDc+=1
-                if numIll!= numOfCPUs * numOfIllFiles or  numDc!= numOfCPUs * numOfIllFiles:
+                hb_taskGraph = getTaskGraph()
+                initTask = hb_taskGraph.addTask("init", initCommands, [], [weatherFileName + '.wea'])
+                illumTasks = []
+                for cpuCount in range(numOfChunks):
+                    heaFileName = radFileFullName.replace('.rad', '_' + `cpuCount` + '.hea')
+                    dsCommand = lambda program, args: hb_Command([os.path.join(hb_DSPath, program), heaFileName] + args, \
+                                                                 cwd = subWorkingDir, env = dsEnv)
+                    difTask = hb_taskGraph.addTask("dif_" + `cpuCount`, dsCommand("gen_dc", ["-dif"]), [initTask])
+                    dirTask = hb_taskGraph.addTask("dir_" + `cpuCount`, dsCommand("gen_dc", ["-dir"]), [difTask])
+                    pasteTask = hb_taskGraph.addTask("paste_" + `cpuCount`, dsCommand("gen_dc", ["-paste"]), [dirTask])
+                    illumTasks.append(hb_taskGraph.addTask("illum_" + `cpuCount`, dsCommand("ds_illum", []), [pasteTask], \
+                                                           [DSResultFilesAddress[cpuCount]]))
+                
+                if subWorkingDir[-1] == os.sep: subWorkingDir = subWorkingDir[:-1]
+                
+                def mergeResults():
+                    # check if the results are available
+                    # read the number of .ill files and the number of .dc files
+                    files = os.listdir(subWorkingDir)
+                    numIll = 0
+                    numDc = 0
+                    for file in files:
+                        if file.EndsWith('ill'): numIll+=1
+                        elif file.EndsWith('dc'): numDc+=1
+                    if numIll!= numOfChunks * numOfIllFiles or  numDc!= numOfChunks * numOfIllFiles:
+                        raise Exception("Can't find the results for the study")
+                    
+                    # convert the results to binary matrices so the readers
+                    # don't need to parse the text files every time
+                    hb_dsResultAux = sc.sticky["honeybee_DSResultAux"]()
+                    illFiles = [os.path.join(subWorkingDir, file) for file in files if file.EndsWith('ill')]
+                    for illMatrix in hb_dsResultAux.loadIllMatrices(illFiles, convert = True):
+                        illMatrix.close()
+                    
+                    # the results are already calculated so the daylight coefficients
+                    # are only needed by the result readers. the .dc files are deleted once
+                    # they are compressed (see compressDcFiles_ in DSParameters)
+                    if compressDcFiles:
+                        dcFiles = [os.path.join(subWorkingDir, file) for file in files if file.EndsWith('.dc')]
+                        hb_dsResultAux.compressDcFiles(dcFiles, removeSource = True)
+                
+                mergeTask = hb_taskGraph.addTask("merge", mergeResults, illumTasks)
+                taskResults = hb_taskGraph.run()
+                saveRunLog("annual simulation", startTime, numOfPoints, hb_taskGraph.jobResults, ["dif", "dir", "paste", "illum"], \
+                           {"illum": DSResultFilesAddress})
+                if not taskResults[mergeTask]:
                     print "Can't find the results for the study"
                     DSResultFilesAddress = []
                 
@@ -1329,6 +1442,14 @@ def main(north, HBObjects, analysisRecipe, runRad, numOfCPUs, workingDir, radFil
                 # not annual and not image based
                 initBatchFileName = radFileFullName.replace('.rad', '_RADInit.bat')
             
+            # the ambient files are kept out of the study folder so they are not removed in the next run
+            if reuseAmbient:
+                # the nodes of a sharded study can't lock a shared ambient file
+                shareAmbientFile = None
+                if shardFolder != None: shareAmbientFile = False
+                ambientCache = sc.sticky["honeybee_AmbientCache"](os.path.join(workingDir, radFileName, "ambientCache"), \
+                               [materialFileName, radSkyFileName, radFileFullName], radParameters, shareAmbientFile)
+            
             batchFile = open(initBatchFileName, "w")
             
             # write the path string (I should check radiance to be installed on the system
@@ -1344,26 +1465,36 @@ def main(north, HBObjects, analysisRecipe, runRad, numOfCPUs, workingDir, radFil
             OCTLine = hb_writeRADAUX.oconvLine(OCTFileName, [materialFileName, radSkyFileName, radFileFullName])
             batchFile.write(OCTLine)
             
+            # the same commands are run directly without the batch files. the batch
+            # files are kept so the study can be run by hand
+            radEnv = sc.sticky["honeybee_Command"].getEnvironment([hb_RADPath], [hb_RADLibPath])
+            oconvCommand = hb_writeRADAUX.oconvCommand(OCTFileName, [materialFileName, radSkyFileName, radFileFullName], \
+                                                       hb_RADPath, subWorkingDir, radEnv)
+            
             if analysisRecipe.type == 0:
                 # write view files
                 if len(rhinoViewNames)==0: rhinoViewNames = [sc.doc.Views.ActiveView.ActiveViewport.Name]
                 # print rhinoViewNames
                 HDRFileAddress = []
+                imageCommands = []
                 for view in rhinoViewNames:
                     view = lb_preparation.removeBlank(view)
                     HDRFileAddress.append(subWorkingDir + "\\" + OCTFileName + "_" + view + ".HDR")
                     viewLine = hb_writeRADAUX.exportView(view, radParameters, cameraType, imageSize, sectionPlane)
                     # write rpict lines
-                    RPICTLines = hb_writeRADAUX.rpictLineAlternate(viewLine, OCTFileName, view, radParameters, int(simulationType))
+                    ambFile = None
+                    if reuseAmbient: ambFile = ambientCache.getAmbientFile()
+                    RPICTLines = hb_writeRADAUX.rpictLineAlternate(viewLine, OCTFileName, view, radParameters, int(simulationType), ambFile)
                     batchFile.write(RPICTLines)
+                    imageCommands.extend(hb_writeRADAUX.rpictCommands(viewLine, OCTFileName, view, radParameters, int(simulationType), \
+                                                                      ambFile, hb_RADPath, subWorkingDir, radEnv))
                 batchFile.close()
             else:
                 batchFile.close() # close the init file
-                fileNames = []
-                for cpuCount in range(numOfCPUs):
+                rtraceCommands = []
+                for cpuCount in range(numOfChunks):
                     # create a batch file
                     batchFileName = radFileFullName.replace('.rad', '_' + `cpuCount` + '_RAD.bat')
-                    fileNames.append(batchFileName.split("\\")[-1])
                     batchFile = open(batchFileName, "w")
                     # write path files
                     batchFile.write(pathStr)
@@ -1371,44 +1502,97 @@ def main(north, HBObjects, analysisRecipe, runRad, numOfCPUs, workingDir, radFil
                     batchFile.write("cd " + subWorkingDir + "\n")
                     
                     # 3.4. add rtrace lin
-                    RTRACELine = hb_writeRADAUX.rtraceLine(radFileName, OCTFileName, radParameters, int(simulationType), cpuCount)
+                    # the chunks are always the same for the same points so each chunk finds its own ambient file in the next run
+                    ambFile = None
+                    if reuseAmbient: ambFile = ambientCache.getAmbientFile(cpuCount)
+                    RTRACELine = hb_writeRADAUX.rtraceLine(radFileName, OCTFileName, radParameters, int(simulationType), cpuCount, binaryOutput = True, binaryInput = binaryPtsFiles, ambFile = ambFile)
                     batchFile.write(RTRACELine)
+                    rtraceCommands.append(hb_writeRADAUX.rtraceCommand(radFileName, OCTFileName, radParameters, int(simulationType), cpuCount, \
+                                                                       True, binaryPtsFiles, ambFile, hb_RADPath, subWorkingDir, radEnv))
                     
                     # close the file
                     batchFile.close()
             if runRad:
                 # run batch file and return address  and the result
                 if  analysisRecipe.type == 0:
-                    os.system(initBatchFileName)
+                    startTime = time.time()
+                    hb_jobQueue = sc.sticky["honeybee_JobQueue"](1)
+                    hb_jobQueue.run([([oconvCommand] + imageCommands, HDRFileAddress)])
+                    saveRunLog("rendering", startTime, jobResults = hb_jobQueue.jobResults)
                     return radFileFullName, [], [], [], [], HDRFileAddress
                 
                 else:
+                    if resultCache != None and len(tracedIndices) == 0:
+                        # all the points are in the result cache
+                        startTime = time.time()
+                        resultFileName = resultCache.writeResultFile(radFileFullName.replace('.rad', '.res'), allRays)
+                        saveRunLog("result cache", startTime, numOfPoints)
+                        return radFileFullName, [], [resultFileName], testPoints, [], []
+                    
+                    startTime = time.time()
+                    jobResults = []
                     RADResultFilesAddress = []
-                    os.system(initBatchFileName)
-                    for cpuCount in range(numOfCPUs):
-                        # running batch file in background
-                        RADBatchFileName = radFileFullName.replace('.rad', '_' + `cpuCount` + '_RAD.bat')
-                        # print DSBatchFileName
-                        p = subprocess.Popen(r'start cmd /c ' + RADBatchFileName , shell=True)
-                        
-                        RADResultFilesAddress.append(radFileFullName.replace('.rad', '_' + `cpuCount` + '.res'))
-                        time.sleep(waitingTime)
+                    chunkResultFiles = []
+                    if persistentWorkers and shardFolder == None:
+                        # rtrace would start with an empty scene if oconv fails
+                        exitCode, stderr = oconvCommand.run()
+                        if exitCode != 0: raise Exception("oconv failed with exit code " + `exitCode` + ":\n" + stderr)
+                        # send the points to rtrace processes that stay alive between the runs
+                        rtraceArgv = hb_writeRADAUX.rtraceArgv(OCTFileName, radParameters, int(simulationType), hb_RADPath)
+                        # each worker gets the managed ambient file of its cpu the same as the batch files
+                        ambFiles = None
+                        if reuseAmbient and ambientCache.isActive:
+                            ambFiles = [ambientCache.getAmbientFile(cpuCount) for cpuCount in range(numOfCPUs)]
+                        rtraceWorkers = sc.sticky["honeybee_RtraceWorkers"].getWorkers(rtraceArgv, numOfCPUs, subWorkingDir, radEnv, ambFiles)
+                        for cpuCount in range(numOfChunks):
+                            rays = hb_ptsFileAux.getPtsStr(testPtsEachCPU[cpuCount], normalsEachCPU[cpuCount]).splitlines(True)
+                            # write the results the same way as the batch files so the readers can use them
+                            RADResultFilesAddress.append(radFileFullName.replace('.rad', '_' + `cpuCount` + '.res'))
+                            chunkStartTime = time.time()
+                            with open(RADResultFilesAddress[-1], "w") as resFile:
+                                resFile.writelines(rtraceWorkers.trace(rays))
+                            runLog.addStage("rtrace_" + `cpuCount`, time.time() - chunkStartTime, len(rays), [RADResultFilesAddress[-1]])
+                    else:
+                        # run oconv and then the chunks as soon as the octree is ready
+                        hb_taskGraph = getTaskGraph()
+                        oconvTask = hb_taskGraph.addTask("oconv", oconvCommand, [], [os.path.join(subWorkingDir, OCTFileName + '.oct')])
+                        for cpuCount in range(numOfChunks):
+                            RADResultFilesAddress.append(radFileFullName.replace('.rad', '_' + `cpuCount` + '.res'))
+                            hb_taskGraph.addTask("rtrace_" + `cpuCount`, rtraceCommands[cpuCount], [oconvTask], [RADResultFilesAddress[-1]])
+                        hb_taskGraph.run()
+                        jobResults = hb_taskGraph.jobResults
                         
                     if subWorkingDir[-1] == os.sep: subWorkingDir = subWorkingDir[:-1]
                     
-                    startTime = time.time()
-                    isTheStudyOver(fileNames)
-                    
                     numRes = 0
                     files = os.listdir(subWorkingDir)
                     for file in files:
                         if file.EndsWith('res'): numRes+=1
-                    if numRes != numOfIllFiles * numOfCPUs:
+                    if numRes != numOfIllFiles * numOfChunks:
                         print "Cannot find the results of the study"
                         RADResultFilesAddress = []
-                    time.sleep(1)
-                    # run all the batch files
                     
+                    if resultCache != None and len(RADResultFilesAddress) != 0:
+                        # add the new results to the cache and write the results of all the points in one file
+                        hb_radResultAux = sc.sticky["honeybee_RADResultAux"]()
+                        for cpuCount, resultFileName in enumerate(RADResultFilesAddress):
+                            resultCache.update([allRays[ptCount] for ptCount in partitions[cpuCount]], \
+                                               hb_radResultAux.readRGBValues(resultFileName))
+                        
+                        if len(resultCache.getMissingIndices(allRays)) == 0:
+                            chunkResultFiles = RADResultFilesAddress
+                            RADResultFilesAddress = [resultCache.writeResultFile(radFileFullName.replace('.rad', '.res'), allRays)]
+                        else:
+                            print "Cannot find the results of the study"
+                            RADResultFilesAddress = []
+                    
+                    # the points from the cache are not traced
+                    saveRunLog("grid-based simulation", startTime, len(tracedIndices), jobResults, ["rtrace"], \
+                               {"rtrace": [radFileFullName.replace('.rad', '_' + `cpuCount` + '.res') for cpuCount in range(numOfChunks)]})
+                    
+                    # the chunks are merged in the result file of the study. they are removed so
+                    # Lookup Daylighting Folder only finds one result file for the study
+                    for resultFile in chunkResultFiles: os.remove(resultFile)
                     return radFileFullName, [], RADResultFilesAddress, testPoints, [], []
                 
             else:
@@ -1430,7 +1614,8 @@ if _writeRad == True and len(_HBObjects)!=0 and _HBObjects[0]!=None and _analysi
     except: numOfCPUs = 1
     
     # make sure it is not more than the number of available CPUs
-    ncpus = int(os.environ["NUMBER_OF_PROCESSORS"])
+    # NUMBER_OF_PROCESSORS is only set on Windows
+    ncpus = int(os.environ.get("NUMBER_OF_PROCESSORS", System.Environment.ProcessorCount))
     
     if numOfCPUs > ncpus:
         print "Sorry! But the number of available CPUs on your machine is " + str(ncpus) + "." + \
@@ -1439,7 +1624,31 @@ if _writeRad == True and len(_HBObjects)!=0 and _HBObjects[0]!=None and _analysi
         
     
     
-    result = main(north_, _HBObjects, _analysisRecipe, runRad_, numOfCPUs, _workingDir_, _radFileName_, meshingLevel_, waitingTime, overwriteResults_)
+    # the inputs below are not on the component of the files that are made with the older versions
+    try: chunksPerCPU = chunksPerCPU_
+    except NameError: chunksPerCPU = 1
+    try: chunksPerCPU = max(int(chunksPerCPU), 1)
+    except: chunksPerCPU = 1
+    
+    try: interleavePts = interleavePts_ == True
+    except NameError: interleavePts = False
+    
+    try: binaryPts = binaryPts_ == True
+    except NameError: binaryPts = False
+    
+    try: persistentWorkers = persistentWorkers_ == True
+    except NameError: persistentWorkers = False
+    try: reuseAmbient = reuseAmbient_ != False
+    except NameError: reuseAmbient = True
+    try: reuseResults = reuseResults_ != False
+    except NameError: reuseResults = True
+    
+    try: shardFolder = shardFolder_
+    except NameError: shardFolder = None
+    if shardFolder != None and str(shardFolder).strip() != "": shardFolder = str(shardFolder).strip()
+    else: shardFolder = None
+    
+    result = main(north_, _HBObjects, _analysisRecipe, runRad_, numOfCPUs, _workingDir_, _radFileName_, meshingLevel_, waitingTime, overwriteResults_, chunksPerCPU, persistentWorkers, reuseAmbient, reuseResults, shardFolder, interleavePts, binaryPts)
     
     if result!= -1:
         # RADGeoFileAddress, radiationResult, RADResultFilesAddress, testPoints, DSResultFilesAddress, HDRFileAddress = result
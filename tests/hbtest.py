@@ -0,0 +1,105 @@
+"""
+Load the helper classes of src/Honeybee_Honeybee.py for the tests.
+
+Honeybee_Honeybee.py is a Grasshopper component and needs Rhino to run. The
+classes between hb_PointIndex and checkGHPythonVersion only need the standard
+library so that part of the file is executed on its own. The .NET parallel loops
+run one after another. The tests are written for Python 2.7 (the same as the
+IronPython of Grasshopper). Run them from the root of the repository with:
+
+    python2.7 -m unittest discover -s tests
+
+or with pytest if it is installed for Python 2.7:
+
+    python2.7 -m pytest -q tests
+
+Honeybee_Honeybee.py is Python 2 code so the tests are skipped on Python 3.
+"""
+import os
+import sys
+import math
+import time
+import array
+import struct
+import bisect
+import subprocess
+import threading
+import hashlib
+import json
+import random
+import shutil
+import tempfile
+import unittest
+from itertools import chain
+try: import mmap
+except ImportError: mmap = None
+try: import zlib
+except ImportError: zlib = None
+
+srcFolder = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+honeybeeFile = os.path.join(srcFolder, "Honeybee_Honeybee.py")
+
+
+class Parallel(object):
+    @staticmethod
+    def ForEach(items, function):
+        for item in items: function(item)
+
+
+class Tasks(object):
+    Parallel = Parallel
+
+
+if sys.version_info[0] > 2:
+    raise unittest.SkipTest("Honeybee_Honeybee.py is Python 2 code. Run the tests with Python 2.7.")
+
+
+def loadHoneybee():
+    with open(honeybeeFile, "r") as inf:
+        source = inf.read()
+    start = source.index("class hb_PointIndex")
+    end = source.index("def checkGHPythonVersion")
+    # keep the line numbers of the file in the tracebacks
+    code = "\n" * source.count("\n", 0, start) + source[start:end]
+
+    namespace = {"__name__": "Honeybee_Honeybee", "os": os, "sys": sys, "math": math, "time": time,
+                 "array": array, "struct": struct, "bisect": bisect, "subprocess": subprocess,
+                 "threading": threading, "hashlib": hashlib, "json": json, "mmap": mmap, "zlib": zlib,
+                 "chain": chain, "tasks": Tasks, "sc": None}
+    exec(compile(code, honeybeeFile, "exec"), namespace)
+    return namespace
+
+hb = loadHoneybee()
+
+
+def writeIllFile(illFile, rows):
+    """Write a Daysim .ill file with one row of values for each hour. Daysim puts two spaces after the date."""
+    with open(illFile, "w") as outf:
+        for hour, values in enumerate(rows):
+            outf.write("%d %d %.3f  " % (1 + hour // 744, 1 + (hour % 744) // 24, hour % 24 + .5) + \
+                       " ".join(["%.1f" % value for value in values]) + "\n")
+    return illFile
+
+
+def randomRows(numOfHours, numOfPts, seed = 0):
+    # about a third of the values are zero the same as the night hours
+    rnd = random.Random(seed)
+    return [[round(rnd.choice([0, rnd.uniform(0, 3000), rnd.uniform(0, 3000)]), 1) for ptCount in range(numOfPts)] \
+            for hour in range(numOfHours)]
+
+
+def roundFloat(value):
+    # values are stored as float32
+    return array.array("f", [value])[0]
+
+
+class TempFolderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix = "hbtest_")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors = True)
+
+    def getPath(self, fileName):
+        return os.path.join(self.folder, fileName)
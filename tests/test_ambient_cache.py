@@ -0,0 +1,62 @@
+import os
+import unittest
+
+from hbtest import hb, TempFolderTestCase
+
+
+def getRadParameters(**kwargs):
+    radParameters = {"_ab_": 2, "_ad_": 512, "_as_": 128, "_ar_": 16, "_aa_": .25, "_lr_": 6, "_lw_": .01, "_dt_": .5}
+    radParameters.update(kwargs)
+    return radParameters
+
+
+class AmbientCacheTestCase(TempFolderTestCase):
+
+    def setUp(self):
+        TempFolderTestCase.setUp(self)
+        self.cacheFolder = self.getPath("ambientCache")
+        self.sceneFiles = [self.writeSceneFile("material.rad", "void plastic wall"), \
+                           self.writeSceneFile("scene.rad", "wall polygon floor")]
+
+    def writeSceneFile(self, fileName, content):
+        with open(self.getPath(fileName), "w") as outf: outf.write(content)
+        return self.getPath(fileName)
+
+    def getCache(self, radParameters = None, shareFile = False):
+        if radParameters == None: radParameters = getRadParameters()
+        return hb["hb_AmbientCache"](self.cacheFolder, self.sceneFiles, radParameters, shareFile)
+
+    def touch(self, ambFile):
+        open(ambFile, "w").close()
+        return ambFile
+
+    def test_same_scene_and_parameters_get_the_same_file(self):
+        ambFile = self.getCache().getAmbientFile(1)
+        self.assertEqual(os.path.dirname(ambFile), self.cacheFolder)
+        self.assertTrue(ambFile.endswith("_1.amb"))
+        self.assertEqual(self.getCache().getAmbientFile(1), ambFile)
+        self.assertNotEqual(self.getCache().getAmbientFile(0), ambFile)
+        # the processes share the file if the system can lock it
+        self.assertEqual(self.getCache(shareFile = True).getAmbientFile(0), self.getCache(shareFile = True).getAmbientFile(1))
+
+    def test_only_ambient_parameters_change_the_file(self):
+        ambFile = self.getCache().getAmbientFile()
+        self.assertEqual(self.getCache(getRadParameters(_dt_ = .1)).getAmbientFile(), ambFile)
+        self.assertNotEqual(self.getCache(getRadParameters(_ad_ = 1024)).getAmbientFile(), ambFile)
+        # there is no ambient file without ambient bounces
+        self.assertEqual(self.getCache(getRadParameters(_ab_ = 0)).getAmbientFile(), None)
+
+    def test_files_of_other_scenes_are_removed(self):
+        ambFile = self.touch(self.getCache().getAmbientFile())
+        otherParameters = self.touch(self.getCache(getRadParameters(_ad_ = 1024)).getAmbientFile())
+        self.assertTrue(os.path.isfile(ambFile))
+
+        self.writeSceneFile("scene.rad", "wall polygon floor window")
+        newAmbFile = self.getCache().getAmbientFile()
+        self.assertNotEqual(newAmbFile, ambFile)
+        self.assertFalse(os.path.isfile(ambFile))
+        self.assertFalse(os.path.isfile(otherParameters))
+
+
+if __name__ == "__main__":
+    unittest.main()
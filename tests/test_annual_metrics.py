@@ -0,0 +1,97 @@
+import os
+import unittest
+
+from hbtest import hb, writeIllFile, randomRows, roundFloat, TempFolderTestCase
+
+
+def writeOccupancyFile(occFile, occupancy):
+    with open(occFile, "w") as outf:
+        outf.write("# Daysim occupancy file\n# time_step 60, comment: weekdays 8 to 18\n\n")
+        for hour, isOccupied in enumerate(occupancy):
+            outf.write("%d,%d,%.1f,%d\n" % (1 + hour // 744, 1 + (hour % 744) // 24, hour % 24 + .5, isOccupied))
+    return occFile
+
+
+class AnnualMetricsTestCase(TempFolderTestCase):
+
+    def setUp(self):
+        TempFolderTestCase.setUp(self)
+        self.dsResultAux = hb["DSResultAux"]()
+        self.numOfHours = 72
+        self.pattern = [4, 6]
+        self.rows = randomRows(self.numOfHours, 10, seed = 3)
+        # the chunks don't line up with the spaces
+        self.illFiles = [writeIllFile(self.getPath("study_0.ill"), [row[:7] for row in self.rows]),
+                         writeIllFile(self.getPath("study_1.ill"), [row[7:] for row in self.rows])]
+        self.occupancy = [[hour % 24 >= 8 and hour % 24 < 18 for hour in range(self.numOfHours)],
+                          [hour % 3 != 0 for hour in range(self.numOfHours)]]
+        self.occFiles = [writeOccupancyFile(self.getPath("space_" + str(spaceCount) + ".csv"), occupancy) \
+                         for spaceCount, occupancy in enumerate(self.occupancy)]
+
+    def getExpectedMetrics(self, spaceCount, threshold):
+        offsets = self.dsResultAux.getOffsets(self.pattern)
+        hours = [hour for hour in range(self.numOfHours) if self.occupancy[spaceCount][hour]]
+        expected = {"DA": [], "CDA": [], "UDI_less_100": [], "UDI_100_2000": [], "UDI_more_2000": []}
+        for ptCount in range(offsets[spaceCount], offsets[spaceCount + 1]):
+            values = [roundFloat(self.rows[hour][ptCount]) for hour in hours]
+
+            def toPercentage(value):
+                return round(100 * value / float(len(hours)), 2)
+
+            expected["DA"].append(toPercentage(len([value for value in values if value >= threshold])))
+            expected["CDA"].append(toPercentage(sum([min(value / threshold, 1) for value in values])))
+            expected["UDI_less_100"].append(toPercentage(len([value for value in values if value < 100])))
+            expected["UDI_100_2000"].append(toPercentage(len([value for value in values if 100 <= value <= 2000])))
+            expected["UDI_more_2000"].append(toPercentage(len([value for value in values if value > 2000])))
+        return expected
+
+    def test_metrics_match_a_point_by_point_calculation(self):
+        thresholds = [300, 500]
+        results = self.dsResultAux.calculateAnnualMetrics(self.illFiles, self.pattern, self.occFiles, thresholds)
+
+        for spaceCount in range(len(self.pattern)):
+            expected = self.getExpectedMetrics(spaceCount, thresholds[spaceCount])
+            for metric, values in expected.items():
+                self.assertEqual(len(results[metric][spaceCount]), self.pattern[spaceCount])
+                for value, expectedValue in zip(results[metric][spaceCount], values):
+                    self.assertAlmostEqual(value, expectedValue, places = 2)
+
+            numOfPtsWithDA = len([DA for DA in results["DA"][spaceCount] if DA >= 50])
+            self.assertEqual(results["sDA"][spaceCount], "%.2f" % (100.0 * numOfPtsWithDA / self.pattern[spaceCount]))
+
+    def test_first_occupancy_file_and_threshold_are_used_for_all_spaces(self):
+        results = self.dsResultAux.calculateAnnualMetrics(self.illFiles, self.pattern, self.occFiles[:1], [300])
+        self.occupancy[1] = self.occupancy[0]
+        self.assertEqual(results["DA"][1], self.getExpectedMetrics(1, 300)["DA"])
+
+    def test_occupancy_file_with_the_wrong_number_of_hours(self):
+        writeOccupancyFile(self.occFiles[1], self.occupancy[1][:-1])
+        with self.assertRaises(Exception) as context:
+            self.dsResultAux.calculateAnnualMetrics(self.illFiles, self.pattern, self.occFiles, [300])
+        self.assertTrue("has 71 hours but the results have 72 hours" in str(context.exception))
+
+    def test_manifest_only_keeps_the_path_to_the_metrics(self):
+        # the same as the metrics stage of Read Annual Result I
+        manifest = hb["hb_ResultManifest"](self.getPath("study_manifest.json"))
+        metricsFile = self.dsResultAux.getAnnualMetricsFileName(self.illFiles[0])
+        self.assertEqual(metricsFile, self.getPath("study_0_metrics.json"))
+        values = [self.pattern, [300.0]]
+        results = self.dsResultAux.calculateAnnualMetrics(self.illFiles, self.pattern, self.occFiles, [300])
+        self.dsResultAux.saveAnnualMetrics(results, metricsFile)
+        manifest.updateStage("metrics", self.illFiles, values, [metricsFile])
+        manifest.save()
+
+        manifest = hb["hb_ResultManifest"](self.getPath("study_manifest.json"))
+        self.assertEqual(manifest.getOutputs("metrics"), [metricsFile])
+        self.assertEqual(sorted(manifest.stages["metrics"].keys()), ["files", "outputs", "values"])
+        self.assertTrue(manifest.isStageValid("metrics", self.illFiles, values, [metricsFile]))
+        self.assertEqual(self.dsResultAux.loadAnnualMetrics(metricsFile), results)
+
+        # the stage has to be recalculated if the metrics are removed
+        os.remove(metricsFile)
+        self.assertFalse(manifest.isStageValid("metrics", self.illFiles, values, [metricsFile]))
+        self.assertEqual(self.dsResultAux.loadAnnualMetrics(metricsFile), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import sys
+import unittest
+
+from hbtest import hb, TempFolderTestCase
+
+
+class CommandTestCase(TempFolderTestCase):
+
+    def setUp(self):
+        TempFolderTestCase.setUp(self)
+        self.command = hb["hb_Command"]
+
+    def test_batch_line_has_the_same_arguments_and_redirections(self):
+        command = self.command(["rtrace", "-I", "-ab", 2, "c:\\my study\\scene.oct"], stdin = "study_0.pts", stdout = "study_0.res")
+        self.assertEqual(command.argv, ["rtrace", "-I", "-ab", "2", "c:\\my study\\scene.oct"])
+        self.assertEqual(command.toBatchLine(), 'rtrace -I -ab 2 "c:\\my study\\scene.oct" < study_0.pts > study_0.res\n')
+        self.assertEqual(self.command(["oconv", "scene.rad"]).toBatchLine(), "oconv scene.rad\n")
+
+    def test_environment_adds_the_folders_to_path_and_raypath(self):
+        radFolder, dsFolder = self.getPath("radiance"), self.getPath("daysim")
+        env = self.command.getEnvironment([os.path.join(radFolder, "bin"), dsFolder], [os.path.join(radFolder, "lib")])
+        pathKey = [key for key in env.keys() if key.upper() == "PATH"][0]
+        self.assertEqual(env[pathKey].split(os.pathsep)[:2], [os.path.join(radFolder, "bin"), dsFolder])
+        self.assertEqual(env["RAYPATH"], os.pathsep.join([".", os.path.join(radFolder, "lib")]))
+        # the environment of the process doesn't change
+        self.assertNotEqual(os.environ.get("RAYPATH"), env["RAYPATH"])
+
+    def test_run_with_stdin_and_stdout_files_in_the_working_directory(self):
+        with open(self.getPath("study_0.pts"), "w") as outf: outf.write("1 2 3\n4 5 6\n")
+        env = self.command.getEnvironment([], ["lib"])
+        code = "import os, sys\n" + \
+               "for line in sys.stdin: sys.stdout.write(str(sum(map(float, line.split()))) + '\\n')\n" + \
+               "sys.stderr.write(os.environ['RAYPATH'])"
+        command = self.command([sys.executable, "-c", code], stdin = "study_0.pts", stdout = "study_0.res", \
+                               cwd = self.folder, env = env)
+        exitCode, stderr = command.run()
+        self.assertEqual((exitCode, stderr), (0, os.pathsep.join([".", "lib"])))
+        with open(self.getPath("study_0.res"), "r") as inf:
+            self.assertEqual(inf.read().split(), ["6.0", "15.0"])
+
+    def test_run_returns_the_exit_code_and_the_errors(self):
+        exitCode, stderr = self.command([sys.executable, "-c", "import sys; sys.stderr.write('bad scene'); sys.exit(2)"]).run()
+        self.assertEqual((exitCode, stderr), (2, "bad scene"))
+
+        # the program can't be started
+        exitCode, stderr = self.command([self.getPath("rtrace_is_not_here")]).run()
+        self.assertEqual(exitCode, -1)
+        self.assertNotEqual(stderr, "")
+
+
+if __name__ == "__main__":
+    unittest.main()
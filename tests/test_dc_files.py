@@ -0,0 +1,75 @@
+import os
+import unittest
+
+from hbtest import hb, TempFolderTestCase
+
+
+HEADING = "#DAYSIM\n#shading: static_system\n"
+
+
+class DcFileTestCase(TempFolderTestCase):
+
+    def setUp(self):
+        TempFolderTestCase.setUp(self)
+        self.dsResultAux = hb["DSResultAux"]()
+        self.numOfPtsInEachFile = [7, 6]
+        self.dcFiles = []
+        self.lines = []
+        for fileCount, numOfPts in enumerate(self.numOfPtsInEachFile):
+            lines = [" ".join([str(len(self.lines) + ptCount)] + [str(coef) for coef in range(ptCount, ptCount + 10)]) + "\n" \
+                     for ptCount in range(numOfPts)]
+            dcFile = self.getPath("study_" + str(fileCount) + ".dc")
+            with open(dcFile, "w") as outf:
+                outf.write(HEADING + "".join(lines))
+            self.dcFiles.append(dcFile)
+            self.lines.extend(lines)
+        # the first space is in the first file, the second one is split between the files
+        self.pattern = [4, 5, 4]
+        self.offsets = self.dsResultAux.getOffsets(self.pattern)
+
+    def readDcFile(self, dcFile):
+        source = hb["hb_DcFile"](dcFile)
+        try:
+            return source.heading, list(source.getLines())
+        finally:
+            source.close()
+
+    def test_compress_round_trip(self):
+        dczFile = self.dsResultAux.compressDcFile(self.dcFiles[0], ptsPerBlock = 3)
+        self.assertEqual(dczFile, self.dcFiles[0] + "z")
+        self.assertEqual(self.readDcFile(dczFile), (HEADING, self.lines[:7]))
+
+        source = hb["hb_DcFile"](dczFile)
+        try:
+            self.assertEqual(source.numOfPts, 7)
+            # a range that starts and ends in the middle of the blocks
+            self.assertEqual(list(source.getLines(2, 5)), self.lines[2:5])
+            self.assertEqual(list(source.getLines(6, 20)), self.lines[6:7])
+        finally:
+            source.close()
+
+    def test_storage_file_prefers_the_plain_dc_file(self):
+        self.dsResultAux.compressDcFile(self.dcFiles[0], removeSource = True)
+        self.assertEqual(self.dsResultAux.getDcStorageFile(self.dcFiles[0]), self.dcFiles[0] + "z")
+        self.assertEqual(self.dsResultAux.getDcStorageFile(self.dcFiles[1]), self.dcFiles[1])
+
+    def test_split_from_plain_and_compressed_files(self):
+        expected = [self.lines[self.offsets[spaceCount]:self.offsets[spaceCount + 1]] for spaceCount in range(3)]
+
+        plainTargets = [self.getPath("plain_space_" + str(spaceCount) + ".dc") for spaceCount in range(3)]
+        self.dsResultAux.splitDcFiles(self.dcFiles, self.pattern, plainTargets)
+
+        for dcFile in self.dcFiles: self.dsResultAux.compressDcFile(dcFile, ptsPerBlock = 2, removeSource = True)
+        compressedTargets = [self.getPath("dcz_space_" + str(spaceCount) + ".dc") for spaceCount in range(3)]
+        writtenFiles = self.dsResultAux.splitDcFiles(self.dcFiles, self.pattern, compressedTargets)
+        self.assertEqual(writtenFiles, compressedTargets)
+
+        for targetFiles in [plainTargets, compressedTargets]:
+            for spaceCount, targetFile in enumerate(targetFiles):
+                # the split files are plain .dc files that Daysim can read
+                with open(targetFile, "r") as inf:
+                    self.assertEqual(inf.read(), HEADING + "".join(expected[spaceCount]))
+
+
+if __name__ == "__main__":
+    unittest.main()
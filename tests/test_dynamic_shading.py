@@ -0,0 +1,90 @@
+import os
+import unittest
+
+from hbtest import hb, writeIllFile, randomRows, roundFloat, TempFolderTestCase
+
+
+def writeAnnualProfile(annualProfile, blindGroups):
+    """Write a Daysim annual profile with one blind column for each shading group."""
+    with open(annualProfile, "w") as outf:
+        outf.write("# Daysim annual profile\n# internal gains\n#\n")
+        outf.write("Month,Day,Hour," + ",".join(["blind_group_" + str(groupCount + 1) for groupCount in range(len(blindGroups))]) + \
+                   ",lighting\n")
+        for hour in range(len(blindGroups[0])):
+            outf.write("%d,%d,%.1f," % (1, 1 + hour // 24, hour % 24 + .5) + \
+                       ",".join([str(blindGroup[hour]) for blindGroup in blindGroups]) + ",0.0\n")
+    return annualProfile
+
+
+class BlendDynamicShadingTestCase(TempFolderTestCase):
+
+    def setUp(self):
+        TempFolderTestCase.setUp(self)
+        self.dsResultAux = hb["DSResultAux"]()
+        self.numOfHours = 24
+        self.pattern = [3, 2]
+        self.rowSets = [randomRows(self.numOfHours, 5, seed = setCount) for setCount in range(3)]
+        # no blinds, shading group I and shading group II
+        self.illFileSets = [[writeIllFile(self.getPath("set" + str(setCount) + "_0.ill"), rows)] \
+                            for setCount, rows in enumerate(self.rowSets)]
+        # both groups are closed at the same time in some of the hours
+        self.blindGroups = [[[int(hour % 4 == 1 or hour % 4 == 3) for hour in range(self.numOfHours)],
+                             [int(hour % 4 >= 2) for hour in range(self.numOfHours)]],
+                            [[0] * self.numOfHours,
+                             [int(hour % 2 == 0) for hour in range(self.numOfHours)]]]
+        self.annualProfiles = [writeAnnualProfile(self.getPath("space_" + str(spaceCount) + "_intgain.csv"), blindGroups) \
+                               for spaceCount, blindGroups in enumerate(self.blindGroups)]
+        os.mkdir(self.getPath("occupancyBased"))
+        self.targetIllFile = self.getPath(os.path.join("occupancyBased", "blended.ill"))
+
+    def getGroupInEffect(self, spaceCount, hour):
+        for groupCount, blindGroup in enumerate(self.blindGroups[spaceCount]):
+            if blindGroup[hour] == 1: return groupCount + 1
+        return 0
+
+    def test_read_blind_profiles(self):
+        self.assertEqual(self.dsResultAux.readBlindProfiles(self.annualProfiles[0]), \
+                         [map(float, blindGroup) for blindGroup in self.blindGroups[0]])
+
+    def test_first_closed_group_wins(self):
+        self.dsResultAux.blendDynamicShading(self.illFileSets, self.pattern, self.annualProfiles, self.targetIllFile)
+        offsets = self.dsResultAux.getOffsets(self.pattern)
+
+        illMatrix = self.dsResultAux.loadIllMatrix(self.targetIllFile)
+        self.assertNotEqual(illMatrix, None)
+        try:
+            for hour in range(self.numOfHours):
+                expected = []
+                for spaceCount in range(len(self.pattern)):
+                    rows = self.rowSets[self.getGroupInEffect(spaceCount, hour)]
+                    expected.extend(map(roundFloat, rows[hour][offsets[spaceCount]:offsets[spaceCount + 1]]))
+                self.assertEqual(list(illMatrix.getHour(hour)), expected)
+        finally:
+            illMatrix.close()
+
+        # the text file has the same values
+        textValues = self.dsResultAux.readIllHours(self.targetIllFile, [5])[0]
+        self.assertEqual(len(textValues), sum(self.pattern))
+
+    def test_blend_is_reused_until_the_inputs_change(self):
+        self.dsResultAux.blendDynamicShading(self.illFileSets, self.pattern, self.annualProfiles, self.targetIllFile)
+        mtime = os.path.getmtime(self.targetIllFile)
+        os.utime(self.targetIllFile, (mtime - 100, mtime - 100))
+        # the cache of the blended file is stale now so it is written again
+        self.dsResultAux.blendDynamicShading(self.illFileSets, self.pattern, self.annualProfiles, self.targetIllFile)
+        self.assertNotEqual(os.path.getmtime(self.targetIllFile), mtime - 100)
+
+        mtime = os.path.getmtime(self.targetIllFile)
+        self.dsResultAux.blendDynamicShading(self.illFileSets, self.pattern, self.annualProfiles, self.targetIllFile)
+        self.assertEqual(os.path.getmtime(self.targetIllFile), mtime)
+
+    def test_manifest_is_next_to_the_blended_file(self):
+        # only the extension of the file is replaced
+        os.mkdir(self.getPath("results.ill"))
+        targetIllFile = self.getPath(os.path.join("results.ill", "blended.illuminance.ill"))
+        self.dsResultAux.blendDynamicShading(self.illFileSets, self.pattern, self.annualProfiles, targetIllFile)
+        self.assertTrue(os.path.isfile(self.getPath(os.path.join("results.ill", "blended.illuminance_manifest.json"))))
+
+
+if __name__ == "__main__":
+    unittest.main()
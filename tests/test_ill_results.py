@@ -0,0 +1,137 @@
+import os
+import time
+import unittest
+
+from hbtest import hb, writeIllFile, randomRows, roundFloat, TempFolderTestCase
+
+
+class IllCacheTestCase(TempFolderTestCase):
+
+    def setUp(self):
+        TempFolderTestCase.setUp(self)
+        self.dsResultAux = hb["DSResultAux"]()
+        self.rows = randomRows(48, 7)
+        self.illFile = writeIllFile(self.getPath("study_0.ill"), self.rows)
+
+    def test_binary_cache_round_trip(self):
+        illMatrix = self.dsResultAux.loadIllMatrix(self.illFile, convert = True)
+        try:
+            self.assertEqual(illMatrix.numOfHours, 48)
+            self.assertEqual(illMatrix.numOfPts, 7)
+            for hour in [0, 11, 47]:
+                self.assertEqual(list(illMatrix.getHour(hour)), map(roundFloat, self.rows[hour]))
+            self.assertEqual(list(illMatrix.getHour(5, 2, 4)), map(roundFloat, self.rows[5][2:4]))
+            self.assertEqual(illMatrix.getColumn(3), [roundFloat(row[3]) for row in self.rows])
+            self.assertEqual(illMatrix.getColumns([6, 2, 6]), \
+                             [[roundFloat(row[ptIndex]) for row in self.rows] for ptIndex in [6, 2, 6]])
+            self.assertEqual(illMatrix.getColumns([]), [])
+        finally:
+            illMatrix.close()
+
+    def test_cache_is_reused_until_the_ill_file_changes(self):
+        self.dsResultAux.loadIllMatrix(self.illFile, convert = True).close()
+        self.assertTrue(self.dsResultAux.isIllCacheValid(self.illFile))
+
+        rows = randomRows(48, 7, seed = 1)
+        writeIllFile(self.illFile, rows)
+        os.utime(self.illFile, (time.time() + 10, time.time() + 10))
+        self.assertFalse(self.dsResultAux.isIllCacheValid(self.illFile))
+        self.assertEqual(self.dsResultAux.loadIllMatrix(self.illFile), None)
+
+        illMatrix = self.dsResultAux.loadIllMatrix(self.illFile, convert = True)
+        self.assertEqual(list(illMatrix.getHour(0)), map(roundFloat, rows[0]))
+        illMatrix.close()
+
+    def test_read_hours_with_and_without_the_cache(self):
+        hours = [47, 0, 20, 20]
+        # without the binary cache the hours are read from the text file with the hour index
+        textValues = self.dsResultAux.readIllHours(self.illFile, hours)
+        self.assertTrue(os.path.isfile(self.dsResultAux.getIllHourIndexFileName(self.illFile)))
+        self.assertEqual(textValues, [self.rows[hour] for hour in hours])
+
+        self.dsResultAux.loadIllMatrix(self.illFile, convert = True).close()
+        binaryValues = self.dsResultAux.readIllHours(self.illFile, hours)
+        self.assertEqual(binaryValues, [map(roundFloat, self.rows[hour]) for hour in hours])
+
+
+class IllResultSetTestCase(TempFolderTestCase):
+
+    def setUp(self):
+        TempFolderTestCase.setUp(self)
+        self.dsResultAux = hb["DSResultAux"]()
+        # 11 chunks so _10.ill has to be sorted after _9.ill
+        self.numOfPtsInEachChunk = [3, 1, 4, 1, 5, 2, 6, 2, 3, 1, 2]
+        self.rows = randomRows(24, sum(self.numOfPtsInEachChunk))
+        self.illFiles = []
+        st = 0
+        for chunkCount, numOfPts in enumerate(self.numOfPtsInEachChunk):
+            chunkRows = [row[st:st + numOfPts] for row in self.rows]
+            self.illFiles.append(writeIllFile(self.getPath("study_" + str(chunkCount) + ".ill"), chunkRows))
+            st += numOfPts
+        self.pattern = [5, 10, 15]
+
+    def getSpaceRows(self, spaceCount):
+        offsets = self.dsResultAux.getOffsets(self.pattern)
+        return [row[offsets[spaceCount]:offsets[spaceCount + 1]] for row in self.rows]
+
+    def test_sort_ill_files_by_cpu_number(self):
+        shuffled = sorted(self.illFiles)
+        self.assertNotEqual(shuffled, self.illFiles)
+        self.assertEqual(self.dsResultAux.sortIllFiles(shuffled), self.illFiles)
+
+    def test_result_set_stitches_the_chunks_in_point_order(self):
+        with open(self.getPath("study.ptn"), "w") as ptnFile:
+            ptnFile.write(",".join(map(str, self.pattern)))
+
+        illMatrixSet = self.dsResultAux.loadIllResultSet(sorted(self.illFiles))
+        try:
+            self.assertEqual(illMatrixSet.pattern, self.pattern)
+            for hour in [0, 13, 23]:
+                self.assertEqual(list(illMatrixSet.getHour(hour)), map(roundFloat, self.rows[hour]))
+
+            for spaceCount, spaceView in enumerate(illMatrixSet.getSpaceViews()):
+                spaceRows = self.getSpaceRows(spaceCount)
+                self.assertEqual(spaceView.numOfPts, self.pattern[spaceCount])
+                self.assertEqual(list(spaceView.getHour(7)), map(roundFloat, spaceRows[7]))
+                self.assertEqual(spaceView.getColumn(spaceView.numOfPts - 1), \
+                                 [roundFloat(row[-1]) for row in spaceRows])
+        finally:
+            illMatrixSet.close()
+
+    def test_result_set_reads_hours_and_points_across_the_chunks(self):
+        # the same look ups as Read Hourly Results and Read DS Result for a point
+        illMatrixSet = self.dsResultAux.loadIllResultSet(self.illFiles)
+        try:
+            self.assertEqual(illMatrixSet.pattern, None)
+            hours = [23, 0, 12]
+            self.assertEqual(map(list, illMatrixSet.getHours(hours)), \
+                             [map(roundFloat, self.rows[hour]) for hour in hours])
+            ptIndices = [29, 0, 3, 14]
+            self.assertEqual(illMatrixSet.getColumns(ptIndices), \
+                             [[roundFloat(row[ptIndex]) for row in self.rows] for ptIndex in ptIndices])
+        finally:
+            illMatrixSet.close()
+
+    def test_result_set_checks_the_pattern(self):
+        with open(self.getPath("study.ptn"), "w") as ptnFile:
+            ptnFile.write("5,10")
+        self.assertRaises(Exception, self.dsResultAux.loadIllResultSet, self.illFiles)
+
+    def test_split_ill_files_round_trip(self):
+        targetFiles = [self.getPath("study_space_" + str(spaceCount) + ".ill") for spaceCount in range(3)]
+        self.dsResultAux.splitIllFiles(self.illFiles, self.pattern, targetFiles)
+
+        merged = [[] for row in self.rows]
+        for spaceCount, targetFile in enumerate(targetFiles):
+            with open(targetFile, "r") as inf:
+                lines = inf.readlines()
+            self.assertEqual(len(lines), len(self.rows))
+            for hour, line in enumerate(lines):
+                values = map(float, line.split()[3:])
+                self.assertEqual(len(values), self.pattern[spaceCount])
+                merged[hour].extend(values)
+        self.assertEqual(merged, self.rows)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+from hbtest import hb, writeIllFile, randomRows, roundFloat, TempFolderTestCase
+
+
+class IlluminanceBinsTestCase(TempFolderTestCase):
+
+    def setUp(self):
+        TempFolderTestCase.setUp(self)
+        self.dsResultAux = hb["DSResultAux"]()
+        self.numOfHours = 48
+        self.rows = randomRows(self.numOfHours, 9, seed = 5)
+        # values on the thresholds go to the lower bin
+        self.rows[0][:3] = [100.0, 500.0, 2000.0]
+        self.illFiles = [writeIllFile(self.getPath("study_0.ill"), [row[:4] for row in self.rows]),
+                         writeIllFile(self.getPath("study_1.ill"), [row[4:] for row in self.rows])]
+        self.hourMask = [hour % 24 >= 6 and hour % 24 < 20 for hour in range(self.numOfHours)]
+        self.hourMask[0] = True
+
+    def getExpectedBins(self, thresholds):
+        bins = [[0] * len(self.rows[0]) for binCount in range(len(thresholds) + 1)]
+        for hour, row in enumerate(self.rows):
+            if not self.hourMask[hour]: continue
+            for ptCount, value in enumerate(row):
+                binCount = len([threshold for threshold in thresholds if roundFloat(value) > threshold])
+                bins[binCount][ptCount] += 1
+        return bins
+
+    def test_bins_match_a_point_by_point_count(self):
+        for parallel in [True, False]:
+            bins = self.dsResultAux.calculateIlluminanceBins(self.illFiles, self.hourMask, [2000, 100, 500], parallel)
+            self.assertEqual(bins, self.getExpectedBins([100, 500, 2000]))
+
+    def test_every_masked_hour_is_counted_once(self):
+        bins = self.dsResultAux.calculateIlluminanceBins(self.illFiles, self.hourMask, [300])
+        numOfHours = sum(self.hourMask)
+        for ptCount in range(len(self.rows[0])):
+            self.assertEqual(sum([counts[ptCount] for counts in bins]), numOfHours)
+
+    def test_hours_after_the_end_of_the_results_are_ignored(self):
+        hourMask = self.hourMask + [True] * 24
+        bins = self.dsResultAux.calculateIlluminanceBins(self.illFiles, hourMask, [100, 500, 2000])
+        self.assertEqual(bins, self.getExpectedBins([100, 500, 2000]))
+
+
+if __name__ == "__main__":
+    unittest.main()
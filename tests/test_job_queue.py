@@ -0,0 +1,48 @@
+import os
+import sys
+import unittest
+
+from hbtest import hb, TempFolderTestCase
+
+
+class JobQueueTestCase(TempFolderTestCase):
+
+    def getCommand(self, code, *args):
+        return hb["hb_Command"]([sys.executable, "-c", code] + list(args))
+
+    def test_jobs_run_in_the_order_of_the_queue(self):
+        outputFiles = [self.getPath("chunk_" + str(chunkCount) + ".txt") for chunkCount in range(6)]
+        jobs = [(self.getCommand("import sys; open(sys.argv[1], 'w').write(sys.argv[2])", outputFile, str(chunkCount)), \
+                 [outputFile]) for chunkCount, outputFile in enumerate(outputFiles)]
+        jobQueue = hb["hb_JobQueue"](3)
+        self.assertEqual(jobQueue.run(jobs), [True] * 6)
+        for chunkCount, outputFile in enumerate(outputFiles):
+            with open(outputFile, "r") as inf: self.assertEqual(inf.read(), str(chunkCount))
+        self.assertEqual([jobResult["attempts"] for jobResult in jobQueue.jobResults], [1] * 6)
+
+    def test_failed_job_is_retried(self):
+        # the job fails the first time and creates its output file the second time
+        markerFile = self.getPath("marker.txt")
+        outputFile = self.getPath("chunk.txt")
+        code = "import os, sys\n" + \
+               "if os.path.isfile(sys.argv[1]): open(sys.argv[2], 'w').write('x')\n" + \
+               "else: open(sys.argv[1], 'w').write('x'); sys.stderr.write('first attempt'); sys.exit(1)"
+        jobQueue = hb["hb_JobQueue"](2, retries = 1)
+        self.assertEqual(jobQueue.run([(self.getCommand(code, markerFile, outputFile), [outputFile])]), [True])
+        self.assertEqual(jobQueue.jobResults[0]["attempts"], 2)
+
+        # a job without its output files fails after all the retries
+        os.remove(outputFile)
+        jobQueue = hb["hb_JobQueue"](2, retries = 2)
+        self.assertEqual(jobQueue.run([(self.getCommand("pass"), [outputFile])]), [False])
+        self.assertEqual((jobQueue.jobResults[0]["exitCode"], jobQueue.jobResults[0]["attempts"]), (0, 3))
+
+    def test_error_output_is_kept(self):
+        jobQueue = hb["hb_JobQueue"](1, retries = 0)
+        jobQueue.run([(self.getCommand("import sys; sys.stderr.write('no scene'); sys.exit(2)"), [])])
+        self.assertEqual(jobQueue.jobResults[0]["exitCode"], 2)
+        self.assertEqual(jobQueue.jobResults[0]["stderr"].strip(), "no scene")
+
+
+if __name__ == "__main__":
+    unittest.main()
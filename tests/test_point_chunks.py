@@ -0,0 +1,91 @@
+import io
+import os
+import sys
+import unittest
+
+from hbtest import hb, roundFloat, TempFolderTestCase
+from test_pts_files import getTestPoints, getFlatValues
+
+
+class PointChunksTestCase(TempFolderTestCase):
+
+    def setUp(self):
+        TempFolderTestCase.setUp(self)
+        self.ptsFileAux = hb["PtsFileAux"]()
+        self.numOfPoints = 17
+        self.testPoints, self.ptsNormals = getTestPoints(self.numOfPoints)
+
+    def writeChunks(self, partitions, writeIndex = True, studyName = "study"):
+        ptsFiles = []
+        for cpuCount, ptIndices in enumerate(partitions):
+            ptsFile = self.getPath(studyName + "_" + str(cpuCount) + ".pts")
+            self.ptsFileAux.writePtsFile(ptsFile, [self.testPoints[ptCount] for ptCount in ptIndices],
+                                         [self.ptsNormals[ptCount] for ptCount in ptIndices])
+            if writeIndex: self.ptsFileAux.writeIndexFile(self.ptsFileAux.getIndexFileName(ptsFile), ptIndices)
+            ptsFiles.append(ptsFile)
+        return ptsFiles
+
+    def captureOutput(self, function, *args):
+        stdout = sys.stdout
+        sys.stdout = io.BytesIO()
+        try:
+            return function(*args), sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+    def test_partitions_cover_every_point_once(self):
+        for interleaved in [False, True]:
+            for numOfCPUs in [1, 3, 4]:
+                partitions = self.ptsFileAux.getPartitions(self.numOfPoints, numOfCPUs, interleaved)
+                self.assertEqual(len(partitions), numOfCPUs)
+                self.assertEqual(sorted(sum(partitions, [])), range(self.numOfPoints))
+
+        # the last CPU gets the remainder of the contiguous blocks
+        self.assertEqual(map(len, self.ptsFileAux.getPartitions(self.numOfPoints, 4)), [4, 4, 4, 5])
+        self.assertEqual(self.ptsFileAux.getPartitions(self.numOfPoints, 4, True)[1], [1, 5, 9, 13])
+
+    def test_index_file_round_trip(self):
+        indexFile = self.ptsFileAux.getIndexFileName(self.getPath("study_2.res"))
+        self.assertEqual(indexFile, self.getPath("study_2.idx"))
+        self.ptsFileAux.writeIndexFile(indexFile, [2, 6, 10])
+        self.assertEqual(list(self.ptsFileAux.readIndexFile(indexFile)), [2, 6, 10])
+
+    def test_merge_interleaved_chunks(self):
+        partitions = self.ptsFileAux.getPartitions(self.numOfPoints, 4, interleaved = True)
+        ptsFiles = self.writeChunks(partitions)
+        chunkValues = [["pt" + str(ptCount) for ptCount in ptIndices] for ptIndices in partitions]
+        self.assertEqual(self.ptsFileAux.mergeChunks(ptsFiles, chunkValues),
+                         ["pt" + str(ptCount) for ptCount in range(self.numOfPoints)])
+
+        # without all the chunks the values are kept in the order of the files
+        values, output = self.captureOutput(self.ptsFileAux.mergeChunks, ptsFiles[:2], chunkValues[:2])
+        self.assertEqual(values, chunkValues[0] + chunkValues[1])
+        self.assertTrue("The index files don't match the values of the 2 chunks" in output)
+
+    def test_merge_warns_about_a_missing_index_file(self):
+        partitions = self.ptsFileAux.getPartitions(self.numOfPoints, 3, interleaved = True)
+        ptsFiles = self.writeChunks(partitions)
+        chunkValues = [["pt" + str(ptCount) for ptCount in ptIndices] for ptIndices in partitions]
+        os.remove(self.ptsFileAux.getIndexFileName(ptsFiles[1]))
+        values, output = self.captureOutput(self.ptsFileAux.mergeChunks, ptsFiles, chunkValues)
+        self.assertEqual(values, sum(chunkValues, []))
+        self.assertTrue("study_1.idx is missing" in output)
+
+        # contiguous blocks have no index files and no warning
+        blockFiles = self.writeChunks(self.ptsFileAux.getPartitions(self.numOfPoints, 3), False, "blocks")
+        values, output = self.captureOutput(self.ptsFileAux.mergeChunks, blockFiles, chunkValues)
+        self.assertEqual(output, "")
+
+    def test_load_pts_files_in_the_order_of_the_points(self):
+        expected = map(roundFloat, getFlatValues(self.testPoints, self.ptsNormals))
+
+        interleavedFiles = self.writeChunks(self.ptsFileAux.getPartitions(self.numOfPoints, 3, interleaved = True))
+        self.assertEqual(map(roundFloat, self.ptsFileAux.loadPtsFiles(interleavedFiles)), expected)
+
+        # contiguous blocks don't need the index files
+        blockFiles = self.writeChunks(self.ptsFileAux.getPartitions(self.numOfPoints, 3), False, "blocks")
+        self.assertEqual(map(roundFloat, self.ptsFileAux.loadPtsFiles(blockFiles)), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
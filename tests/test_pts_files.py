@@ -0,0 +1,70 @@
+import os
+import unittest
+from collections import namedtuple
+
+from hbtest import hb, roundFloat, TempFolderTestCase
+
+
+Point = namedtuple("Point", "X Y Z")
+
+
+def getTestPoints(numOfPoints):
+    testPoints = [Point(ptCount * .5, ptCount % 3 - 1.25, 0.75) for ptCount in range(numOfPoints)]
+    ptsNormals = [Point(0, 0, 1) if ptCount % 2 == 0 else Point(0, -1, 0) for ptCount in range(numOfPoints)]
+    return testPoints, ptsNormals
+
+
+def getFlatValues(testPoints, ptsNormals):
+    values = []
+    for testPoint, ptNormal in zip(testPoints, ptsNormals):
+        values.extend(list(testPoint) + list(ptNormal))
+    return values
+
+
+class PtsFileTestCase(TempFolderTestCase):
+
+    def setUp(self):
+        TempFolderTestCase.setUp(self)
+        self.ptsFileAux = hb["PtsFileAux"]()
+        self.testPoints, self.ptsNormals = getTestPoints(11)
+        self.values = getFlatValues(self.testPoints, self.ptsNormals)
+
+    def test_text_round_trip(self):
+        ptsFile = self.ptsFileAux.writePtsFile(self.getPath("study_0.pts"), self.testPoints, self.ptsNormals)
+        with open(ptsFile, "r") as inf:
+            lines = inf.read().splitlines()
+        self.assertEqual(len(lines), 11)
+        self.assertEqual(lines[1], "0.5000\t-0.2500\t0.7500\t0.0000\t-1.0000\t0.0000")
+        self.assertEqual(self.ptsFileAux.readPtsFile(ptsFile), self.values)
+
+    def test_binary_round_trip(self):
+        ptsFile = self.ptsFileAux.writePtsFile(self.getPath("study_0.ptsb"), self.testPoints, self.ptsNormals, binary = True)
+        # six float32 values for each point that rtrace can read with -if
+        self.assertEqual(os.path.getsize(ptsFile), 11 * 6 * 4)
+        self.assertEqual(self.ptsFileAux.readPtsFile(ptsFile), map(roundFloat, self.values))
+
+    def test_invalid_lines_are_skipped(self):
+        ptsFile = self.ptsFileAux.writePtsFile(self.getPath("study_0.pts"), self.testPoints[:2], self.ptsNormals[:2])
+        with open(ptsFile, "a") as outf:
+            outf.write("\n1 2 3\n")
+        self.assertEqual(self.ptsFileAux.readPtsFile(ptsFile), self.values[:12])
+
+    def test_pattern_file_of_a_study(self):
+        with open(self.getPath("study.ptn"), "w") as ptnFile:
+            ptnFile.write("4,0,7,")
+        ptnFile = self.ptsFileAux.findPatternFile(self.getPath("study_3.pts"))
+        self.assertEqual(ptnFile, self.getPath("study.ptn"))
+        # a renamed file still finds the only pattern file of the folder
+        self.assertEqual(self.ptsFileAux.findPatternFile(self.getPath("renamed.ill")), ptnFile)
+
+        pattern = self.ptsFileAux.readPatternFile(ptnFile)
+        self.assertEqual(pattern, [4, 0, 7])
+        self.assertEqual(self.ptsFileAux.getBranchOffsets(pattern), [0, 4, 4, 11])
+
+        with open(self.getPath("other.ptn"), "w") as ptnFile:
+            ptnFile.write("11")
+        self.assertEqual(self.ptsFileAux.findPatternFile(self.getPath("renamed.ill")), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import array
+import unittest
+
+from hbtest import hb, roundFloat, TempFolderTestCase
+
+
+def writeResultFile(resultFile, rgbValues, binary):
+    if binary:
+        with open(resultFile, "wb") as outf:
+            outf.write("#?RADIANCE\nrtrace -I -h -ff -ab 2\nFORMAT=float\n\n")
+            array.array("f", rgbValues).tofile(outf)
+    else:
+        with open(resultFile, "w") as outf:
+            for ptCount in range(len(rgbValues) // 3):
+                outf.write("%.6e\t%.6e\t%.6e\t\n" % tuple(rgbValues[3 * ptCount:3 * ptCount + 3]))
+    return resultFile
+
+
+class RADResultTestCase(TempFolderTestCase):
+
+    def setUp(self):
+        TempFolderTestCase.setUp(self)
+        self.radResultAux = hb["RADResultAux"]()
+        self.ptsFileAux = hb["PtsFileAux"]()
+        self.rgbValues = [roundFloat(value) for value in \
+                          [1.5, 2.5, 0.5, 10.0, 10.0, 10.0, 0.0, 0.0, 0.0, 0.25, 0.75, 4.0, 100.0, 50.0, 2.0]]
+
+    def getIlluminance(self, factor = 179):
+        rgb = self.rgbValues
+        return [factor * (.265 * rgb[i] + .67 * rgb[i + 1] + .065 * rgb[i + 2]) for i in range(0, len(rgb), 3)]
+
+    def test_binary_and_ascii_results_are_the_same(self):
+        binaryFile = writeResultFile(self.getPath("binary_0.res"), self.rgbValues, True)
+        asciiFile = writeResultFile(self.getPath("ascii_0.res"), self.rgbValues, False)
+        self.assertEqual(self.radResultAux.readResultHeader(binaryFile)[0], "float")
+        self.assertEqual(self.radResultAux.readResultHeader(asciiFile), ("ascii", 0))
+
+        for resultFile in [binaryFile, asciiFile]:
+            self.assertEqual(list(self.radResultAux.readRGBValues(resultFile)), self.rgbValues)
+            for value, expected in zip(self.radResultAux.readResultFiles([resultFile], 0), self.getIlluminance()):
+                self.assertAlmostEqual(value, expected, places = 3)
+            self.assertEqual(self.radResultAux.readResultFiles([resultFile], 1), self.rgbValues[0::3])
+            # daylight factor is capped to 100
+            self.assertEqual(max(self.radResultAux.readResultFiles([resultFile], 3)), 100)
+
+    def test_chunked_results_are_merged_in_the_order_of_the_points(self):
+        partitions = self.ptsFileAux.getPartitions(5, 2, interleaved = True)
+        resultFiles = []
+        for cpuCount, ptIndices in enumerate(partitions):
+            rgbValues = []
+            for ptCount in ptIndices: rgbValues.extend(self.rgbValues[3 * ptCount:3 * ptCount + 3])
+            resultFile = writeResultFile(self.getPath("study_" + str(cpuCount) + ".res"), rgbValues, cpuCount == 0)
+            self.ptsFileAux.writeIndexFile(self.ptsFileAux.getIndexFileName(resultFile), ptIndices)
+            resultFiles.append(resultFile)
+
+        for parallel in [True, False]:
+            results = self.radResultAux.readResultFiles(resultFiles, 0, parallel)
+            self.assertEqual(len(results), 5)
+            for value, expected in zip(results, self.getIlluminance()):
+                self.assertAlmostEqual(value, expected, places = 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
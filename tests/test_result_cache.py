@@ -0,0 +1,70 @@
+import os
+import unittest
+
+from hbtest import hb, roundFloat, TempFolderTestCase
+
+
+class ResultCacheTestCase(TempFolderTestCase):
+
+    def setUp(self):
+        TempFolderTestCase.setUp(self)
+        self.cacheFolder = self.getPath("resultCache")
+        self.sceneFiles = [self.writeSceneFile("material.rad", "void plastic wall"), \
+                           self.writeSceneFile("sky.rad", "void light sky")]
+        self.values = {"_ab_": 2, "simulationType": 0}
+        self.rays = ["%d.0000\t0.0000\t0.7500\t0.0000\t0.0000\t1.0000\n" % rayCount for rayCount in range(5)]
+        self.rgbValues = map(roundFloat, [rayCount + channel / 4.0 for rayCount in range(5) for channel in range(3)])
+
+    def writeSceneFile(self, fileName, content):
+        with open(self.getPath(fileName), "w") as outf: outf.write(content)
+        return self.getPath(fileName)
+
+    def getCache(self, values = None, maxScenes = 10):
+        if values == None: values = self.values
+        return hb["hb_ResultCache"](self.cacheFolder, self.sceneFiles, values, maxScenes)
+
+    def test_scene_key_depends_on_the_files_and_the_values(self):
+        sceneKey = self.getCache().sceneKey
+        self.assertEqual(self.getCache().sceneKey, sceneKey)
+        # the order of the keys of the values doesn't matter
+        self.assertEqual(self.getCache({"simulationType": 0, "_ab_": 2}).sceneKey, sceneKey)
+        self.assertNotEqual(self.getCache({"_ab_": 3, "simulationType": 0}).sceneKey, sceneKey)
+
+        self.writeSceneFile("sky.rad", "void light sky 0 0 3 1000 1000 1000")
+        self.assertNotEqual(self.getCache().sceneKey, sceneKey)
+
+    def test_only_the_missing_points_are_traced(self):
+        resultCache = self.getCache()
+        self.assertEqual(resultCache.getMissingIndices(self.rays), range(5))
+        self.assertTrue(resultCache.update(self.rays[1:3], self.rgbValues[3:9]))
+        # the results must match the points
+        self.assertFalse(resultCache.update(self.rays[3:], self.rgbValues[:3]))
+
+        resultCache = self.getCache()
+        self.assertEqual(resultCache.getMissingIndices(self.rays), [0, 3, 4])
+        resultCache.update([self.rays[ptCount] for ptCount in [0, 3, 4]], self.rgbValues[:3] + self.rgbValues[9:])
+        self.assertEqual(self.getCache().getMissingIndices(self.rays), [])
+
+        resultFile = resultCache.writeResultFile(self.getPath("study.res"), self.rays)
+        self.assertEqual(list(hb["RADResultAux"]().readRGBValues(resultFile)), self.rgbValues)
+
+    def test_unfinished_update_starts_the_scene_from_scratch(self):
+        resultCache = self.getCache()
+        resultCache.update(self.rays, self.rgbValues)
+        with open(resultCache.valuesFile, "rb") as inf: values = inf.read()
+        with open(resultCache.valuesFile, "wb") as outf: outf.write(values[:-4])
+        self.assertEqual(self.getCache().getMissingIndices(self.rays), range(5))
+
+    def test_only_the_last_scenes_are_kept(self):
+        for sceneCount in range(3):
+            resultCache = self.getCache({"scene": sceneCount}, maxScenes = 2)
+            resultCache.update(self.rays, self.rgbValues)
+            os.utime(resultCache.raysFile, (1000 + sceneCount, 1000 + sceneCount))
+        self.getCache({"scene": 3}, maxScenes = 2)
+        self.assertEqual(sorted(os.listdir(self.cacheFolder)), \
+                         sorted([self.getCache({"scene": sceneCount}).sceneKey + extension \
+                                 for sceneCount in [1, 2] for extension in [".rays", ".rgb"]]))
+
+
+if __name__ == "__main__":
+    unittest.main()
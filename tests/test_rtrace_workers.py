@@ -0,0 +1,78 @@
+import os
+import sys
+import unittest
+
+from hbtest import hb, TempFolderTestCase
+
+
+# stands in for rtrace: writes the ambient file of the worker and answers each ray with its
+# x value. a ray with a zero direction flushes the output the same as rtrace
+FAKE_RTRACE = "\n".join([
+    "import sys",
+    "args = sys.argv[1:]",
+    "if '-af' in args: open(args[args.index('-af') + 1], 'a').close()",
+    "while True:",
+    "    line = sys.stdin.readline()",
+    "    if line == '': break",
+    "    sys.stdout.write(line.split()[0] + '\\n')",
+    "    sys.stdout.flush()"])
+
+
+class Sticky(object):
+    sticky = {}
+
+
+class RtraceWorkersTestCase(TempFolderTestCase):
+
+    def setUp(self):
+        TempFolderTestCase.setUp(self)
+        self.sc = hb["sc"]
+        hb["sc"] = Sticky()
+        self.rtraceWorkers = hb["hb_RtraceWorkers"]
+        self.octFile = self.getPath("scene.oct")
+        self.writeOctree("scene")
+        self.argv = [sys.executable, "-u", "-c", FAKE_RTRACE, "scene.oct"]
+
+    def tearDown(self):
+        self.rtraceWorkers.closeAll()
+        hb["sc"] = self.sc
+        TempFolderTestCase.tearDown(self)
+
+    def writeOctree(self, content):
+        with open(self.octFile, "w") as outf: outf.write(content)
+
+    def test_rays_are_traced_in_order(self):
+        workers = self.rtraceWorkers.getWorkers(self.argv, 3, self.folder)
+        rays = ["%d 0 0 0 0 1\n" % rayCount for rayCount in range(10)]
+        self.assertEqual(workers.trace(rays), ["%d\n" % rayCount for rayCount in range(10)])
+
+    def test_workers_are_reused_until_the_octree_changes(self):
+        workers = self.rtraceWorkers.getWorkers(self.argv, 2, self.folder)
+        self.assertTrue(self.rtraceWorkers.getWorkers(self.argv, 2, self.folder) is workers)
+
+        self.writeOctree("new scene")
+        newWorkers = self.rtraceWorkers.getWorkers(self.argv, 2, self.folder)
+        self.assertFalse(newWorkers is workers)
+        self.assertFalse(workers.isAlive())
+        self.assertEqual(len(Sticky.sticky[self.rtraceWorkers.registryKey]), 1)
+
+    def test_each_worker_gets_its_ambient_file(self):
+        ambFiles = [self.getPath("scene_" + str(workerCount) + ".amb") for workerCount in range(2)]
+        self.assertEqual(self.rtraceWorkers.getWorkerArgv(self.argv, 1, ambFiles), \
+                         self.argv[:-1] + ["-af", ambFiles[1], "scene.oct"])
+        workers = self.rtraceWorkers.getWorkers(self.argv, 2, self.folder, ambFiles = ambFiles)
+        workers.trace(["1 0 0 0 0 1\n", "2 0 0 0 0 1\n"])
+        self.assertTrue(all(map(os.path.isfile, ambFiles)))
+
+        # the workers without the ambient files are a different set of workers
+        self.assertFalse(self.rtraceWorkers.getWorkers(self.argv, 2, self.folder) is workers)
+
+    def test_close_all_stops_the_workers_of_the_registry(self):
+        workers = self.rtraceWorkers.getWorkers(self.argv, 2, self.folder)
+        self.rtraceWorkers.closeAll()
+        self.assertFalse(workers.isAlive())
+        self.assertFalse(Sticky.sticky.has_key(self.rtraceWorkers.registryKey))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import json
+import unittest
+
+from hbtest import hb, TempFolderTestCase
+
+
+class RunLogTestCase(TempFolderTestCase):
+
+    def setUp(self):
+        TempFolderTestCase.setUp(self)
+        self.logFile = self.getPath("runLog.json")
+        self.resultFile = self.getPath("study_0.res")
+        with open(self.resultFile, "w") as outf: outf.write("x" * 10)
+
+    def readLog(self):
+        with open(self.logFile, "r") as inf: return json.load(inf)
+
+    def test_stage_has_the_throughput_and_the_file_sizes(self):
+        runLog = hb["hb_RunLog"](self.logFile)
+        stage = runLog.addStage("rtrace_0", 2.0, 100, [self.resultFile, self.getPath("missing.res")], exitCode = 0)
+        self.assertEqual(stage, {"name": "rtrace_0", "duration": 2.0, "numOfPoints": 100, "pointsPerSecond": 50.0,
+                                 "fileSizes": {self.resultFile: 10}, "exitCode": 0})
+
+        # a stage without any points or time doesn't divide by zero
+        self.assertEqual(runLog.addStage("oconv", 0), {"name": "oconv", "duration": 0})
+
+        runLog.startStage("merge")
+        stage = runLog.endStage("merge", 10)
+        self.assertTrue(stage["duration"] >= 0)
+        self.assertRaises(KeyError, runLog.endStage, "merge")
+
+    def test_job_results_and_the_slowest_stage(self):
+        jobResults = [{"name": "rtrace_0", "duration": 1.5, "exitCode": 0, "attempts": 1, "success": True},
+                      None,
+                      {"name": "rtrace_2", "duration": 4.0, "exitCode": 1, "attempts": 2, "success": False},
+                      {"duration": 9.0, "exitCode": 0, "attempts": 1, "success": True}]
+        runLog = hb["hb_RunLog"](self.logFile)
+        runLog.addJobResults(jobResults, {"rtrace_0": 30, "rtrace_2": 20}, {"rtrace_0": [self.resultFile]})
+
+        stages = runLog.log["stages"]
+        self.assertEqual([stage["name"] for stage in stages], ["rtrace_0", "rtrace_2", "3"])
+        self.assertEqual((stages[0]["pointsPerSecond"], stages[0]["fileSizes"]), (20.0, {self.resultFile: 10}))
+        self.assertEqual((stages[1]["exitCode"], stages[1]["attempts"], stages[1]["success"]), (1, 2, False))
+        self.assertEqual(runLog.getSlowestStage("rtrace_")["name"], "rtrace_2")
+        self.assertEqual(runLog.getSlowestStage()["name"], "3")
+        self.assertEqual(runLog.getSlowestStage("gen_dc"), None)
+
+    def test_input_key_changes_with_the_files_and_the_values(self):
+        runLog = hb["hb_RunLog"](self.logFile)
+        inputKey = runLog.getInputKey([self.resultFile], [300])
+        self.assertEqual(runLog.getInputKey([self.resultFile], [300]), inputKey)
+        self.assertNotEqual(runLog.getInputKey([self.resultFile], [500]), inputKey)
+
+        with open(self.resultFile, "w") as outf: outf.write("x" * 20)
+        newInputKey = runLog.getInputKey([self.resultFile], [300])
+        self.assertNotEqual(newInputKey, inputKey)
+
+        runLog.addStage("annualMetrics", 1.0, inputKey = newInputKey)
+        self.assertTrue(runLog.hasStage("annualMetrics", newInputKey))
+        self.assertFalse(runLog.hasStage("annualMetrics", inputKey))
+        self.assertFalse(runLog.hasStage("split", newInputKey))
+
+    def test_append_to_the_log_of_the_last_run(self):
+        runLog = hb["hb_RunLog"](self.logFile)
+        runLog.addStage("oconv", 1.0)
+        runLog.save()
+        startTime = self.readLog()["startTime"]
+
+        runLog = hb["hb_RunLog"](self.logFile, append = True)
+        runLog.addStage("annualMetrics", 2.0)
+        runLog.save()
+        self.assertEqual(self.readLog()["startTime"], startTime)
+        self.assertEqual([stage["name"] for stage in self.readLog()["stages"]], ["oconv", "annualMetrics"])
+
+        # a new run starts a new log
+        runLog = hb["hb_RunLog"](self.logFile)
+        runLog.save()
+        self.assertEqual(self.readLog()["stages"], [])
+
+        # a corrupted log is replaced
+        with open(self.logFile, "w") as outf: outf.write("{")
+        runLog = hb["hb_RunLog"](self.logFile, append = True)
+        self.assertEqual(runLog.log["stages"], [])
+
+    def test_only_the_last_stages_are_saved(self):
+        runLog = hb["hb_RunLog"](self.logFile, maxStages = 3)
+        for stageCount in range(5): runLog.addStage("rtrace_" + str(stageCount), 1.0)
+        runLog.save()
+        self.assertEqual([stage["name"] for stage in self.readLog()["stages"]], ["rtrace_2", "rtrace_3", "rtrace_4"])
+
+
+if __name__ == "__main__":
+    unittest.main()
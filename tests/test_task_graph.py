@@ -0,0 +1,82 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+from hbtest import hb, TempFolderTestCase
+
+
+class TaskGraphTestCase(TempFolderTestCase):
+
+    def setUp(self):
+        TempFolderTestCase.setUp(self)
+        self.log = []
+        self.lock = threading.Lock()
+
+    def getTask(self, name, duration = 0, fail = False):
+        # a python task that keeps the time that it starts and ends
+        def task():
+            with self.lock: self.log.append(("start", name))
+            time.sleep(duration)
+            with self.lock: self.log.append(("end", name))
+            if fail: raise Exception(name + " failed")
+        return task
+
+    def getIndex(self, event, name):
+        return self.log.index((event, name))
+
+    def test_a_task_starts_after_its_dependencies(self):
+        taskGraph = hb["hb_TaskGraph"](4)
+        # the same graph as the annual studies of Run DS
+        taskGraph.addTask("init", self.getTask("init", .05))
+        for chunkCount in range(3):
+            chunk = str(chunkCount)
+            taskGraph.addTask("dif_" + chunk, self.getTask("dif_" + chunk, .05), ["init"])
+            taskGraph.addTask("dir_" + chunk, self.getTask("dir_" + chunk), ["dif_" + chunk])
+            taskGraph.addTask("paste_" + chunk, self.getTask("paste_" + chunk), ["dir_" + chunk])
+        status = taskGraph.run()
+
+        self.assertTrue(all(status.values()))
+        for chunkCount in range(3):
+            chunk = str(chunkCount)
+            self.assertTrue(self.getIndex("end", "init") < self.getIndex("start", "dif_" + chunk))
+            # the direct pass doesn't overlap the diffuse pass of the same chunk
+            self.assertTrue(self.getIndex("end", "dif_" + chunk) < self.getIndex("start", "dir_" + chunk))
+            self.assertTrue(self.getIndex("end", "dir_" + chunk) < self.getIndex("start", "paste_" + chunk))
+        # the diffuse passes of the chunks run at the same time
+        self.assertTrue(self.getIndex("start", "dif_2") < self.getIndex("end", "dif_0"))
+
+    def test_tasks_after_a_failed_task_are_skipped(self):
+        taskGraph = hb["hb_TaskGraph"](2, retries = 1)
+        taskGraph.addTask("failed", self.getTask("failed", fail = True))
+        taskGraph.addTask("skipped", self.getTask("skipped"), ["failed"])
+        taskGraph.addTask("alsoSkipped", self.getTask("alsoSkipped"), ["skipped"])
+        taskGraph.addTask("independent", self.getTask("independent"))
+        status = taskGraph.run()
+
+        self.assertEqual(status, {"failed": False, "skipped": False, "alsoSkipped": False, "independent": True})
+        self.assertEqual(self.log.count(("start", "failed")), 2)
+        self.assertFalse(("start", "skipped") in self.log)
+        self.assertEqual([jobResult["name"] for jobResult in taskGraph.jobResults if jobResult != None], ["failed", "independent"])
+        self.assertEqual(taskGraph.jobResults[0]["attempts"], 2)
+
+    def test_missing_output_files_fail_the_task(self):
+        outputFile = self.getPath("chunk.txt")
+        taskGraph = hb["hb_TaskGraph"](1, retries = 0)
+        taskGraph.addTask("noOutput", self.getTask("noOutput"), [], [outputFile])
+        taskGraph.addTask("command", hb["hb_Command"]([sys.executable, "-c", "open('chunk.txt', 'w').write('x')"], \
+                                                      cwd = self.folder), ["noOutput"], [outputFile])
+        self.assertEqual(taskGraph.run(), {"noOutput": False, "command": False})
+        self.assertFalse(os.path.isfile(outputFile))
+
+    def test_task_names_and_dependencies_are_checked(self):
+        taskGraph = hb["hb_TaskGraph"](1)
+        taskGraph.addTask("task", self.getTask("task"))
+        self.assertRaises(Exception, taskGraph.addTask, "task", self.getTask("task"))
+        taskGraph.addTask("orphan", self.getTask("orphan"), ["unknown"])
+        self.assertRaises(Exception, taskGraph.run)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import time
+import threading
+import unittest
+
+from hbtest import hb, TempFolderTestCase
+
+
+# append one character to a file each time the job runs
+APPEND = "import sys; open(sys.argv[1], 'a').write('x')"
+
+
+class WorkQueueTestCase(TempFolderTestCase):
+
+    def setUp(self):
+        TempFolderTestCase.setUp(self)
+        self.queueFolder = self.getPath("queue")
+        self.workQueue = hb["hb_WorkQueue"](self.queueFolder, claimTimeout = 1, pollInterval = 0.1)
+        self.workerModule = self.workQueue.getWorkerModule()
+        self.workerModule["makeFolders"](self.queueFolder)
+
+    def getAppendCommand(self, markerFile, sleep = 0):
+        return hb["hb_Command"]([sys.executable, "-c", "import time; time.sleep(" + str(sleep) + "); " + APPEND, markerFile])
+
+    def readMarker(self, markerFile):
+        if not os.path.isfile(markerFile): return ""
+        with open(markerFile, "r") as inf: return inf.read()
+
+    def startWorkers(self, numOfWorkers, idleTimeout = 1):
+        workers = [threading.Thread(target = self.workerModule["work"], \
+                   args = (self.queueFolder, idleTimeout, None, "worker_" + str(workerCount))) \
+                   for workerCount in range(numOfWorkers)]
+        for thread in workers: thread.start()
+        return workers
+
+    def test_each_job_is_claimed_once(self):
+        markerFiles = [self.getPath("job_" + str(jobCount) + ".txt") for jobCount in range(8)]
+        jobIds = [self.workQueue.publishJob("job" + str(jobCount), self.getAppendCommand(markerFile)) \
+                  for jobCount, markerFile in enumerate(markerFiles)]
+        for thread in self.startWorkers(4): thread.join()
+
+        for jobId, markerFile in zip(jobIds, markerFiles):
+            self.assertEqual(self.readMarker(markerFile), "x")
+            jobResult = self.workQueue.waitForJob(jobId)
+            self.assertEqual(jobResult["exitCode"], 0)
+        self.assertEqual(os.listdir(os.path.join(self.queueFolder, "jobs")), [])
+        self.assertEqual(os.listdir(os.path.join(self.queueFolder, "claimed")), [])
+
+    def test_claim_is_named_after_the_worker_and_sends_a_heartbeat(self):
+        jobId = self.workQueue.publishJob("job", self.getAppendCommand(self.getPath("job.txt")))
+        jobFile = os.path.join(self.queueFolder, "jobs", jobId + ".json")
+        # the job has waited in the queue for a long time
+        os.utime(jobFile, (time.time() - 600, time.time() - 600))
+
+        job, claimFile = self.workerModule["claimJob"](self.queueFolder, "node1")
+        self.assertEqual(job["id"], jobId)
+        self.assertEqual(job["heartbeatInterval"], 0.5)
+        self.assertEqual(claimFile, os.path.join(self.queueFolder, "claimed", jobId + "__node1.json"))
+        self.assertEqual(self.workQueue.getClaimFile(jobId), claimFile)
+        self.assertTrue(time.time() - os.path.getmtime(claimFile) < 60)
+        self.assertEqual(self.workerModule["claimJob"](self.queueFolder, "node2"), (None, None))
+
+    def test_job_of_a_stopped_worker_is_put_back_in_the_queue(self):
+        markerFile = self.getPath("job.txt")
+        jobId = self.workQueue.publishJob("job", self.getAppendCommand(markerFile))
+        # a worker claims the job and stops without any heartbeats
+        self.workerModule["claimJob"](self.queueFolder, "stopped")
+
+        workers = self.startWorkers(1, idleTimeout = 5)
+        jobResult = self.workQueue.waitForJob(jobId)
+        for thread in workers: thread.join()
+
+        self.assertEqual(jobResult["worker"], "worker_0")
+        self.assertEqual(self.readMarker(markerFile), "x")
+        self.assertEqual(os.listdir(os.path.join(self.queueFolder, "claimed")), [])
+
+    def test_long_job_with_heartbeats_is_not_put_back_in_the_queue(self):
+        markerFile = self.getPath("job.txt")
+        # the job takes three times claimTimeout
+        jobId = self.workQueue.publishJob("job", self.getAppendCommand(markerFile, sleep = 3))
+        # the second worker is still waiting for a job when the first one is over
+        workers = self.startWorkers(2, idleTimeout = 5)
+        jobResult = self.workQueue.waitForJob(jobId)
+        for thread in workers: thread.join()
+
+        self.assertEqual(jobResult["exitCode"], 0)
+        self.assertEqual(self.readMarker(markerFile), "x")
+
+    def test_first_result_wins(self):
+        resultFile = os.path.join(self.queueFolder, "results", "job.json")
+        writeResult = self.workerModule["writeResult"]
+        self.assertTrue(writeResult(resultFile, {"worker": "first"}, "first"))
+        self.assertFalse(writeResult(resultFile, {"worker": "second"}, "second"))
+        with open(resultFile, "r") as inf:
+            self.assertEqual(json.load(inf)["worker"], "first")
+        self.assertEqual(os.listdir(os.path.join(self.queueFolder, "results")), ["job.json"])
+
+    def test_output_is_only_moved_in_place_by_the_worker_that_keeps_the_claim(self):
+        command = hb["hb_Command"]([sys.executable, "-c", "import sys; sys.stdout.write(sys.argv[1])", "node"], \
+                                   stdout = "chunk.res", cwd = self.folder)
+        jobId = self.workQueue.publishJob("job", command)
+        outputFile = self.getPath("chunk.res")
+        resultFile = os.path.join(self.queueFolder, "results", jobId + ".json")
+
+        # the coordinator puts the job back in the queue while the first worker is still running it
+        job, claimFile = self.workerModule["claimJob"](self.queueFolder, "node1")
+        os.rename(claimFile, os.path.join(self.queueFolder, "jobs", jobId + ".json"))
+        secondJob, secondClaimFile = self.workerModule["claimJob"](self.queueFolder, "node2")
+        self.workerModule["runJob"](self.queueFolder, job, claimFile, "node1")
+        self.assertFalse(os.path.isfile(outputFile))
+        self.assertFalse(os.path.isfile(resultFile))
+
+        self.workerModule["runJob"](self.queueFolder, secondJob, secondClaimFile, "node2")
+        self.assertEqual(self.readMarker(outputFile), "node")
+        self.assertEqual(self.workQueue.waitForJob(jobId)["worker"], "node2")
+        self.assertEqual(sorted(os.listdir(self.folder)), ["chunk.res", "queue"])
+        self.assertEqual(os.listdir(os.path.join(self.queueFolder, "claimed")), [])
+
+    def test_one_poller_checks_all_the_jobs(self):
+        claimedFolder = os.path.join(self.queueFolder, "claimed")
+        listdir = os.listdir
+        claimedListings = []
+        def countListings(folder):
+            if folder == claimedFolder: claimedListings.append(folder)
+            return listdir(folder)
+
+        workQueue = hb["hb_WorkQueue"](self.queueFolder, numOfLocalWorkers = 4, claimTimeout = 5, pollInterval = 0.1)
+        for chunkCount in range(12):
+            workQueue.addTask("chunk" + str(chunkCount), self.getAppendCommand(self.getPath("chunk_" + str(chunkCount) + ".txt")))
+        os.listdir = countListings
+        try:
+            startTime = time.time()
+            self.assertTrue(all(workQueue.run().values()))
+            duration = time.time() - startTime
+        finally:
+            os.listdir = listdir
+        # one listing in each poll no matter how many jobs are waited for
+        self.assertTrue(len(claimedListings) <= duration / 0.1 + 2)
+
+    def test_run_a_study_with_local_workers(self):
+        workQueue = hb["hb_WorkQueue"](self.queueFolder, numOfLocalWorkers = 2, claimTimeout = 5, pollInterval = 0.1)
+        markerFiles = [self.getPath("chunk_" + str(chunkCount) + ".txt") for chunkCount in range(3)]
+        merged = []
+        for chunkCount, markerFile in enumerate(markerFiles):
+            workQueue.addTask("chunk" + str(chunkCount), self.getAppendCommand(markerFile), outputFiles = [markerFile])
+        workQueue.addTask("merge", lambda: merged.append(map(self.readMarker, markerFiles)), \
+                          ["chunk" + str(chunkCount) for chunkCount in range(3)])
+        workQueue.addTask("failed", [hb["hb_Command"]([sys.executable, "-c", "import sys; sys.exit(3)"])])
+        workQueue.addTask("skipped", lambda: None, ["failed"])
+
+        status = workQueue.run()
+        self.assertEqual(status, {"chunk0": True, "chunk1": True, "chunk2": True, "merge": True,
+                                  "failed": False, "skipped": False})
+        self.assertEqual(merged, [["x", "x", "x"]])
+        self.assertTrue(os.path.isfile(workQueue.getWorkerScriptFile()))
+        # the failed job is retried once
+        failedResult = workQueue.jobResults[workQueue.taskNames.index("failed")]
+        self.assertEqual((failedResult["exitCode"], failedResult["attempts"]), (3, 2))
+        self.assertEqual(os.listdir(os.path.join(self.queueFolder, "results")), [])
+
+
+if __name__ == "__main__":
+    unittest.main()